@@ -0,0 +1,28 @@
+-- Thêm cột UpdatedAt cho database đang chạy (xem "Database.sql"), chạy sau "Partition Orders.sql".
+-- Các dòng đã có nhận thời điểm chạy ALTER làm UpdatedAt. Sau đó nạp lại "Advanced Database.sql"
+-- để tạo ListingResets, ChangeWatermark, các thủ tục *ChangesSince và ArchiveOrderYear mới.
+USE sales_management;
+
+
+-- Cột có DEFAULT CURRENT_TIMESTAMP phải chép lại bảng, INPLACE vẫn cho phép ghi trong lúc chạy
+ALTER TABLE Customers
+    ADD COLUMN UpdatedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_customers_updated (UpdatedAt),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE Employees
+    ADD COLUMN UpdatedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_employees_updated (UpdatedAt),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE Products
+    ADD COLUMN UpdatedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_products_updated (UpdatedAt),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE OrderDetails
+    ADD COLUMN UpdatedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_orderdetails_updated (UpdatedAt),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Tiếp theo: mysql sales_management < "Advanced Database.sql"
@@ -1,4 +1,8 @@
 USE sales_management;
+
+-- File chạy lại được trên database đang dùng (sau mỗi migration): thủ tục, hàm và trigger được xoá rồi tạo lại,
+-- bảng và index chỉ được tạo khi chưa có (trừ các bảng tổng hợp doanh số, được tính lại mỗi lần nạp)
+DROP PROCEDURE IF EXISTS RegisterCustomer;
 DELIMITER //
 CREATE PROCEDURE RegisterCustomer(IN p_CustomerName VARCHAR(100), IN p_Address VARCHAR(100), IN p_Phone VARCHAR(10))
 BEGIN
@@ -8,33 +12,74 @@ END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS UpdateCustomer;
 DELIMITER //
 CREATE PROCEDURE UpdateCustomer(IN p_CustomerID VARCHAR(10), IN p_CustomerName VARCHAR(100), IN p_Address VARCHAR(100), IN p_Phone VARCHAR(10))
 BEGIN
     UPDATE Customers
     SET CustomerName = p_CustomerName, Address = p_Address, Phone = p_Phone
-    WHERE CustomerID = p_CustomerID;
+    WHERE CustomerID = ParseId(p_CustomerID);
 END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS SearchCustomer;
 DELIMITER //
-CREATE PROCEDURE SearchCustomer(IN p_CustomerName VARCHAR(100))
+CREATE PROCEDURE SearchCustomer(IN p_CustomerName VARCHAR(100), IN p_Limit INT)
 BEGIN
-    SELECT * FROM Customers WHERE CustomerName LIKE CONCAT('%', p_CustomerName, '%');
+    IF CHAR_LENGTH(TRIM(p_CustomerName)) < 2 THEN
+        -- Từ khoá ngắn hơn một ngram: tìm theo tiền tố, dùng được index B-tree trên tên
+        SELECT FormatId('C', CustomerID) AS CustomerID, CustomerName, Address, Phone
+        FROM Customers
+        WHERE CustomerName LIKE CONCAT(TRIM(p_CustomerName), '%')
+        ORDER BY CustomerName
+        LIMIT p_Limit;
+    ELSE
+        -- Khớp theo ngram nên vẫn tìm được khi gõ sai vài ký tự; tên bắt đầu bằng từ khoá được xếp trước
+        SELECT FormatId('C', CustomerID) AS CustomerID, CustomerName, Address, Phone
+        FROM Customers
+        WHERE MATCH(CustomerName) AGAINST (p_CustomerName IN NATURAL LANGUAGE MODE)
+        ORDER BY CustomerName LIKE CONCAT(p_CustomerName, '%') DESC,
+                 MATCH(CustomerName) AGAINST (p_CustomerName IN NATURAL LANGUAGE MODE) DESC
+        LIMIT p_Limit;
+    END IF;
 END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS ShowCustomer;
 DELIMITER //
 CREATE PROCEDURE ShowCustomer()
 BEGIN
-    SELECT * FROM Customers;
+    SELECT FormatId('C', CustomerID) AS CustomerID, CustomerName, Address, Phone FROM Customers;
 END;
 //
 DELIMITER ;
 
 
+-- Phân trang theo khóa chính (keyset), p_AfterID = NULL để lấy trang đầu
+DROP PROCEDURE IF EXISTS ShowCustomerPage;
+DELIMITER //
+CREATE PROCEDURE ShowCustomerPage(IN p_AfterID VARCHAR(10), IN p_PageSize INT, IN p_Descending BOOLEAN)
+BEGIN
+    IF p_Descending THEN
+        SELECT FormatId('C', CustomerID) AS CustomerID, CustomerName, Address, Phone
+        FROM Customers
+        WHERE (p_AfterID IS NULL OR CustomerID < ParseId(p_AfterID))
+        ORDER BY Customers.CustomerID DESC
+        LIMIT p_PageSize;
+    ELSE
+        SELECT FormatId('C', CustomerID) AS CustomerID, CustomerName, Address, Phone
+        FROM Customers
+        WHERE (p_AfterID IS NULL OR CustomerID > ParseId(p_AfterID))
+        ORDER BY Customers.CustomerID
+        LIMIT p_PageSize;
+    END IF;
+END; //
+DELIMITER ;
+
+
+DROP PROCEDURE IF EXISTS AddProduct;
 DELIMITER //
 CREATE PROCEDURE AddProduct(IN p_ProductName VARCHAR(100), IN p_Price DECIMAL(10,2), IN p_StockQuantity INT)
 BEGIN
@@ -44,43 +89,67 @@ END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS EditProduct;
 DELIMITER //
 CREATE PROCEDURE EditProduct(IN p_ProductID VARCHAR(10), IN p_ProductName VARCHAR(100), IN p_Price DECIMAL(10,2), IN p_StockQuantity INT)
 BEGIN
+    -- Ghi phần chênh lệch tồn kho vào sổ kho trước khi đặt số lượng mới
+    INSERT INTO StockMovements (ProductID, OrderID, QuantityChange, Reason)
+    SELECT ProductID, NULL, p_StockQuantity - StockQuantity, 'Adjust'
+    FROM Products
+    WHERE ProductID = ParseId(p_ProductID) AND StockQuantity <> p_StockQuantity
+    FOR UPDATE;
+
     UPDATE Products
     SET ProductName = p_ProductName, Price = p_Price, StockQuantity = p_StockQuantity
-    WHERE ProductID = p_ProductID;
+    WHERE ProductID = ParseId(p_ProductID);
 END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS DeleteProduct;
 DELIMITER //
 CREATE PROCEDURE DeleteProduct(IN p_ProductID VARCHAR(10))
 BEGIN
     UPDATE Products
     SET IsActive = FALSE
-    WHERE ProductID = p_ProductID;
+    WHERE ProductID = ParseId(p_ProductID);
 END;
 //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS SearchProduct;
 DELIMITER //
-CREATE PROCEDURE SearchProduct(IN p_ProductName VARCHAR(100))
+CREATE PROCEDURE SearchProduct(IN p_ProductName VARCHAR(100), IN p_Limit INT)
 BEGIN
-    SELECT ProductID, ProductName, Price, StockQuantity
-    FROM Products    
-    WHERE ProductName LIKE CONCAT('%', p_ProductName, '%')
-      AND IsActive = TRUE;
-END;
-//
+    IF CHAR_LENGTH(TRIM(p_ProductName)) < 2 THEN
+        -- Từ khoá ngắn hơn một ngram: tìm theo tiền tố, dùng được index B-tree trên tên
+        SELECT FormatId('P', ProductID) AS ProductID, ProductName, Price, StockQuantity
+        FROM Products
+        WHERE ProductName LIKE CONCAT(TRIM(p_ProductName), '%')
+          AND IsActive = TRUE
+        ORDER BY ProductName
+        LIMIT p_Limit;
+    ELSE
+        -- Khớp theo ngram nên vẫn tìm được khi gõ sai vài ký tự; tên bắt đầu bằng từ khoá được xếp trước
+        SELECT FormatId('P', ProductID) AS ProductID, ProductName, Price, StockQuantity
+        FROM Products
+        WHERE MATCH(ProductName) AGAINST (p_ProductName IN NATURAL LANGUAGE MODE)
+          AND IsActive = TRUE
+        ORDER BY ProductName LIKE CONCAT(p_ProductName, '%') DESC,
+                 MATCH(ProductName) AGAINST (p_ProductName IN NATURAL LANGUAGE MODE) DESC
+        LIMIT p_Limit;
+    END IF;
+END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS ShowProduct;
 DELIMITER //
 CREATE PROCEDURE ShowProduct()
 BEGIN
-    SELECT ProductID, ProductName, Price, StockQuantity
+    SELECT FormatId('P', ProductID) AS ProductID, ProductName, Price, StockQuantity
     FROM Products
     WHERE IsActive = TRUE;
 END;
@@ -88,59 +157,202 @@ END;
 DELIMITER ;
 
 
+-- Phân trang theo khóa chính (keyset), p_AfterID = NULL để lấy trang đầu
+DROP PROCEDURE IF EXISTS ShowProductPage;
+DELIMITER //
+CREATE PROCEDURE ShowProductPage(IN p_AfterID VARCHAR(10), IN p_PageSize INT, IN p_Descending BOOLEAN)
+BEGIN
+    IF p_Descending THEN
+        SELECT FormatId('P', ProductID) AS ProductID, ProductName, Price, StockQuantity
+        FROM Products
+        WHERE IsActive = TRUE
+          AND (p_AfterID IS NULL OR ProductID < ParseId(p_AfterID))
+        ORDER BY Products.ProductID DESC
+        LIMIT p_PageSize;
+    ELSE
+        SELECT FormatId('P', ProductID) AS ProductID, ProductName, Price, StockQuantity
+        FROM Products
+        WHERE IsActive = TRUE
+          AND (p_AfterID IS NULL OR ProductID > ParseId(p_AfterID))
+        ORDER BY Products.ProductID
+        LIMIT p_PageSize;
+    END IF;
+END; //
+DELIMITER ;
+
+
+DROP PROCEDURE IF EXISTS CreateOrder;
 DELIMITER //
 CREATE PROCEDURE CreateOrder(IN p_CustomerID VARCHAR(10), IN p_OrderDate DATE, IN p_EmployeeID VARCHAR(10))
 BEGIN
     INSERT INTO Orders (CustomerID, OrderDate, Status, EmployeeID)
-    VALUES (p_CustomerID, p_OrderDate, 'Pending', p_EmployeeID);
+    VALUES (ParseId(p_CustomerID), p_OrderDate, 'Pending', ParseId(p_EmployeeID));
+END; //
+DELIMITER ;
+
+
+-- Tạo đơn hàng và trả về OrderID vừa cấp để thêm chi tiết trong cùng transaction
+DROP PROCEDURE IF EXISTS CreateOrderReturningId;
+DELIMITER //
+CREATE PROCEDURE CreateOrderReturningId(IN p_CustomerID VARCHAR(10), IN p_OrderDate DATE, IN p_EmployeeID VARCHAR(10), OUT p_OrderID VARCHAR(10))
+BEGIN
+    INSERT INTO Orders (CustomerID, OrderDate, Status, EmployeeID)
+    VALUES (ParseId(p_CustomerID), p_OrderDate, 'Pending', ParseId(p_EmployeeID));
+    SET p_OrderID = FormatId('O', LAST_INSERT_ID());
 END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS UpdateOrderStatus;
 DELIMITER //
 CREATE PROCEDURE UpdateOrderStatus(IN p_OrderID VARCHAR(10), IN p_Status VARCHAR(20))
 BEGIN
     UPDATE Orders
     SET Status = p_Status
-    WHERE OrderID = p_OrderID;
+    WHERE OrderID = ParseId(p_OrderID);
 END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS AllOrderDetail;
 DELIMITER //
 CREATE PROCEDURE AllOrderDetail()
 BEGIN
-    SELECT * FROM OrderDetails;
+    SELECT FormatId('OD', OrderDetailID) AS OrderDetailID, FormatId('O', OrderID) AS OrderID, FormatId('P', ProductID) AS ProductID, Quantity, SalePrice
+    FROM OrderDetails;
 END; //
 DELIMITER ;
 
 
+-- Phân trang theo khóa chính (keyset), p_AfterID = NULL để lấy trang đầu
+DROP PROCEDURE IF EXISTS AllOrderDetailPage;
+DELIMITER //
+CREATE PROCEDURE AllOrderDetailPage(IN p_AfterID VARCHAR(10), IN p_PageSize INT, IN p_Descending BOOLEAN)
+BEGIN
+    IF p_Descending THEN
+        SELECT FormatId('OD', OrderDetailID) AS OrderDetailID, FormatId('O', OrderID) AS OrderID, FormatId('P', ProductID) AS ProductID, Quantity, SalePrice
+        FROM OrderDetails
+        WHERE (p_AfterID IS NULL OR OrderDetailID < ParseId(p_AfterID))
+        ORDER BY OrderDetails.OrderDetailID DESC
+        LIMIT p_PageSize;
+    ELSE
+        SELECT FormatId('OD', OrderDetailID) AS OrderDetailID, FormatId('O', OrderID) AS OrderID, FormatId('P', ProductID) AS ProductID, Quantity, SalePrice
+        FROM OrderDetails
+        WHERE (p_AfterID IS NULL OR OrderDetailID > ParseId(p_AfterID))
+        ORDER BY OrderDetails.OrderDetailID
+        LIMIT p_PageSize;
+    END IF;
+END; //
+DELIMITER ;
+
+
+-- Thêm một dòng vào đơn đã có: chỉ giữ hàng cho dòng này. Đơn nhiều dòng đi qua place_order (managers.py),
+-- thêm mọi dòng rồi gọi ReserveOrderStock một lần cho cả đơn
+DROP PROCEDURE IF EXISTS AddOrderDetails;
 DELIMITER //
 CREATE PROCEDURE AddOrderDetails(IN p_OrderID VARCHAR(10), IN p_ProductID VARCHAR(10), IN p_Quantity INT)
 BEGIN
+    DECLARE v_OrderID BIGINT UNSIGNED DEFAULT ParseId(p_OrderID);
+    DECLARE v_ProductID INT UNSIGNED DEFAULT ParseId(p_ProductID);
+    DECLARE v_Reserve BOOLEAN DEFAULT FALSE;
+
+    -- Đơn đã huỷ không giữ hàng; bỏ huỷ sẽ giữ cả dòng này qua ReserveOrderStock
+    SELECT Status <> 'Cancelled' INTO v_Reserve FROM Orders WHERE OrderID = v_OrderID;
+
+    -- Đơn có từ trước sổ kho: ghi bù phần đã trừ kho của các dòng cũ như ReleaseOrderStock
+    IF v_Reserve AND NOT EXISTS (SELECT 1 FROM StockMovements WHERE OrderID = v_OrderID) THEN
+        INSERT INTO StockMovements (ProductID, OrderID, QuantityChange, Reason)
+        SELECT ProductID, v_OrderID, -SUM(Quantity), 'Reserve'
+        FROM OrderDetails
+        WHERE OrderID = v_OrderID
+        GROUP BY ProductID;
+    END IF;
+
     INSERT INTO OrderDetails (OrderID, ProductID, Quantity)
-    VALUES (p_OrderID, p_ProductID, p_Quantity);
+    VALUES (v_OrderID, v_ProductID, p_Quantity);
+
+    IF v_Reserve THEN
+        UPDATE Products
+        SET StockQuantity = StockQuantity - p_Quantity
+        WHERE ProductID = v_ProductID AND StockQuantity >= p_Quantity;
+
+        IF ROW_COUNT() = 0 THEN
+            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Insufficient stock for order';
+        END IF;
+
+        INSERT INTO StockMovements (ProductID, OrderID, QuantityChange, Reason)
+        VALUES (v_ProductID, v_OrderID, -p_Quantity, 'Reserve');
+    END IF;
 END; //
 DELIMITER ;
 
 
+-- p_IncludeArchive = TRUE thì tìm cả trong OrdersArchive; mặc định chỉ đọc bảng Orders
+DROP PROCEDURE IF EXISTS SearchOrder;
 DELIMITER //
-CREATE PROCEDURE SearchOrder(IN p_SearchTerm VARCHAR(100))
+CREATE PROCEDURE SearchOrder(IN p_SearchTerm VARCHAR(100), IN p_Limit INT, IN p_IncludeArchive BOOLEAN)
 BEGIN
-    SELECT 
-        O.OrderID, 
-        C.CustomerName,
-		E.EmployeeName,
-        O.OrderDate, 
-        O.Status
-    FROM Orders O
-    JOIN Customers C ON O.CustomerID = C.CustomerID
-    JOIN Employees E ON O.EmployeeID = E.EmployeeID
-    WHERE C.CustomerName LIKE CONCAT('%', p_SearchTerm, '%');
+    IF CHAR_LENGTH(TRIM(p_SearchTerm)) < 2 THEN
+        SELECT 
+            FormatId('O', O.OrderID) AS OrderID,
+            C.CustomerName,
+            E.EmployeeName,
+            O.OrderDate, 
+            O.Status
+        FROM Customers C
+        JOIN Orders O ON O.CustomerID = C.CustomerID
+        JOIN Employees E ON O.EmployeeID = E.EmployeeID
+        WHERE C.CustomerName LIKE CONCAT(TRIM(p_SearchTerm), '%')
+        UNION ALL
+        SELECT 
+            FormatId('O', O.OrderID),
+            C.CustomerName,
+            E.EmployeeName,
+            O.OrderDate, 
+            O.Status
+        FROM Customers C
+        JOIN OrdersArchive O ON O.CustomerID = C.CustomerID
+        JOIN Employees E ON O.EmployeeID = E.EmployeeID
+        WHERE p_IncludeArchive AND C.CustomerName LIKE CONCAT(TRIM(p_SearchTerm), '%')
+        ORDER BY CustomerName, OrderDate DESC
+        LIMIT p_Limit;
+    ELSE
+        SELECT OrderID, CustomerName, EmployeeName, OrderDate, Status
+        FROM (
+            SELECT 
+                FormatId('O', O.OrderID) AS OrderID,
+                C.CustomerName,
+                E.EmployeeName,
+                O.OrderDate, 
+                O.Status,
+                C.CustomerName LIKE CONCAT(p_SearchTerm, '%') AS PrefixMatch,
+                MATCH(C.CustomerName) AGAINST (p_SearchTerm IN NATURAL LANGUAGE MODE) AS Relevance
+            FROM Customers C
+            JOIN Orders O ON O.CustomerID = C.CustomerID
+            JOIN Employees E ON O.EmployeeID = E.EmployeeID
+            WHERE MATCH(C.CustomerName) AGAINST (p_SearchTerm IN NATURAL LANGUAGE MODE)
+            UNION ALL
+            SELECT 
+                FormatId('O', O.OrderID),
+                C.CustomerName,
+                E.EmployeeName,
+                O.OrderDate, 
+                O.Status,
+                C.CustomerName LIKE CONCAT(p_SearchTerm, '%'),
+                MATCH(C.CustomerName) AGAINST (p_SearchTerm IN NATURAL LANGUAGE MODE)
+            FROM Customers C
+            JOIN OrdersArchive O ON O.CustomerID = C.CustomerID
+            JOIN Employees E ON O.EmployeeID = E.EmployeeID
+            WHERE p_IncludeArchive AND MATCH(C.CustomerName) AGAINST (p_SearchTerm IN NATURAL LANGUAGE MODE)
+        ) R
+        ORDER BY PrefixMatch DESC, Relevance DESC, OrderDate DESC
+        LIMIT p_Limit;
+    END IF;
 END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS AddEmployee;
 DELIMITER //
 CREATE PROCEDURE AddEmployee(IN p_EmployeeName VARCHAR(100), IN p_JobTitle VARCHAR(50))
 BEGIN
@@ -150,52 +362,693 @@ END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS UpdateEmployee;
 DELIMITER //
 CREATE PROCEDURE UpdateEmployee(IN p_EmployeeID VARCHAR(10), IN p_EmployeeName VARCHAR(100), IN p_JobTitle VARCHAR(50))
 BEGIN
     UPDATE Employees
     SET EmployeeName = p_EmployeeName, JobTitle = p_JobTitle
-    WHERE EmployeeID = p_EmployeeID;
+    WHERE EmployeeID = ParseId(p_EmployeeID);
 END; //
 DELIMITER ;
 
+DROP PROCEDURE IF EXISTS SearchEmployee;
 DELIMITER //
-CREATE PROCEDURE SearchEmployee(IN p_EmployeeName VARCHAR(100))
+CREATE PROCEDURE SearchEmployee(IN p_EmployeeName VARCHAR(100), IN p_Limit INT)
 BEGIN
-    SELECT * FROM Employees WHERE EmployeeName LIKE CONCAT('%', p_EmployeeName, '%');
+    IF CHAR_LENGTH(TRIM(p_EmployeeName)) < 2 THEN
+        -- Từ khoá ngắn hơn một ngram: tìm theo tiền tố, dùng được index B-tree trên tên
+        SELECT FormatId('E', EmployeeID) AS EmployeeID, EmployeeName, JobTitle
+        FROM Employees
+        WHERE EmployeeName LIKE CONCAT(TRIM(p_EmployeeName), '%')
+        ORDER BY EmployeeName
+        LIMIT p_Limit;
+    ELSE
+        -- Khớp theo ngram nên vẫn tìm được khi gõ sai vài ký tự; tên bắt đầu bằng từ khoá được xếp trước
+        SELECT FormatId('E', EmployeeID) AS EmployeeID, EmployeeName, JobTitle
+        FROM Employees
+        WHERE MATCH(EmployeeName) AGAINST (p_EmployeeName IN NATURAL LANGUAGE MODE)
+        ORDER BY EmployeeName LIKE CONCAT(p_EmployeeName, '%') DESC,
+                 MATCH(EmployeeName) AGAINST (p_EmployeeName IN NATURAL LANGUAGE MODE) DESC
+        LIMIT p_Limit;
+    END IF;
 END; //
 DELIMITER ;
 
 
+DROP PROCEDURE IF EXISTS ShowEmployee;
 DELIMITER //
 CREATE PROCEDURE ShowEmployee()
 BEGIN
-    SELECT * FROM Employees;
+    SELECT FormatId('E', EmployeeID) AS EmployeeID, EmployeeName, JobTitle FROM Employees;
 END;
 //
 DELIMITER ;
 
 
+-- Phân trang theo khóa chính (keyset), p_AfterID = NULL để lấy trang đầu
+DROP PROCEDURE IF EXISTS ShowEmployeePage;
+DELIMITER //
+CREATE PROCEDURE ShowEmployeePage(IN p_AfterID VARCHAR(10), IN p_PageSize INT, IN p_Descending BOOLEAN)
+BEGIN
+    IF p_Descending THEN
+        SELECT FormatId('E', EmployeeID) AS EmployeeID, EmployeeName, JobTitle
+        FROM Employees
+        WHERE (p_AfterID IS NULL OR EmployeeID < ParseId(p_AfterID))
+        ORDER BY Employees.EmployeeID DESC
+        LIMIT p_PageSize;
+    ELSE
+        SELECT FormatId('E', EmployeeID) AS EmployeeID, EmployeeName, JobTitle
+        FROM Employees
+        WHERE (p_AfterID IS NULL OR EmployeeID > ParseId(p_AfterID))
+        ORDER BY Employees.EmployeeID
+        LIMIT p_PageSize;
+    END IF;
+END; //
+DELIMITER ;
+
+
+-- Lấy phần thay đổi của danh sách theo UpdatedAt. p_Since = NULL (hoặc bảng vừa bị xoá dòng, xem ListingResets)
+-- trả về toàn bộ danh sách. Result set đầu là (Watermark, FullReload), lần sau gọi lại với Watermark.
+-- Bảng bị xoá dòng thật (không phải xoá mềm) ghi lại thời điểm vào đây để client biết phải tải lại toàn bộ
+CREATE TABLE IF NOT EXISTS ListingResets (
+    TableName VARCHAR(64) PRIMARY KEY,
+    ResetAt TIMESTAMP(6) NOT NULL
+);
+
+
+-- UpdatedAt là lúc câu lệnh chạy, không phải lúc commit: transaction đang mở (import, lưu trữ, group commit)
+-- có thể commit sau watermark các dòng có UpdatedAt cũ hơn. Watermark vì vậy không vượt quá lúc bắt đầu
+-- của transaction cũ nhất còn mở. Phải gọi trước lần đọc bảng đầu tiên để snapshot có sau watermark.
+-- Lùi thêm 1 giây: trx_started chỉ chính xác tới giây, và câu lệnh đã lấy NOW() nhưng chưa hiện trong
+-- INNODB_TRX vẫn được tính. Các dòng vì vậy có thể được trả lại ở lần sau; client ghép theo khoá (LiveTable).
+-- Transaction mở lâu (import lớn, ArchiveOrderYear) giữ watermark đứng yên tới khi kết thúc: trong thời gian đó
+-- mỗi lần làm mới trả lại mọi dòng đổi từ lúc transaction bắt đầu, không bỏ sót nhưng truyền nhiều hơn.
+-- Đọc INNODB_TRX cần quyền PROCESS (xem "Grant privileges.sql"); thiếu quyền thì bảng rỗng và chỉ còn 1 giây lùi lại
+DROP FUNCTION IF EXISTS ChangeWatermark;
+DELIMITER //
+CREATE FUNCTION ChangeWatermark()
+RETURNS TIMESTAMP(6)
+NOT DETERMINISTIC READS SQL DATA
+BEGIN
+    DECLARE v_Now TIMESTAMP(6) DEFAULT SYSDATE(6);
+    DECLARE v_OldestOpen DATETIME;
+
+    SELECT MIN(trx_started) INTO v_OldestOpen
+    FROM information_schema.INNODB_TRX
+    WHERE trx_mysql_thread_id <> CONNECTION_ID();
+
+    RETURN IF(v_OldestOpen IS NULL, v_Now, LEAST(v_Now, v_OldestOpen)) - INTERVAL 1 SECOND;
+END; //
+DELIMITER ;
+
+
+DROP PROCEDURE IF EXISTS CustomerChangesSince;
+DELIMITER //
+CREATE PROCEDURE CustomerChangesSince(IN p_Since TIMESTAMP(6))
+BEGIN
+    DECLARE v_Watermark TIMESTAMP(6) DEFAULT ChangeWatermark();
+
+    IF p_Since IS NULL OR EXISTS (SELECT 1 FROM ListingResets WHERE TableName = 'Customers' AND ResetAt >= p_Since) THEN
+        SELECT v_Watermark AS Watermark, TRUE AS FullReload;
+        SELECT FormatId('C', CustomerID) AS CustomerID, CustomerName, Address, Phone
+        FROM Customers;
+    ELSE
+        SELECT v_Watermark AS Watermark, FALSE AS FullReload;
+        SELECT FormatId('C', CustomerID) AS CustomerID, CustomerName, Address, Phone
+        FROM Customers
+        WHERE UpdatedAt >= p_Since;
+    END IF;
+END; //
+DELIMITER ;
+
+
+-- Xoá mềm (IsActive = FALSE) cũng làm đổi UpdatedAt; phần thay đổi trả cả dòng đã xoá để client bỏ đi
+DROP PROCEDURE IF EXISTS ProductChangesSince;
+DELIMITER //
+CREATE PROCEDURE ProductChangesSince(IN p_Since TIMESTAMP(6))
+BEGIN
+    DECLARE v_Watermark TIMESTAMP(6) DEFAULT ChangeWatermark();
+
+    IF p_Since IS NULL OR EXISTS (SELECT 1 FROM ListingResets WHERE TableName = 'Products' AND ResetAt >= p_Since) THEN
+        SELECT v_Watermark AS Watermark, TRUE AS FullReload;
+        SELECT FormatId('P', ProductID) AS ProductID, ProductName, Price, StockQuantity, IsActive
+        FROM Products
+        WHERE IsActive = TRUE;
+    ELSE
+        SELECT v_Watermark AS Watermark, FALSE AS FullReload;
+        SELECT FormatId('P', ProductID) AS ProductID, ProductName, Price, StockQuantity, IsActive
+        FROM Products
+        WHERE UpdatedAt >= p_Since;
+    END IF;
+END; //
+DELIMITER ;
+
+
+DROP PROCEDURE IF EXISTS EmployeeChangesSince;
+DELIMITER //
+CREATE PROCEDURE EmployeeChangesSince(IN p_Since TIMESTAMP(6))
+BEGIN
+    DECLARE v_Watermark TIMESTAMP(6) DEFAULT ChangeWatermark();
+
+    IF p_Since IS NULL OR EXISTS (SELECT 1 FROM ListingResets WHERE TableName = 'Employees' AND ResetAt >= p_Since) THEN
+        SELECT v_Watermark AS Watermark, TRUE AS FullReload;
+        SELECT FormatId('E', EmployeeID) AS EmployeeID, EmployeeName, JobTitle
+        FROM Employees;
+    ELSE
+        SELECT v_Watermark AS Watermark, FALSE AS FullReload;
+        SELECT FormatId('E', EmployeeID) AS EmployeeID, EmployeeName, JobTitle
+        FROM Employees
+        WHERE UpdatedAt >= p_Since;
+    END IF;
+END; //
+DELIMITER ;
+
+
+DROP PROCEDURE IF EXISTS OrderDetailChangesSince;
+DELIMITER //
+CREATE PROCEDURE OrderDetailChangesSince(IN p_Since TIMESTAMP(6))
+BEGIN
+    DECLARE v_Watermark TIMESTAMP(6) DEFAULT ChangeWatermark();
+
+    IF p_Since IS NULL OR EXISTS (SELECT 1 FROM ListingResets WHERE TableName = 'OrderDetails' AND ResetAt >= p_Since) THEN
+        SELECT v_Watermark AS Watermark, TRUE AS FullReload;
+        SELECT FormatId('OD', OrderDetailID) AS OrderDetailID, FormatId('O', OrderID) AS OrderID, FormatId('P', ProductID) AS ProductID, Quantity, SalePrice
+        FROM OrderDetails;
+    ELSE
+        SELECT v_Watermark AS Watermark, FALSE AS FullReload;
+        SELECT FormatId('OD', OrderDetailID) AS OrderDetailID, FormatId('O', OrderID) AS OrderID, FormatId('P', ProductID) AS ProductID, Quantity, SalePrice
+        FROM OrderDetails
+        WHERE UpdatedAt >= p_Since;
+    END IF;
+END; //
+DELIMITER ;
+
+
+-- Kho lưu trữ: đơn đã khép (Completed / Cancelled) của các năm đã qua được ArchiveOrderYear chuyển sang
+-- bảng nén, để Orders / OrderDetails chỉ còn dữ liệu gần đây. Báo cáo cần cả lịch sử đọc qua AllOrders / AllOrderDetails.
+CREATE TABLE IF NOT EXISTS OrdersArchive (
+    OrderID BIGINT UNSIGNED PRIMARY KEY,
+    CustomerID INT UNSIGNED NOT NULL,
+    OrderDate DATE NOT NULL,
+    Status VARCHAR(20),
+    EmployeeID INT UNSIGNED NOT NULL,
+    INDEX idx_orders_archive_date (OrderDate),
+    INDEX idx_orders_archive_customer (CustomerID, OrderDate)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
+
+CREATE TABLE IF NOT EXISTS OrderDetailsArchive (
+    OrderDetailID BIGINT UNSIGNED PRIMARY KEY,
+    OrderID BIGINT UNSIGNED NOT NULL,
+    ProductID INT UNSIGNED NOT NULL,
+    Quantity INT,
+    SalePrice DECIMAL(10,2),
+    OrderDate DATE NOT NULL,
+    INDEX idx_orderdetails_archive_order (OrderID),
+    INDEX idx_orderdetails_archive_date (OrderDate)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
+
+CREATE OR REPLACE VIEW AllOrders AS
+SELECT OrderID, CustomerID, OrderDate, Status, EmployeeID FROM Orders
+UNION ALL
+SELECT OrderID, CustomerID, OrderDate, Status, EmployeeID FROM OrdersArchive;
+
+CREATE OR REPLACE VIEW AllOrderDetails AS
+SELECT OrderDetailID, OrderID, ProductID, Quantity, SalePrice, OrderDate FROM OrderDetails
+UNION ALL
+SELECT OrderDetailID, OrderID, ProductID, Quantity, SalePrice, OrderDate FROM OrderDetailsArchive;
+
+
+-- Chuyển đơn đã khép của năm p_Year sang kho lưu trữ, mỗi lô p_BatchSize đơn là một transaction.
+-- Đơn Pending / Shipped của năm đó ở lại bảng chính. Bảng tổng hợp không đổi vì doanh số đã lưu trữ vẫn được tính.
+DROP PROCEDURE IF EXISTS ArchiveOrderYear;
+DELIMITER //
+CREATE PROCEDURE ArchiveOrderYear(IN p_Year INT, IN p_BatchSize INT)
+BEGIN
+    DECLARE v_Start DATE DEFAULT MAKEDATE(p_Year, 1);
+    DECLARE v_End DATE DEFAULT MAKEDATE(p_Year + 1, 1);
+    DECLARE v_Batch INT DEFAULT 0;
+    DECLARE v_Orders INT DEFAULT 0;
+    DECLARE v_Lines INT DEFAULT 0;
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        DROP TEMPORARY TABLE IF EXISTS ArchiveBatch;
+        RESIGNAL;
+    END;
+
+    IF p_Year >= YEAR(CURDATE()) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Only past years can be archived';
+    END IF;
+
+    DROP TEMPORARY TABLE IF EXISTS ArchiveBatch;
+    CREATE TEMPORARY TABLE ArchiveBatch (
+        OrderID BIGINT UNSIGNED PRIMARY KEY,
+        OrderDate DATE NOT NULL
+    ) ENGINE=MEMORY;
+
+    REPEAT
+        START TRANSACTION;
+        DELETE FROM ArchiveBatch;
+
+        -- Điều kiện ngày chỉ chạm phân vùng của năm p_Year; FOR UPDATE giữ trạng thái đơn không đổi tới lúc xoá
+        INSERT INTO ArchiveBatch (OrderID, OrderDate)
+        SELECT OrderID, OrderDate
+        FROM Orders
+        WHERE OrderDate >= v_Start AND OrderDate < v_End
+          AND Status IN ('Completed', 'Cancelled')
+        ORDER BY OrderID
+        LIMIT p_BatchSize
+        FOR UPDATE;
+        SET v_Batch = ROW_COUNT();
+
+        IF v_Batch > 0 THEN
+            INSERT INTO OrdersArchive (OrderID, CustomerID, OrderDate, Status, EmployeeID)
+            SELECT O.OrderID, O.CustomerID, O.OrderDate, O.Status, O.EmployeeID
+            FROM Orders O
+            JOIN ArchiveBatch B ON O.OrderID = B.OrderID AND O.OrderDate = B.OrderDate;
+
+            INSERT INTO OrderDetailsArchive (OrderDetailID, OrderID, ProductID, Quantity, SalePrice, OrderDate)
+            SELECT OD.OrderDetailID, OD.OrderID, OD.ProductID, OD.Quantity, OD.SalePrice, OD.OrderDate
+            FROM OrderDetails OD
+            JOIN ArchiveBatch B ON OD.OrderID = B.OrderID AND OD.OrderDate = B.OrderDate;
+            SET v_Lines = v_Lines + ROW_COUNT();
+
+            DELETE OD FROM OrderDetails OD
+            JOIN ArchiveBatch B ON OD.OrderID = B.OrderID AND OD.OrderDate = B.OrderDate;
+
+            DELETE O FROM Orders O
+            JOIN ArchiveBatch B ON O.OrderID = B.OrderID AND O.OrderDate = B.OrderDate;
+
+            -- Danh sách chi tiết đơn đang mở ở client phải tải lại vì các dòng vừa chuyển đi không còn trong OrderDetails
+            INSERT INTO ListingResets (TableName, ResetAt) VALUES ('OrderDetails', SYSDATE(6))
+            ON DUPLICATE KEY UPDATE ResetAt = VALUES(ResetAt);
+
+            SET v_Orders = v_Orders + v_Batch;
+        END IF;
+        COMMIT;
+    UNTIL v_Batch < p_BatchSize END REPEAT;
+
+    DROP TEMPORARY TABLE ArchiveBatch;
+    SELECT p_Year AS ArchivedYear, v_Orders AS ArchivedOrders, v_Lines AS ArchivedLines;
+END; //
+DELIMITER ;
+
+
+-- Tách các năm còn thiếu tới p_Year (tính cả p_Year) khỏi pfuture cho Orders và OrderDetails.
+-- Gọi trước khi năm mới bắt đầu để pfuture còn rỗng, khi đó REORGANIZE gần như tức thì.
+DROP PROCEDURE IF EXISTS AddOrderYearPartition;
+DELIMITER //
+CREATE PROCEDURE AddOrderYearPartition(IN p_Year INT)
+BEGIN
+    DECLARE v_Last INT;
+
+    SELECT MAX(CAST(SUBSTRING(PARTITION_NAME, 2) AS UNSIGNED)) INTO v_Last
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'Orders' AND PARTITION_NAME <> 'pfuture';
+
+    WHILE v_Last < p_Year DO
+        SET v_Last = v_Last + 1;
+        SET @partition_sql = CONCAT(
+            ' REORGANIZE PARTITION pfuture INTO (PARTITION p', v_Last,
+            ' VALUES LESS THAN (''', v_Last + 1, '-01-01''), PARTITION pfuture VALUES LESS THAN (MAXVALUE))'
+        );
+
+        SET @partition_stmt = CONCAT('ALTER TABLE Orders', @partition_sql);
+        PREPARE partition_stmt FROM @partition_stmt;
+        EXECUTE partition_stmt;
+        DEALLOCATE PREPARE partition_stmt;
+
+        SET @partition_stmt = CONCAT('ALTER TABLE OrderDetails', @partition_sql);
+        PREPARE partition_stmt FROM @partition_stmt;
+        EXECUTE partition_stmt;
+        DEALLOCATE PREPARE partition_stmt;
+    END WHILE;
+END; //
+DELIMITER ;
+
+
+-- Bảng tổng hợp doanh số, cập nhật dần khi thêm chi tiết đơn hàng hoặc huỷ đơn. Một dòng cho mỗi ID và index
+-- trên TotalSales để top-N chỉ đọc n dòng theo index. Đổi lại, các đơn đang thanh toán song song của cùng
+-- nhân viên / sản phẩm chờ khoá trên cùng một dòng tới khi đơn trước commit (đo bằng loadtest.py).
+-- Dữ liệu dẫn xuất, được tính lại bằng RebuildSalesSummaries ở dưới nên tạo lại bảng mỗi lần nạp file
+DROP TABLE IF EXISTS EmployeeSalesSummary, CustomerSalesSummary, ProductSalesSummary;
+
+CREATE TABLE EmployeeSalesSummary (
+    EmployeeID INT UNSIGNED PRIMARY KEY,
+    TotalSales DECIMAL(15,2) NOT NULL DEFAULT 0,
+    INDEX idx_employee_sales_total (TotalSales),
+    FOREIGN KEY (EmployeeID) REFERENCES Employees(EmployeeID)
+);
+
+CREATE TABLE CustomerSalesSummary (
+    CustomerID INT UNSIGNED PRIMARY KEY,
+    TotalSales DECIMAL(15,2) NOT NULL DEFAULT 0,
+    INDEX idx_customer_sales_total (TotalSales),
+    FOREIGN KEY (CustomerID) REFERENCES Customers(CustomerID)
+);
+
+CREATE TABLE ProductSalesSummary (
+    ProductID INT UNSIGNED PRIMARY KEY,
+    TotalSales DECIMAL(15,2) NOT NULL DEFAULT 0,
+    INDEX idx_product_sales_total (TotalSales),
+    FOREIGN KEY (ProductID) REFERENCES Products(ProductID)
+);
+
+-- hàm chia Slot của phiên bản trước, không còn dùng
+DROP FUNCTION IF EXISTS SalesSummarySlots;
+
+-- Doanh số theo ngày x sản phẩm x nhân viên x khách hàng, dùng cho báo cáo theo khoảng ngày
+CREATE TABLE IF NOT EXISTS DailySales (
+    SaleDate DATE NOT NULL,
+    ProductID INT UNSIGNED NOT NULL,
+    EmployeeID INT UNSIGNED NOT NULL,
+    CustomerID INT UNSIGNED NOT NULL,
+    Quantity INT NOT NULL DEFAULT 0,
+    LineCount INT NOT NULL DEFAULT 0,
+    TotalSales DECIMAL(15,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (SaleDate, ProductID, EmployeeID, CustomerID)
+);
+
+
+-- Tính lại toàn bộ bảng tổng hợp từ chi tiết đơn hàng, kể cả kho lưu trữ (bỏ qua đơn đã huỷ)
+DROP PROCEDURE IF EXISTS RebuildSalesSummaries;
+DELIMITER //
+CREATE PROCEDURE RebuildSalesSummaries()
+BEGIN
+    START TRANSACTION;
+
+    DELETE FROM EmployeeSalesSummary;
+    INSERT INTO EmployeeSalesSummary (EmployeeID, TotalSales)
+    SELECT O.EmployeeID, SUM(OD.SalePrice)
+    FROM AllOrderDetails OD
+    JOIN AllOrders O ON OD.OrderID = O.OrderID AND OD.OrderDate = O.OrderDate
+    WHERE O.Status <> 'Cancelled'
+    GROUP BY O.EmployeeID;
+
+    DELETE FROM CustomerSalesSummary;
+    INSERT INTO CustomerSalesSummary (CustomerID, TotalSales)
+    SELECT O.CustomerID, SUM(OD.SalePrice)
+    FROM AllOrderDetails OD
+    JOIN AllOrders O ON OD.OrderID = O.OrderID AND OD.OrderDate = O.OrderDate
+    WHERE O.Status <> 'Cancelled'
+    GROUP BY O.CustomerID;
+
+    DELETE FROM ProductSalesSummary;
+    INSERT INTO ProductSalesSummary (ProductID, TotalSales)
+    SELECT OD.ProductID, SUM(OD.SalePrice)
+    FROM AllOrderDetails OD
+    JOIN AllOrders O ON OD.OrderID = O.OrderID AND OD.OrderDate = O.OrderDate
+    WHERE O.Status <> 'Cancelled'
+    GROUP BY OD.ProductID;
+
+    DELETE FROM DailySales;
+    INSERT INTO DailySales (SaleDate, ProductID, EmployeeID, CustomerID, Quantity, LineCount, TotalSales)
+    SELECT O.OrderDate, OD.ProductID, O.EmployeeID, O.CustomerID, SUM(OD.Quantity), COUNT(*), SUM(OD.SalePrice)
+    FROM AllOrderDetails OD
+    JOIN AllOrders O ON OD.OrderID = O.OrderID AND OD.OrderDate = O.OrderDate
+    WHERE O.Status <> 'Cancelled' AND O.OrderDate IS NOT NULL
+    GROUP BY O.OrderDate, OD.ProductID, O.EmployeeID, O.CustomerID;
+
+    COMMIT;
+END; //
+DELIMITER ;
+
+
+-- Trả về các dòng trong bảng tổng hợp lệch với kết quả tính trực tiếp; rỗng nghĩa là khớp
+DROP PROCEDURE IF EXISTS VerifySalesSummaries;
+DELIMITER //
+CREATE PROCEDURE VerifySalesSummaries()
+BEGIN
+    SELECT 'Employee' AS Kind, FormatId('E', ID) AS ID, SUM(SummaryTotal) AS SummaryTotal, SUM(LiveTotal) AS LiveTotal
+    FROM (
+        SELECT EmployeeID AS ID, TotalSales AS SummaryTotal, 0 AS LiveTotal
+        FROM EmployeeSalesSummary
+        UNION ALL
+        SELECT O.EmployeeID, 0, SUM(OD.SalePrice)
+        FROM AllOrderDetails OD
+        JOIN AllOrders O ON OD.OrderID = O.OrderID AND OD.OrderDate = O.OrderDate
+        WHERE O.Status <> 'Cancelled'
+        GROUP BY O.EmployeeID
+    ) T
+    GROUP BY ID
+    HAVING SUM(SummaryTotal) <> SUM(LiveTotal)
+
+    UNION ALL
+
+    SELECT 'Customer', FormatId('C', ID), SUM(SummaryTotal), SUM(LiveTotal)
+    FROM (
+        SELECT CustomerID AS ID, TotalSales AS SummaryTotal, 0 AS LiveTotal
+        FROM CustomerSalesSummary
+        UNION ALL
+        SELECT O.CustomerID, 0, SUM(OD.SalePrice)
+        FROM AllOrderDetails OD
+        JOIN AllOrders O ON OD.OrderID = O.OrderID AND OD.OrderDate = O.OrderDate
+        WHERE O.Status <> 'Cancelled'
+        GROUP BY O.CustomerID
+    ) T
+    GROUP BY ID
+    HAVING SUM(SummaryTotal) <> SUM(LiveTotal)
+
+    UNION ALL
+
+    SELECT 'Product', FormatId('P', ID), SUM(SummaryTotal), SUM(LiveTotal)
+    FROM (
+        SELECT ProductID AS ID, TotalSales AS SummaryTotal, 0 AS LiveTotal
+        FROM ProductSalesSummary
+        UNION ALL
+        SELECT OD.ProductID, 0, SUM(OD.SalePrice)
+        FROM AllOrderDetails OD
+        JOIN AllOrders O ON OD.OrderID = O.OrderID AND OD.OrderDate = O.OrderDate
+        WHERE O.Status <> 'Cancelled'
+        GROUP BY OD.ProductID
+    ) T
+    GROUP BY ID
+    HAVING SUM(SummaryTotal) <> SUM(LiveTotal)
+
+    UNION ALL
+
+    SELECT 'Day', ID, SUM(SummaryTotal), SUM(LiveTotal)
+    FROM (
+        SELECT CAST(SaleDate AS CHAR) AS ID, SUM(TotalSales) AS SummaryTotal, 0 AS LiveTotal
+        FROM DailySales
+        GROUP BY SaleDate
+        UNION ALL
+        SELECT CAST(O.OrderDate AS CHAR), 0, SUM(OD.SalePrice)
+        FROM AllOrderDetails OD
+        JOIN AllOrders O ON OD.OrderID = O.OrderID AND OD.OrderDate = O.OrderDate
+        WHERE O.Status <> 'Cancelled' AND O.OrderDate IS NOT NULL
+        GROUP BY O.OrderDate
+    ) T
+    GROUP BY ID
+    HAVING SUM(SummaryTotal) <> SUM(LiveTotal);
+END; //
+DELIMITER ;
+
+
+DROP TRIGGER IF EXISTS UpdateSalesSummaryAfterOrderDetail;
+DELIMITER //
+CREATE TRIGGER UpdateSalesSummaryAfterOrderDetail
+AFTER INSERT ON OrderDetails
+FOR EACH ROW
+BEGIN
+    DECLARE v_EmployeeID INT UNSIGNED;
+    DECLARE v_CustomerID INT UNSIGNED;
+    DECLARE v_Status VARCHAR(20);
+    DECLARE v_OrderDate DATE;
+
+    SELECT EmployeeID, CustomerID, Status, OrderDate INTO v_EmployeeID, v_CustomerID, v_Status, v_OrderDate
+    FROM Orders WHERE OrderID = NEW.OrderID AND OrderDate = NEW.OrderDate;
+
+    IF v_Status <> 'Cancelled' THEN
+        INSERT INTO EmployeeSalesSummary (EmployeeID, TotalSales) VALUES (v_EmployeeID, NEW.SalePrice)
+        ON DUPLICATE KEY UPDATE TotalSales = TotalSales + NEW.SalePrice;
+
+        INSERT INTO CustomerSalesSummary (CustomerID, TotalSales) VALUES (v_CustomerID, NEW.SalePrice)
+        ON DUPLICATE KEY UPDATE TotalSales = TotalSales + NEW.SalePrice;
+
+        INSERT INTO ProductSalesSummary (ProductID, TotalSales) VALUES (NEW.ProductID, NEW.SalePrice)
+        ON DUPLICATE KEY UPDATE TotalSales = TotalSales + NEW.SalePrice;
+
+        IF v_OrderDate IS NOT NULL THEN
+            INSERT INTO DailySales (SaleDate, ProductID, EmployeeID, CustomerID, Quantity, LineCount, TotalSales)
+            VALUES (v_OrderDate, NEW.ProductID, v_EmployeeID, v_CustomerID, NEW.Quantity, 1, NEW.SalePrice)
+            ON DUPLICATE KEY UPDATE
+                Quantity = Quantity + NEW.Quantity,
+                LineCount = LineCount + 1,
+                TotalSales = TotalSales + NEW.SalePrice;
+        END IF;
+    END IF;
+END; //
+DELIMITER ;
+
+
+-- Huỷ đơn thì trừ doanh số của đơn, bỏ huỷ thì cộng lại
+DROP TRIGGER IF EXISTS UpdateSalesSummaryAfterStatusChange;
+DELIMITER //
+CREATE TRIGGER UpdateSalesSummaryAfterStatusChange
+AFTER UPDATE ON Orders
+FOR EACH ROW
+BEGIN
+    DECLARE v_Sign INT DEFAULT 0;
+
+    IF OLD.Status <> 'Cancelled' AND NEW.Status = 'Cancelled' THEN
+        SET v_Sign = -1;
+    ELSEIF OLD.Status = 'Cancelled' AND NEW.Status <> 'Cancelled' THEN
+        SET v_Sign = 1;
+    END IF;
+
+    IF v_Sign <> 0 THEN
+        INSERT INTO EmployeeSalesSummary (EmployeeID, TotalSales)
+        SELECT NEW.EmployeeID, v_Sign * SUM(SalePrice)
+        FROM OrderDetails WHERE OrderID = NEW.OrderID AND OrderDate = NEW.OrderDate
+        HAVING COUNT(*) > 0
+        ON DUPLICATE KEY UPDATE TotalSales = TotalSales + VALUES(TotalSales);
+
+        INSERT INTO CustomerSalesSummary (CustomerID, TotalSales)
+        SELECT NEW.CustomerID, v_Sign * SUM(SalePrice)
+        FROM OrderDetails WHERE OrderID = NEW.OrderID AND OrderDate = NEW.OrderDate
+        HAVING COUNT(*) > 0
+        ON DUPLICATE KEY UPDATE TotalSales = TotalSales + VALUES(TotalSales);
+
+        INSERT INTO ProductSalesSummary (ProductID, TotalSales)
+        SELECT ProductID, v_Sign * SUM(SalePrice)
+        FROM OrderDetails WHERE OrderID = NEW.OrderID AND OrderDate = NEW.OrderDate
+        GROUP BY ProductID
+        ON DUPLICATE KEY UPDATE TotalSales = TotalSales + VALUES(TotalSales);
+
+        IF NEW.OrderDate IS NOT NULL THEN
+            INSERT INTO DailySales (SaleDate, ProductID, EmployeeID, CustomerID, Quantity, LineCount, TotalSales)
+            SELECT NEW.OrderDate, ProductID, NEW.EmployeeID, NEW.CustomerID,
+                   v_Sign * SUM(Quantity), v_Sign * COUNT(*), v_Sign * SUM(SalePrice)
+            FROM OrderDetails WHERE OrderID = NEW.OrderID AND OrderDate = NEW.OrderDate
+            GROUP BY ProductID
+            ON DUPLICATE KEY UPDATE
+                Quantity = Quantity + VALUES(Quantity),
+                LineCount = LineCount + VALUES(LineCount),
+                TotalSales = TotalSales + VALUES(TotalSales);
+        END IF;
+    END IF;
+END; //
+DELIMITER ;
+
+-- Khởi tạo bảng tổng hợp từ dữ liệu mẫu đã có
+CALL RebuildSalesSummaries();
+
+
+-- Tổng hợp doanh số trong khoảng ngày theo ngày/tuần/tháng, chỉ đọc từ DailySales
+-- p_Dimension: 'product', 'employee', 'customer' hoặc NULL để lấy tổng
+DROP PROCEDURE IF EXISTS GetSalesRollup;
+DELIMITER //
+CREATE PROCEDURE GetSalesRollup(IN p_StartDate DATE, IN p_EndDate DATE, IN p_Granularity VARCHAR(10), IN p_Dimension VARCHAR(10))
+BEGIN
+    SELECT
+        CASE p_Granularity
+            WHEN 'month' THEN DATE_SUB(SaleDate, INTERVAL DAYOFMONTH(SaleDate) - 1 DAY)
+            WHEN 'week' THEN DATE_SUB(SaleDate, INTERVAL WEEKDAY(SaleDate) DAY)
+            ELSE SaleDate
+        END AS PeriodStart,
+        CASE p_Dimension
+            WHEN 'product' THEN FormatId('P', ProductID)
+            WHEN 'employee' THEN FormatId('E', EmployeeID)
+            WHEN 'customer' THEN FormatId('C', CustomerID)
+            ELSE 'ALL'
+        END AS DimensionID,
+        SUM(LineCount) AS OrderLines,
+        SUM(Quantity) AS Quantity,
+        SUM(TotalSales) AS TotalSales
+    FROM DailySales
+    WHERE SaleDate BETWEEN p_StartDate AND p_EndDate
+    GROUP BY PeriodStart, DimensionID
+    HAVING SUM(LineCount) <> 0
+    ORDER BY PeriodStart, TotalSales DESC;
+END; //
+DELIMITER ;
+
+
+-- Toàn bộ số liệu cho trang Sales Reports trong một lần gọi: quét DailySales một lần vào bảng tạm,
+-- các tổng theo nhân viên / sản phẩm / khách hàng và top-N đều tính từ bảng tạm đó
+-- p_StartDate / p_EndDate = NULL nghĩa là không giới hạn
+DROP PROCEDURE IF EXISTS SalesDashboard;
+DELIMITER //
+CREATE PROCEDURE SalesDashboard(IN p_StartDate DATE, IN p_EndDate DATE, IN p_TopN INT)
+BEGIN
+    DROP TEMPORARY TABLE IF EXISTS DashboardSales, DashboardEmployees, DashboardProducts, DashboardCustomers;
+
+    CREATE TEMPORARY TABLE DashboardSales ENGINE=MEMORY AS
+    SELECT EmployeeID, CustomerID, ProductID,
+           SUM(Quantity) AS Quantity, SUM(LineCount) AS LineCount, SUM(TotalSales) AS TotalSales
+    FROM DailySales
+    WHERE (p_StartDate IS NULL OR SaleDate >= p_StartDate)
+      AND (p_EndDate IS NULL OR SaleDate <= p_EndDate)
+    GROUP BY EmployeeID, CustomerID, ProductID;
+
+    CREATE TEMPORARY TABLE DashboardEmployees (INDEX (TotalSales)) ENGINE=MEMORY AS
+    SELECT EmployeeID, SUM(TotalSales) AS TotalSales FROM DashboardSales GROUP BY EmployeeID;
+
+    CREATE TEMPORARY TABLE DashboardProducts (INDEX (TotalSales)) ENGINE=MEMORY AS
+    SELECT ProductID, SUM(TotalSales) AS TotalSales FROM DashboardSales GROUP BY ProductID;
+
+    CREATE TEMPORARY TABLE DashboardCustomers (INDEX (TotalSales)) ENGINE=MEMORY AS
+    SELECT CustomerID, SUM(TotalSales) AS TotalSales FROM DashboardSales GROUP BY CustomerID;
+
+    -- 1. Tổng quan
+    SELECT COALESCE(SUM(TotalSales), 0) AS TotalSales,
+           COALESCE(SUM(LineCount), 0) AS OrderLines,
+           COALESCE(SUM(Quantity), 0) AS Quantity
+    FROM DashboardSales;
+
+    -- 2-4. Doanh số theo nhân viên, sản phẩm, khách hàng
+    SELECT FormatId('E', E.EmployeeID) AS EmployeeID, E.EmployeeName, D.TotalSales
+    FROM DashboardEmployees D JOIN Employees E ON D.EmployeeID = E.EmployeeID
+    ORDER BY D.TotalSales DESC;
+
+    SELECT FormatId('P', P.ProductID) AS ProductID, P.ProductName, D.TotalSales
+    FROM DashboardProducts D JOIN Products P ON D.ProductID = P.ProductID
+    ORDER BY D.TotalSales DESC;
+
+    SELECT FormatId('C', C.CustomerID) AS CustomerID, C.CustomerName, D.TotalSales
+    FROM DashboardCustomers D JOIN Customers C ON D.CustomerID = C.CustomerID
+    ORDER BY D.TotalSales DESC;
+
+    -- 5-7. Top-N
+    SELECT FormatId('E', E.EmployeeID) AS EmployeeID, E.EmployeeName, D.TotalSales
+    FROM DashboardEmployees D JOIN Employees E ON D.EmployeeID = E.EmployeeID
+    ORDER BY D.TotalSales DESC LIMIT p_TopN;
+
+    SELECT FormatId('P', P.ProductID) AS ProductID, P.ProductName, D.TotalSales
+    FROM DashboardProducts D JOIN Products P ON D.ProductID = P.ProductID
+    ORDER BY D.TotalSales DESC LIMIT p_TopN;
+
+    SELECT FormatId('C', C.CustomerID) AS CustomerID, C.CustomerName, D.TotalSales
+    FROM DashboardCustomers D JOIN Customers C ON D.CustomerID = C.CustomerID
+    ORDER BY D.TotalSales DESC LIMIT p_TopN;
+
+    DROP TEMPORARY TABLE DashboardSales, DashboardEmployees, DashboardProducts, DashboardCustomers;
+END; //
+DELIMITER ;
+
+
 CREATE OR REPLACE VIEW SalesReportByEmployee AS
 SELECT 
-    E.EmployeeID, 
+    FormatId('E', E.EmployeeID) AS EmployeeID,
     E.EmployeeName, 
-    SUM(OD.SalePrice) AS TotalSales
-FROM OrderDetails OD
-JOIN Orders O ON OD.OrderID = O.OrderID
-JOIN Employees E ON O.EmployeeID = E.EmployeeID
-GROUP BY E.EmployeeID, E.EmployeeName;
+    S.TotalSales
+FROM EmployeeSalesSummary S
+JOIN Employees E ON S.EmployeeID = E.EmployeeID;
 
 
+DROP PROCEDURE IF EXISTS GetTopEmployees;
 DELIMITER $$
 CREATE PROCEDURE GetTopEmployees(IN top_n INT)
 BEGIN
     SELECT 
-        EmployeeID,
-        EmployeeName,
-        TotalSales
-    FROM SalesReportByEmployee
-    ORDER BY TotalSales DESC
+        FormatId('E', E.EmployeeID) AS EmployeeID,
+        E.EmployeeName,
+        S.TotalSales
+    FROM EmployeeSalesSummary S
+    JOIN Employees E ON S.EmployeeID = E.EmployeeID
+    ORDER BY S.TotalSales DESC
     LIMIT top_n;
 END $$
 DELIMITER ;
@@ -203,25 +1056,25 @@ DELIMITER ;
 
 CREATE OR REPLACE VIEW SalesReportByCustomer AS
 SELECT 
-    C.CustomerID,
+    FormatId('C', C.CustomerID) AS CustomerID,
     C.CustomerName,
-    SUM(OD.SalePrice) AS TotalSales
-FROM OrderDetails OD
-JOIN Orders O ON OD.OrderID = O.OrderID
-JOIN Customers C ON O.CustomerID = C.CustomerID
-GROUP BY C.CustomerID, C.CustomerName;
+    S.TotalSales
+FROM CustomerSalesSummary S
+JOIN Customers C ON S.CustomerID = C.CustomerID;
 
 
+DROP PROCEDURE IF EXISTS GetTopCustomers;
 DELIMITER $$
 
 CREATE PROCEDURE GetTopCustomers(IN top_n INT)
 BEGIN
     SELECT 
-        CustomerID,
-        CustomerName,
-        TotalSales
-    FROM SalesReportByCustomer
-    ORDER BY TotalSales DESC
+        FormatId('C', C.CustomerID) AS CustomerID,
+        C.CustomerName,
+        S.TotalSales
+    FROM CustomerSalesSummary S
+    JOIN Customers C ON S.CustomerID = C.CustomerID
+    ORDER BY S.TotalSales DESC
     LIMIT top_n;
 END $$
 
@@ -230,59 +1083,186 @@ DELIMITER ;
 
 CREATE OR REPLACE VIEW SalesReportByProduct AS
 SELECT 
-    P.ProductID,
+    FormatId('P', P.ProductID) AS ProductID,
     P.ProductName,
-    SUM(OD.SalePrice) AS TotalSales
-FROM OrderDetails OD
-JOIN Products P ON OD.ProductID = P.ProductID
-GROUP BY P.ProductID, P.ProductName;
+    S.TotalSales
+FROM ProductSalesSummary S
+JOIN Products P ON S.ProductID = P.ProductID;
 
 
+DROP PROCEDURE IF EXISTS GetTopSellingProducts;
 DELIMITER $$
 CREATE PROCEDURE GetTopSellingProducts(IN top_n INT)
 BEGIN
     SELECT 
-        ProductID,
-        ProductName,
-        TotalSales
-    FROM SalesReportByProduct
-    ORDER BY TotalSales DESC
+        FormatId('P', P.ProductID) AS ProductID,
+        P.ProductName,
+        S.TotalSales
+    FROM ProductSalesSummary S
+    JOIN Products P ON S.ProductID = P.ProductID
+    ORDER BY S.TotalSales DESC
     LIMIT top_n;
 END $$
 DELIMITER ;
 
 
+-- Sổ kho: mọi thay đổi tồn kho đều được ghi lại theo sản phẩm và đơn hàng
+CREATE TABLE IF NOT EXISTS StockMovements (
+    MovementID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    ProductID INT UNSIGNED NOT NULL,
+    OrderID BIGINT UNSIGNED,
+    QuantityChange INT NOT NULL,
+    Reason VARCHAR(20) NOT NULL,
+    CreatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_stock_movements_product (ProductID, MovementID),
+    INDEX idx_stock_movements_order (OrderID, ProductID),
+    FOREIGN KEY (ProductID) REFERENCES Products(ProductID)
+);
+
+
+-- Giữ hàng cho một đơn: một lệnh UPDATE gộp theo sản phẩm cho cả đơn, không cập nhật từng dòng.
+-- Chỉ giữ phần chưa được giữ (theo sổ kho) nên gọi lại cho cùng đơn là an toàn.
+-- Thiếu hàng thì báo lỗi; người gọi rollback transaction nên đơn, sổ kho và tồn kho không bị ghi dở.
+DROP PROCEDURE IF EXISTS ReserveOrderStock;
 DELIMITER //
-CREATE TRIGGER UpdateInventoryAfterOrder
-AFTER INSERT ON OrderDetails
-FOR EACH ROW
+CREATE PROCEDURE ReserveOrderStock(IN p_OrderID VARCHAR(10))
 BEGIN
-    UPDATE Products
-    SET StockQuantity = StockQuantity - NEW.Quantity
-    WHERE ProductID = NEW.ProductID;
+    DECLARE v_OrderID BIGINT UNSIGNED DEFAULT ParseId(p_OrderID);
+    DECLARE v_Products INT DEFAULT 0;
+    DECLARE v_FirstMovementID BIGINT DEFAULT 0;
+
+    -- Ghi sổ phần còn thiếu trước (bảng dẫn xuất, không cần bảng tạm), rồi trừ kho đúng theo các dòng vừa ghi
+    INSERT INTO StockMovements (ProductID, OrderID, QuantityChange, Reason)
+    SELECT L.ProductID, v_OrderID, -(L.Quantity - COALESCE(R.Reserved, 0)), 'Reserve'
+    FROM (
+        SELECT ProductID, SUM(Quantity) AS Quantity
+        FROM OrderDetails
+        WHERE OrderID = v_OrderID
+        GROUP BY ProductID
+    ) L
+    LEFT JOIN (
+        SELECT ProductID, -SUM(QuantityChange) AS Reserved
+        FROM StockMovements
+        WHERE OrderID = v_OrderID
+        GROUP BY ProductID
+    ) R ON L.ProductID = R.ProductID
+    WHERE L.Quantity - COALESCE(R.Reserved, 0) <> 0;
+
+    SET v_Products = ROW_COUNT();
+
+    IF v_Products > 0 THEN
+        SET v_FirstMovementID = LAST_INSERT_ID();
+
+        -- UPDATE khoá các dòng sản phẩm nên kiểm tra tồn kho và trừ kho là nguyên tử
+        UPDATE Products P
+        JOIN StockMovements M ON P.ProductID = M.ProductID
+        SET P.StockQuantity = P.StockQuantity + M.QuantityChange
+        WHERE M.OrderID = v_OrderID AND M.MovementID >= v_FirstMovementID
+          AND P.StockQuantity + M.QuantityChange >= 0;
+
+        IF ROW_COUNT() < v_Products THEN
+            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Insufficient stock for order';
+        END IF;
+    END IF;
 END; //
 DELIMITER ;
 
 
+-- Trả lại toàn bộ hàng đang giữ của một đơn, cũng gộp theo sản phẩm
+DROP PROCEDURE IF EXISTS ReleaseOrderStock;
+DELIMITER //
+CREATE PROCEDURE ReleaseOrderStock(IN p_OrderID VARCHAR(10))
+BEGIN
+    DECLARE v_OrderID BIGINT UNSIGNED DEFAULT ParseId(p_OrderID);
+
+    -- Đơn có từ trước sổ kho (dữ liệu mẫu, datagen) đã bị trừ kho theo OrderDetails: ghi bù phần đã giữ
+    -- vào sổ để huỷ đơn vẫn trả lại hàng như trigger cũ
+    IF NOT EXISTS (SELECT 1 FROM StockMovements WHERE OrderID = v_OrderID) THEN
+        INSERT INTO StockMovements (ProductID, OrderID, QuantityChange, Reason)
+        SELECT ProductID, v_OrderID, -SUM(Quantity), 'Reserve'
+        FROM OrderDetails
+        WHERE OrderID = v_OrderID
+        GROUP BY ProductID;
+    END IF;
+
+    UPDATE Products P
+    JOIN (
+        SELECT ProductID, -SUM(QuantityChange) AS Quantity
+        FROM StockMovements
+        WHERE OrderID = v_OrderID
+        GROUP BY ProductID
+        HAVING Quantity <> 0
+    ) R ON P.ProductID = R.ProductID
+    SET P.StockQuantity = P.StockQuantity + R.Quantity;
+
+    -- Ghi sổ sau khi cộng kho: sau lệnh này tổng QuantityChange của đơn về 0
+    INSERT INTO StockMovements (ProductID, OrderID, QuantityChange, Reason)
+    SELECT ProductID, v_OrderID, -SUM(QuantityChange), 'Release'
+    FROM StockMovements
+    WHERE OrderID = v_OrderID
+    GROUP BY ProductID
+    HAVING SUM(QuantityChange) <> 0;
+END; //
+DELIMITER ;
+
+
+DROP PROCEDURE IF EXISTS ShowStockMovements;
+DELIMITER //
+CREATE PROCEDURE ShowStockMovements(IN p_ProductID VARCHAR(10), IN p_Limit INT)
+BEGIN
+    SELECT MovementID, FormatId('P', ProductID) AS ProductID, FormatId('O', OrderID) AS OrderID, QuantityChange, Reason, CreatedAt
+    FROM StockMovements
+    WHERE ProductID = ParseId(p_ProductID)
+    ORDER BY MovementID DESC
+    LIMIT p_Limit;
+END; //
+DELIMITER ;
+
+
+DROP TRIGGER IF EXISTS UpdateInventoryAfterCancel;
 DELIMITER //
 CREATE TRIGGER UpdateInventoryAfterCancel
 AFTER UPDATE ON Orders
 FOR EACH ROW
 BEGIN
     IF OLD.Status = 'Pending' AND NEW.Status = 'Cancelled' THEN
-        UPDATE Products
-        SET StockQuantity = StockQuantity + (SELECT Quantity FROM OrderDetails WHERE OrderID = OLD.OrderID)
-        WHERE ProductID IN (SELECT ProductID FROM OrderDetails WHERE OrderID = OLD.OrderID);
+        CALL ReleaseOrderStock(OLD.OrderID);
+    ELSEIF OLD.Status = 'Cancelled' AND NEW.Status <> 'Cancelled'
+        AND EXISTS (SELECT 1 FROM StockMovements WHERE OrderID = NEW.OrderID) THEN
+        -- Bỏ huỷ: giữ lại hàng như bảng tổng hợp doanh số cộng lại đơn; thiếu hàng thì lệnh UPDATE trạng thái bị từ chối.
+        -- Đơn chưa từng có trong sổ kho (có từ trước sổ, huỷ khi đã giao) chưa được trả hàng nên không giữ thêm
+        CALL ReserveOrderStock(NEW.OrderID);
     END IF;
 END; //
 DELIMITER ;
 
-CREATE INDEX idx_customer_name ON Customers(CustomerName);
-CREATE INDEX idx_product_name ON Products(ProductName);
-CREATE INDEX idx_order_date ON Orders(OrderDate);
+-- MySQL không có CREATE INDEX IF NOT EXISTS; bỏ qua index đã có để file chạy lại được sau mỗi migration
+DROP PROCEDURE IF EXISTS CreateIndexIfMissing;
+DELIMITER //
+CREATE PROCEDURE CreateIndexIfMissing(IN p_Table VARCHAR(64), IN p_Index VARCHAR(64), IN p_Definition VARCHAR(255))
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = p_Table AND INDEX_NAME = p_Index
+    ) THEN
+        SET @index_stmt = CONCAT('CREATE ', p_Definition);
+        PREPARE index_stmt FROM @index_stmt;
+        EXECUTE index_stmt;
+        DEALLOCATE PREPARE index_stmt;
+    END IF;
+END; //
+DELIMITER ;
+
+CALL CreateIndexIfMissing('Customers', 'idx_customer_name', 'INDEX idx_customer_name ON Customers(CustomerName)');
+CALL CreateIndexIfMissing('Products', 'idx_product_name', 'INDEX idx_product_name ON Products(ProductName)');
+CALL CreateIndexIfMissing('Orders', 'idx_order_date', 'INDEX idx_order_date ON Orders(OrderDate)');
+
+CALL CreateIndexIfMissing('Employees', 'idx_employee_name', 'INDEX idx_employee_name ON Employees(EmployeeName)');
 
-CREATE INDEX idx_employee_name ON Employees(EmployeeName);
-CREATE INDEX idx_orderdetails_orderid ON OrderDetails(OrderID);
+-- Index FULLTEXT ngram cho tìm kiếm chuỗi con trong các thủ tục Search*
+CALL CreateIndexIfMissing('Customers', 'ft_customer_name', 'FULLTEXT INDEX ft_customer_name ON Customers(CustomerName) WITH PARSER ngram');
+CALL CreateIndexIfMissing('Products', 'ft_product_name', 'FULLTEXT INDEX ft_product_name ON Products(ProductName) WITH PARSER ngram');
+CALL CreateIndexIfMissing('Employees', 'ft_employee_name', 'FULLTEXT INDEX ft_employee_name ON Employees(EmployeeName) WITH PARSER ngram');
 
 
 
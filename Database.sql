@@ -1,25 +1,38 @@
 drop database if exists sales_management;
 CREATE DATABASE sales_management;
 USE sales_management;
--- Tạo bảng Customers
-CREATE TABLE Customers (
-    CustomerID VARCHAR(10) PRIMARY KEY,  -- CustomerID là khóa chính
-    CustomerName VARCHAR(100) NOT NULL,
-    Address VARCHAR(100),
-    Phone VARCHAR(10)
-);
 
+-- Khoá chính là số nguyên AUTO_INCREMENT; mã hiển thị dạng C001 chỉ được tạo khi đọc ra bằng FormatId
+-- và được chuyển ngược về số bằng ParseId khi thủ tục nhận mã từ giao diện
 DELIMITER //
-CREATE TRIGGER before_insert_customers
-BEFORE INSERT ON Customers
-FOR EACH ROW
+CREATE FUNCTION FormatId(p_Prefix VARCHAR(5), p_Value BIGINT UNSIGNED)
+RETURNS VARCHAR(10)
+DETERMINISTIC NO SQL
+BEGIN
+    -- Giữ định dạng C001 cho 999 ID đầu, sau đó không cắt bớt chữ số
+    RETURN CONCAT(p_Prefix, IF(p_Value < 1000, LPAD(p_Value, 3, '0'), p_Value));
+END; //
+
+-- Nhận cả mã hiển thị ('C001', 'OD42') lẫn số ('42'); chuỗi không có phần số trả về NULL
+CREATE FUNCTION ParseId(p_Code VARCHAR(20))
+RETURNS BIGINT UNSIGNED
+DETERMINISTIC NO SQL
 BEGIN
-    DECLARE max_id INT DEFAULT 0;
-    SELECT COALESCE(MAX(CAST(SUBSTRING(CustomerID, 2) AS UNSIGNED)), 0) INTO max_id FROM Customers;
-    SET NEW.CustomerID = CONCAT('C', LPAD(max_id + 1, 3, '0'));
+    RETURN CAST(REGEXP_SUBSTR(TRIM(p_Code), '[0-9]+$') AS UNSIGNED);
 END; //
 DELIMITER ;
 
+-- Tạo bảng Customers
+CREATE TABLE Customers (
+    CustomerID INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,  -- CustomerID là khóa chính, hiển thị dạng C001
+    CustomerName VARCHAR(100) NOT NULL,
+    Address VARCHAR(100),
+    Phone VARCHAR(10),
+    -- Thời điểm ghi gần nhất (tự cập nhật), dùng để lấy phần thay đổi của danh sách thay vì tải lại cả bảng
+    UpdatedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX idx_customers_updated (UpdatedAt)
+);
+
 INSERT INTO Customers (CustomerName, Address, Phone) VALUES
 ('Nguyen Van A', '23 Tran Duy Hung, Hanoi', '0912345678'),
 ('Le Thi B', '46 Nguyen Trai, Hanoi', '0901234567'),
@@ -34,22 +47,13 @@ INSERT INTO Customers (CustomerName, Address, Phone) VALUES
 
 -- Tạo bảng Employees
 CREATE TABLE Employees (
-    EmployeeID VARCHAR(10) PRIMARY KEY,
+    EmployeeID INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
     EmployeeName VARCHAR(100) NOT NULL,
-    JobTitle VARCHAR(50)
+    JobTitle VARCHAR(50),
+    UpdatedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX idx_employees_updated (UpdatedAt)
 );
 
-DELIMITER //
-CREATE TRIGGER before_insert_employees
-BEFORE INSERT ON Employees
-FOR EACH ROW
-BEGIN
-    DECLARE max_id INT DEFAULT 0;
-    SELECT COALESCE(MAX(CAST(SUBSTRING(EmployeeID, 2) AS UNSIGNED)), 0) INTO max_id FROM Employees;
-    SET NEW.EmployeeID = CONCAT('E', LPAD(max_id + 1, 3, '0'));
-END; //
-DELIMITER ;
-
 INSERT INTO Employees (EmployeeName, JobTitle) VALUES
 ('Nguyen Minh', 'Sales Representative'),
 ('Tran Anh', 'Manager'),
@@ -65,24 +69,15 @@ INSERT INTO Employees (EmployeeName, JobTitle) VALUES
 
 -- Tạo bảng Products
 CREATE TABLE Products (
-    ProductID VARCHAR(10) PRIMARY KEY,
+    ProductID INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
     ProductName VARCHAR(100) NOT NULL,
     Price DECIMAL(10,2),
     StockQuantity INT,
-	IsActive BOOLEAN DEFAULT TRUE
+	IsActive BOOLEAN DEFAULT TRUE,
+    UpdatedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX idx_products_updated (UpdatedAt)
 );
 
-DELIMITER //
-CREATE TRIGGER before_insert_products
-BEFORE INSERT ON Products
-FOR EACH ROW
-BEGIN
-    DECLARE max_id INT DEFAULT 0;
-    SELECT COALESCE(MAX(CAST(SUBSTRING(ProductID, 2) AS UNSIGNED)), 0) INTO max_id FROM Products;
-    SET NEW.ProductID = CONCAT('P', LPAD(max_id + 1, 3, '0'));
-END; //
-DELIMITER ;
-
 INSERT INTO Products (ProductName, Price, StockQuantity) VALUES
 ('Laptop Dell XPS 13', 25000000, 15),
 ('iPhone 14 Pro', 29000000, 20),
@@ -95,15 +90,25 @@ INSERT INTO Products (ProductName, Price, StockQuantity) VALUES
 ('Sony WH-1000XM5', 8500000, 10),
 ('Asus ROG Laptop', 45000000, 5);
 
--- Tạo bảng Orders
+-- Tạo bảng Orders, phân vùng theo năm của OrderDate để truy vấn có giới hạn ngày chỉ quét các năm liên quan.
+-- Khoá chính phải chứa cột phân vùng nên là (OrderID, OrderDate); bảng phân vùng không hỗ trợ khoá ngoại
+-- nên trigger before_insert_orders kiểm tra khách hàng và nhân viên thay cho FOREIGN KEY.
+-- Năm mới được tách khỏi pfuture bằng AddOrderYearPartition trong "Advanced Database.sql".
 CREATE TABLE Orders (
-    OrderID VARCHAR(10) PRIMARY KEY,
-    CustomerID VARCHAR(10) NOT NULL,
-    OrderDate DATE,
+    OrderID BIGINT UNSIGNED AUTO_INCREMENT,
+    CustomerID INT UNSIGNED NOT NULL,
+    OrderDate DATE NOT NULL,
     Status VARCHAR(20),
-    EmployeeID VARCHAR(10) NOT NULL,
-    FOREIGN KEY (CustomerID) REFERENCES Customers(CustomerID),
-    FOREIGN KEY (EmployeeID) REFERENCES Employees(EmployeeID)
+    EmployeeID INT UNSIGNED NOT NULL,
+    PRIMARY KEY (OrderID, OrderDate),
+    INDEX idx_orders_customer (CustomerID, OrderDate),
+    INDEX idx_orders_employee (EmployeeID)
+)
+PARTITION BY RANGE COLUMNS (OrderDate) (
+    PARTITION p2024 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p2025 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p2026 VALUES LESS THAN ('2027-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
 );
 
 DELIMITER //
@@ -111,36 +116,50 @@ CREATE TRIGGER before_insert_orders
 BEFORE INSERT ON Orders
 FOR EACH ROW
 BEGIN
-    DECLARE max_id INT DEFAULT 0;
-    SELECT COALESCE(MAX(CAST(SUBSTRING(OrderID, 2) AS UNSIGNED)), 0) INTO max_id FROM Orders;
-    SET NEW.OrderID = CONCAT('O', LPAD(max_id + 1, 3, '0'));
-END; //
+    IF NOT EXISTS (SELECT 1 FROM Customers WHERE CustomerID = NEW.CustomerID) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Customer does not exist';
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM Employees WHERE EmployeeID = NEW.EmployeeID) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Employee does not exist';
+    END IF;
+END;
+//
 DELIMITER ;
 
 INSERT INTO Orders (CustomerID, OrderDate, Status, EmployeeID) VALUES
-('C004', '2024-12-01', 'Completed', 'E005'),
-('C007', '2025-01-15', 'Pending', 'E009'),
-('C010', '2025-02-20', 'Shipped', 'E004'),
-('C009', '2025-03-10', 'Completed', 'E001'),
-('C003', '2025-03-15', 'Pending', 'E010'),
-('C005', '2025-03-20', 'Cancelled', 'E003'),
-('C001', '2025-03-25', 'Completed', 'E007'),
-('C008', '2025-04-01', 'Pending', 'E004'),
-('C002', '2025-04-10', 'Shipped', 'E001'),
-('C006', '2025-04-20', 'Completed', 'E008');
+(4, '2024-12-01', 'Completed', 5),
+(7, '2025-01-15', 'Pending', 9),
+(10, '2025-02-20', 'Shipped', 4),
+(9, '2025-03-10', 'Completed', 1),
+(3, '2025-03-15', 'Pending', 10),
+(5, '2025-03-20', 'Cancelled', 3),
+(1, '2025-03-25', 'Completed', 7),
+(8, '2025-04-01', 'Pending', 4),
+(2, '2025-04-10', 'Shipped', 1),
+(6, '2025-04-20', 'Completed', 8);
 
 
 
 
--- Tạo bảng OrderDetails
+-- Tạo bảng OrderDetails, mang theo OrderDate của đơn (trigger tự điền) để phân vùng cùng với Orders
 CREATE TABLE OrderDetails (
-    OrderDetailID VARCHAR(10) PRIMARY KEY,
-    OrderID VARCHAR(10) NOT NULL,
-    ProductID VARCHAR(10) NOT NULL,
+    OrderDetailID BIGINT UNSIGNED AUTO_INCREMENT,
+    OrderID BIGINT UNSIGNED NOT NULL,
+    ProductID INT UNSIGNED NOT NULL,
     Quantity INT,
     SalePrice DECIMAL(10,2),
-    FOREIGN KEY (OrderID) REFERENCES Orders(OrderID),
-    FOREIGN KEY (ProductID) REFERENCES Products(ProductID)
+    OrderDate DATE NOT NULL,
+    UpdatedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (OrderDetailID, OrderDate),
+    INDEX idx_orderdetails_order (OrderID, OrderDate),
+    INDEX idx_orderdetails_product (ProductID),
+    INDEX idx_orderdetails_updated (UpdatedAt)
+)
+PARTITION BY RANGE COLUMNS (OrderDate) (
+    PARTITION p2024 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p2025 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p2026 VALUES LESS THAN ('2027-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
 );
 
 DELIMITER //
@@ -148,18 +167,22 @@ CREATE TRIGGER before_insert_orderdetails
 BEFORE INSERT ON OrderDetails
 FOR EACH ROW
 BEGIN
-    DECLARE max_id INT DEFAULT 0;
     DECLARE unit_price DECIMAL(10,2) DEFAULT 0;
+    DECLARE product_found INT DEFAULT 0;
+    DECLARE order_date DATE DEFAULT NULL;
 
-    -- Lấy ID lớn nhất hiện tại
-    SELECT COALESCE(MAX(CAST(SUBSTRING(OrderDetailID, 3) AS UNSIGNED)), 0)
-    INTO max_id FROM OrderDetails;
-
-    -- Sinh OrderDetailID mới
-    SET NEW.OrderDetailID = CONCAT('OD', LPAD(max_id + 1, 3, '0'));
+    -- Lấy ngày đặt hàng từ Orders, thay cho khoá ngoại tới Orders
+    SELECT OrderDate INTO order_date FROM Orders WHERE OrderID = NEW.OrderID;
+    IF order_date IS NULL THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Order does not exist';
+    END IF;
+    SET NEW.OrderDate = order_date;
 
     -- Lấy đơn giá từ bảng Products
-    SELECT Price INTO unit_price FROM Products WHERE ProductID = NEW.ProductID;
+    SELECT Price, 1 INTO unit_price, product_found FROM Products WHERE ProductID = NEW.ProductID;
+    IF product_found = 0 THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Product does not exist';
+    END IF;
 
     -- Tính SalePrice = Quantity * unit_price
     SET NEW.SalePrice = NEW.Quantity * unit_price;
@@ -169,13 +192,13 @@ DELIMITER ;
 
 
 INSERT INTO OrderDetails (OrderID, ProductID, Quantity) VALUES
-('O008', 'P001', 1),
-('O004', 'P002', 2),
-('O005', 'P003', 1),
-('O003', 'P004', 1),
-('O007', 'P005', 3),
-('O010', 'P006', 2),
-('O006', 'P007', 1),
-('O001', 'P008', 1),
-('O002', 'P009', 1),
-('O009', 'P010', 1);
+(8, 1, 1),
+(4, 2, 2),
+(5, 3, 1),
+(3, 4, 1),
+(7, 5, 3),
+(10, 6, 2),
+(6, 7, 1),
+(1, 8, 1),
+(2, 9, 1),
+(9, 10, 1);
@@ -16,6 +16,14 @@ GRANT SELECT ON sales_management.orders TO 'inventory_manager'@'localhost';
 GRANT SELECT, INSERT, UPDATE ON sales_management.orders TO 'sales_staff'@'localhost';
 GRANT SELECT ON sales_management.customers TO 'sales_staff'@'localhost';
 GRANT SELECT ON sales_management.products TO 'sales_staff'@'localhost';
+-- Khi đọc từ replica, ứng dụng chạy SHOW REPLICA STATUS trên replica để đo độ trễ
+GRANT REPLICATION CLIENT ON *.* TO 'admin'@'localhost';
+-- ChangeWatermark (các thủ tục *ChangesSince của danh sách tự cập nhật) đọc information_schema.INNODB_TRX.
+-- Thiếu quyền này INNODB_TRX trả về rỗng và watermark bỏ qua transaction đang mở
+GRANT PROCESS ON *.* TO 'admin'@'localhost';
+GRANT PROCESS ON *.* TO 'sales_manager'@'localhost';
+GRANT PROCESS ON *.* TO 'inventory_manager'@'localhost';
+GRANT PROCESS ON *.* TO 'sales_staff'@'localhost';
 FLUSH PRIVILEGES;
 
 
@@ -0,0 +1,310 @@
+-- Chuyển database đang chạy từ khoá VARCHAR ('C001', 'OD042') sang khoá số nguyên AUTO_INCREMENT.
+-- Số mới chính là phần số của mã cũ (ParseId('C001') = 1) nên không cần bảng ánh xạ và mã hiển thị giữ nguyên.
+--
+-- Bước 1-3 chạy khi ứng dụng vẫn ghi bình thường: bảng *_int được tạo song song, trigger chép mọi thay đổi
+-- sang đó và dữ liệu cũ được chép dần theo từng lô. Từ bước 4 (đổi tên bảng) cần dừng ghi cho tới hết chuỗi:
+--   1. "Migrate Integer Keys.sql" bước 4
+--   2. "Partition Orders.sql" (OrderDetails.OrderDate mà "Advanced Database.sql" dùng chỉ có sau file này)
+--   3. "Add Change Tracking.sql" (cột UpdatedAt)
+--   4. nạp lại "Advanced Database.sql" rồi triển khai bản Python mới
+-- Bảng cũ được giữ lại với hậu tố _varchar để có thể quay lại.
+USE sales_management;
+
+
+-- Bước 1: hàm chuyển mã và các bảng mới (chưa có khoá ngoại để trigger đồng bộ không bị chặn
+-- khi dòng cha chưa được chép sang)
+DROP FUNCTION IF EXISTS ParseId;
+DELIMITER //
+CREATE FUNCTION ParseId(p_Code VARCHAR(20))
+RETURNS BIGINT UNSIGNED
+DETERMINISTIC NO SQL
+BEGIN
+    RETURN CAST(REGEXP_SUBSTR(TRIM(p_Code), '[0-9]+$') AS UNSIGNED);
+END; //
+DELIMITER ;
+
+CREATE TABLE Customers_int (
+    CustomerID INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    CustomerName VARCHAR(100) NOT NULL,
+    Address VARCHAR(100),
+    Phone VARCHAR(10)
+);
+
+CREATE TABLE Employees_int (
+    EmployeeID INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    EmployeeName VARCHAR(100) NOT NULL,
+    JobTitle VARCHAR(50)
+);
+
+CREATE TABLE Products_int (
+    ProductID INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    ProductName VARCHAR(100) NOT NULL,
+    Price DECIMAL(10,2),
+    StockQuantity INT,
+    IsActive BOOLEAN DEFAULT TRUE
+);
+
+CREATE TABLE Orders_int (
+    OrderID BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    CustomerID INT UNSIGNED NOT NULL,
+    OrderDate DATE,
+    Status VARCHAR(20),
+    EmployeeID INT UNSIGNED NOT NULL
+);
+
+CREATE TABLE OrderDetails_int (
+    OrderDetailID BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    OrderID BIGINT UNSIGNED NOT NULL,
+    ProductID INT UNSIGNED NOT NULL,
+    Quantity INT,
+    SalePrice DECIMAL(10,2)
+);
+
+CREATE TABLE StockMovements_int (
+    MovementID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    ProductID INT UNSIGNED NOT NULL,
+    OrderID BIGINT UNSIGNED,
+    QuantityChange INT NOT NULL,
+    Reason VARCHAR(20) NOT NULL,
+    CreatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_stock_movements_product (ProductID, MovementID),
+    INDEX idx_stock_movements_order (OrderID, ProductID)
+);
+
+
+-- Bước 2: trigger chép mọi thay đổi trên bảng cũ sang bảng mới.
+-- Dùng upsert thay cho REPLACE để không xoá dòng cha đang được dòng con tham chiếu.
+DELIMITER //
+CREATE TRIGGER SyncCustomersInsert AFTER INSERT ON Customers FOR EACH ROW
+    INSERT INTO Customers_int (CustomerID, CustomerName, Address, Phone)
+    VALUES (ParseId(NEW.CustomerID), NEW.CustomerName, NEW.Address, NEW.Phone)
+    ON DUPLICATE KEY UPDATE CustomerName = VALUES(CustomerName), Address = VALUES(Address), Phone = VALUES(Phone); //
+CREATE TRIGGER SyncCustomersUpdate AFTER UPDATE ON Customers FOR EACH ROW
+    INSERT INTO Customers_int (CustomerID, CustomerName, Address, Phone)
+    VALUES (ParseId(NEW.CustomerID), NEW.CustomerName, NEW.Address, NEW.Phone)
+    ON DUPLICATE KEY UPDATE CustomerName = VALUES(CustomerName), Address = VALUES(Address), Phone = VALUES(Phone); //
+CREATE TRIGGER SyncCustomersDelete AFTER DELETE ON Customers FOR EACH ROW
+    DELETE FROM Customers_int WHERE CustomerID = ParseId(OLD.CustomerID); //
+
+CREATE TRIGGER SyncEmployeesInsert AFTER INSERT ON Employees FOR EACH ROW
+    INSERT INTO Employees_int (EmployeeID, EmployeeName, JobTitle)
+    VALUES (ParseId(NEW.EmployeeID), NEW.EmployeeName, NEW.JobTitle)
+    ON DUPLICATE KEY UPDATE EmployeeName = VALUES(EmployeeName), JobTitle = VALUES(JobTitle); //
+CREATE TRIGGER SyncEmployeesUpdate AFTER UPDATE ON Employees FOR EACH ROW
+    INSERT INTO Employees_int (EmployeeID, EmployeeName, JobTitle)
+    VALUES (ParseId(NEW.EmployeeID), NEW.EmployeeName, NEW.JobTitle)
+    ON DUPLICATE KEY UPDATE EmployeeName = VALUES(EmployeeName), JobTitle = VALUES(JobTitle); //
+CREATE TRIGGER SyncEmployeesDelete AFTER DELETE ON Employees FOR EACH ROW
+    DELETE FROM Employees_int WHERE EmployeeID = ParseId(OLD.EmployeeID); //
+
+CREATE TRIGGER SyncProductsInsert AFTER INSERT ON Products FOR EACH ROW
+    INSERT INTO Products_int (ProductID, ProductName, Price, StockQuantity, IsActive)
+    VALUES (ParseId(NEW.ProductID), NEW.ProductName, NEW.Price, NEW.StockQuantity, NEW.IsActive)
+    ON DUPLICATE KEY UPDATE ProductName = VALUES(ProductName), Price = VALUES(Price),
+                            StockQuantity = VALUES(StockQuantity), IsActive = VALUES(IsActive); //
+CREATE TRIGGER SyncProductsUpdate AFTER UPDATE ON Products FOR EACH ROW
+    INSERT INTO Products_int (ProductID, ProductName, Price, StockQuantity, IsActive)
+    VALUES (ParseId(NEW.ProductID), NEW.ProductName, NEW.Price, NEW.StockQuantity, NEW.IsActive)
+    ON DUPLICATE KEY UPDATE ProductName = VALUES(ProductName), Price = VALUES(Price),
+                            StockQuantity = VALUES(StockQuantity), IsActive = VALUES(IsActive); //
+CREATE TRIGGER SyncProductsDelete AFTER DELETE ON Products FOR EACH ROW
+    DELETE FROM Products_int WHERE ProductID = ParseId(OLD.ProductID); //
+
+CREATE TRIGGER SyncOrdersInsert AFTER INSERT ON Orders FOR EACH ROW
+    INSERT INTO Orders_int (OrderID, CustomerID, OrderDate, Status, EmployeeID)
+    VALUES (ParseId(NEW.OrderID), ParseId(NEW.CustomerID), NEW.OrderDate, NEW.Status, ParseId(NEW.EmployeeID))
+    ON DUPLICATE KEY UPDATE CustomerID = VALUES(CustomerID), OrderDate = VALUES(OrderDate),
+                            Status = VALUES(Status), EmployeeID = VALUES(EmployeeID); //
+CREATE TRIGGER SyncOrdersUpdate AFTER UPDATE ON Orders FOR EACH ROW
+    INSERT INTO Orders_int (OrderID, CustomerID, OrderDate, Status, EmployeeID)
+    VALUES (ParseId(NEW.OrderID), ParseId(NEW.CustomerID), NEW.OrderDate, NEW.Status, ParseId(NEW.EmployeeID))
+    ON DUPLICATE KEY UPDATE CustomerID = VALUES(CustomerID), OrderDate = VALUES(OrderDate),
+                            Status = VALUES(Status), EmployeeID = VALUES(EmployeeID); //
+CREATE TRIGGER SyncOrdersDelete AFTER DELETE ON Orders FOR EACH ROW
+    DELETE FROM Orders_int WHERE OrderID = ParseId(OLD.OrderID); //
+
+CREATE TRIGGER SyncOrderDetailsInsert AFTER INSERT ON OrderDetails FOR EACH ROW
+    INSERT INTO OrderDetails_int (OrderDetailID, OrderID, ProductID, Quantity, SalePrice)
+    VALUES (ParseId(NEW.OrderDetailID), ParseId(NEW.OrderID), ParseId(NEW.ProductID), NEW.Quantity, NEW.SalePrice)
+    ON DUPLICATE KEY UPDATE OrderID = VALUES(OrderID), ProductID = VALUES(ProductID),
+                            Quantity = VALUES(Quantity), SalePrice = VALUES(SalePrice); //
+CREATE TRIGGER SyncOrderDetailsUpdate AFTER UPDATE ON OrderDetails FOR EACH ROW
+    INSERT INTO OrderDetails_int (OrderDetailID, OrderID, ProductID, Quantity, SalePrice)
+    VALUES (ParseId(NEW.OrderDetailID), ParseId(NEW.OrderID), ParseId(NEW.ProductID), NEW.Quantity, NEW.SalePrice)
+    ON DUPLICATE KEY UPDATE OrderID = VALUES(OrderID), ProductID = VALUES(ProductID),
+                            Quantity = VALUES(Quantity), SalePrice = VALUES(SalePrice); //
+CREATE TRIGGER SyncOrderDetailsDelete AFTER DELETE ON OrderDetails FOR EACH ROW
+    DELETE FROM OrderDetails_int WHERE OrderDetailID = ParseId(OLD.OrderDetailID); //
+
+-- Sổ kho chỉ thêm dòng, không sửa / xoá
+CREATE TRIGGER SyncStockMovementsInsert AFTER INSERT ON StockMovements FOR EACH ROW
+    INSERT IGNORE INTO StockMovements_int (MovementID, ProductID, OrderID, QuantityChange, Reason, CreatedAt)
+    VALUES (NEW.MovementID, ParseId(NEW.ProductID), ParseId(NEW.OrderID), NEW.QuantityChange, NEW.Reason, NEW.CreatedAt); //
+DELIMITER ;
+
+
+-- Bước 3: chép dữ liệu cũ theo từng lô khoá chính, mỗi lô là một transaction ngắn.
+-- INSERT IGNORE giữ nguyên dòng trigger đã chép (mới hơn); INSERT ... SELECT khoá dòng nguồn
+-- nên một UPDATE đồng thời sẽ chờ lô chép xong rồi trigger ghi đè bằng giá trị mới.
+DELIMITER //
+CREATE PROCEDURE BackfillTable(IN p_Source VARCHAR(64), IN p_Key VARCHAR(64), IN p_Target VARCHAR(255),
+                               IN p_Columns VARCHAR(1000), IN p_BatchSize INT)
+BEGIN
+    SET @backfill_last = '';
+    REPEAT
+        SET @backfill_sql = CONCAT('SELECT MAX(', p_Key, ') INTO @backfill_next FROM (SELECT ', p_Key, ' FROM ', p_Source,
+                                   ' WHERE ', p_Key, ' > ? ORDER BY ', p_Key, ' LIMIT ', p_BatchSize, ') B');
+        PREPARE backfill_stmt FROM @backfill_sql;
+        EXECUTE backfill_stmt USING @backfill_last;
+        DEALLOCATE PREPARE backfill_stmt;
+
+        IF @backfill_next IS NOT NULL THEN
+            SET @backfill_sql = CONCAT('INSERT IGNORE INTO ', p_Target, ' SELECT ', p_Columns, ' FROM ', p_Source,
+                                       ' WHERE ', p_Key, ' > ? AND ', p_Key, ' <= ?');
+            PREPARE backfill_stmt FROM @backfill_sql;
+            EXECUTE backfill_stmt USING @backfill_last, @backfill_next;
+            DEALLOCATE PREPARE backfill_stmt;
+            SET @backfill_last = @backfill_next;
+        END IF;
+    UNTIL @backfill_next IS NULL END REPEAT;
+END; //
+
+CREATE PROCEDURE BackfillIntegerKeys(IN p_BatchSize INT)
+BEGIN
+    CALL BackfillTable('Customers', 'CustomerID', 'Customers_int (CustomerID, CustomerName, Address, Phone)',
+                       'ParseId(CustomerID), CustomerName, Address, Phone', p_BatchSize);
+    CALL BackfillTable('Employees', 'EmployeeID', 'Employees_int (EmployeeID, EmployeeName, JobTitle)',
+                       'ParseId(EmployeeID), EmployeeName, JobTitle', p_BatchSize);
+    CALL BackfillTable('Products', 'ProductID', 'Products_int (ProductID, ProductName, Price, StockQuantity, IsActive)',
+                       'ParseId(ProductID), ProductName, Price, StockQuantity, IsActive', p_BatchSize);
+    CALL BackfillTable('Orders', 'OrderID', 'Orders_int (OrderID, CustomerID, OrderDate, Status, EmployeeID)',
+                       'ParseId(OrderID), ParseId(CustomerID), OrderDate, Status, ParseId(EmployeeID)', p_BatchSize);
+    CALL BackfillTable('OrderDetails', 'OrderDetailID', 'OrderDetails_int (OrderDetailID, OrderID, ProductID, Quantity, SalePrice)',
+                       'ParseId(OrderDetailID), ParseId(OrderID), ParseId(ProductID), Quantity, SalePrice', p_BatchSize);
+    CALL BackfillTable('StockMovements', 'MovementID',
+                       'StockMovements_int (MovementID, ProductID, OrderID, QuantityChange, Reason, CreatedAt)',
+                       'MovementID, ParseId(ProductID), ParseId(OrderID), QuantityChange, Reason, CreatedAt', p_BatchSize);
+END; //
+DELIMITER ;
+
+CALL BackfillIntegerKeys(10000);
+
+-- Số dòng hai bên phải bằng nhau trước khi sang bước 4
+SELECT 'Customers' AS TableName, (SELECT COUNT(*) FROM Customers) AS OldRows, (SELECT COUNT(*) FROM Customers_int) AS NewRows
+UNION ALL SELECT 'Employees', (SELECT COUNT(*) FROM Employees), (SELECT COUNT(*) FROM Employees_int)
+UNION ALL SELECT 'Products', (SELECT COUNT(*) FROM Products), (SELECT COUNT(*) FROM Products_int)
+UNION ALL SELECT 'Orders', (SELECT COUNT(*) FROM Orders), (SELECT COUNT(*) FROM Orders_int)
+UNION ALL SELECT 'OrderDetails', (SELECT COUNT(*) FROM OrderDetails), (SELECT COUNT(*) FROM OrderDetails_int)
+UNION ALL SELECT 'StockMovements', (SELECT COUNT(*) FROM StockMovements), (SELECT COUNT(*) FROM StockMovements_int);
+
+
+-- Bước 4 (dừng ghi): thêm khoá ngoại không kiểm tra lại dữ liệu, rồi đổi tên tất cả bảng trong một lệnh nguyên tử
+SET foreign_key_checks = 0;
+ALTER TABLE Orders_int
+    ADD FOREIGN KEY (CustomerID) REFERENCES Customers_int(CustomerID),
+    ADD FOREIGN KEY (EmployeeID) REFERENCES Employees_int(EmployeeID),
+    ALGORITHM=INPLACE;
+ALTER TABLE OrderDetails_int
+    ADD FOREIGN KEY (OrderID) REFERENCES Orders_int(OrderID),
+    ADD FOREIGN KEY (ProductID) REFERENCES Products_int(ProductID),
+    ALGORITHM=INPLACE;
+ALTER TABLE StockMovements_int
+    ADD FOREIGN KEY (ProductID) REFERENCES Products_int(ProductID),
+    ALGORITHM=INPLACE;
+SET foreign_key_checks = 1;
+
+RENAME TABLE
+    Customers TO Customers_varchar, Customers_int TO Customers,
+    Employees TO Employees_varchar, Employees_int TO Employees,
+    Products TO Products_varchar, Products_int TO Products,
+    Orders TO Orders_varchar, Orders_int TO Orders,
+    OrderDetails TO OrderDetails_varchar, OrderDetails_int TO OrderDetails,
+    StockMovements TO StockMovements_varchar, StockMovements_int TO StockMovements;
+
+-- Trigger đi theo bảng cũ khi đổi tên; xoá hết để "Advanced Database.sql" tạo lại trên bảng mới
+DROP TRIGGER IF EXISTS SyncCustomersInsert;
+DROP TRIGGER IF EXISTS SyncCustomersUpdate;
+DROP TRIGGER IF EXISTS SyncCustomersDelete;
+DROP TRIGGER IF EXISTS SyncEmployeesInsert;
+DROP TRIGGER IF EXISTS SyncEmployeesUpdate;
+DROP TRIGGER IF EXISTS SyncEmployeesDelete;
+DROP TRIGGER IF EXISTS SyncProductsInsert;
+DROP TRIGGER IF EXISTS SyncProductsUpdate;
+DROP TRIGGER IF EXISTS SyncProductsDelete;
+DROP TRIGGER IF EXISTS SyncOrdersInsert;
+DROP TRIGGER IF EXISTS SyncOrdersUpdate;
+DROP TRIGGER IF EXISTS SyncOrdersDelete;
+DROP TRIGGER IF EXISTS SyncOrderDetailsInsert;
+DROP TRIGGER IF EXISTS SyncOrderDetailsUpdate;
+DROP TRIGGER IF EXISTS SyncOrderDetailsDelete;
+DROP TRIGGER IF EXISTS SyncStockMovementsInsert;
+DROP TRIGGER IF EXISTS before_insert_customers;
+DROP TRIGGER IF EXISTS before_insert_employees;
+DROP TRIGGER IF EXISTS before_insert_products;
+DROP TRIGGER IF EXISTS before_insert_orders;
+DROP TRIGGER IF EXISTS before_insert_orderdetails;
+DROP TRIGGER IF EXISTS UpdateSalesSummaryAfterOrderDetail;
+DROP TRIGGER IF EXISTS UpdateSalesSummaryAfterStatusChange;
+DROP TRIGGER IF EXISTS UpdateInventoryAfterCancel;
+
+-- Thủ tục, view và bảng tổng hợp của "Advanced Database.sql" được tạo lại từ đầu trên khoá số
+DROP PROCEDURE IF EXISTS RegisterCustomer;
+DROP PROCEDURE IF EXISTS UpdateCustomer;
+DROP PROCEDURE IF EXISTS SearchCustomer;
+DROP PROCEDURE IF EXISTS ShowCustomer;
+DROP PROCEDURE IF EXISTS ShowCustomerPage;
+DROP PROCEDURE IF EXISTS AddProduct;
+DROP PROCEDURE IF EXISTS EditProduct;
+DROP PROCEDURE IF EXISTS DeleteProduct;
+DROP PROCEDURE IF EXISTS SearchProduct;
+DROP PROCEDURE IF EXISTS ShowProduct;
+DROP PROCEDURE IF EXISTS ShowProductPage;
+DROP PROCEDURE IF EXISTS CreateOrder;
+DROP PROCEDURE IF EXISTS CreateOrderReturningId;
+DROP PROCEDURE IF EXISTS UpdateOrderStatus;
+DROP PROCEDURE IF EXISTS AllOrderDetail;
+DROP PROCEDURE IF EXISTS AllOrderDetailPage;
+DROP PROCEDURE IF EXISTS AddOrderDetails;
+DROP PROCEDURE IF EXISTS SearchOrder;
+DROP PROCEDURE IF EXISTS AddEmployee;
+DROP PROCEDURE IF EXISTS UpdateEmployee;
+DROP PROCEDURE IF EXISTS SearchEmployee;
+DROP PROCEDURE IF EXISTS ShowEmployee;
+DROP PROCEDURE IF EXISTS ShowEmployeePage;
+DROP PROCEDURE IF EXISTS RebuildSalesSummaries;
+DROP PROCEDURE IF EXISTS VerifySalesSummaries;
+DROP PROCEDURE IF EXISTS GetSalesRollup;
+DROP PROCEDURE IF EXISTS SalesDashboard;
+DROP PROCEDURE IF EXISTS GetTopEmployees;
+DROP PROCEDURE IF EXISTS GetTopCustomers;
+DROP PROCEDURE IF EXISTS GetTopSellingProducts;
+DROP PROCEDURE IF EXISTS ReserveOrderStock;
+DROP PROCEDURE IF EXISTS ReleaseOrderStock;
+DROP PROCEDURE IF EXISTS ShowStockMovements;
+DROP PROCEDURE IF EXISTS ReserveIds;
+DROP PROCEDURE IF EXISTS BackfillIntegerKeys;
+DROP PROCEDURE IF EXISTS BackfillTable;
+DROP VIEW IF EXISTS SalesReportByEmployee, SalesReportByCustomer, SalesReportByProduct;
+DROP TABLE IF EXISTS EmployeeSalesSummary, CustomerSalesSummary, ProductSalesSummary, DailySales, IdSequences;
+
+-- Trigger tính SalePrice thuộc "Database.sql" nên được tạo lại ở đây
+DELIMITER //
+CREATE TRIGGER before_insert_orderdetails
+BEFORE INSERT ON OrderDetails
+FOR EACH ROW
+BEGIN
+    DECLARE unit_price DECIMAL(10,2) DEFAULT 0;
+
+    -- Lấy đơn giá từ bảng Products
+    SELECT Price INTO unit_price FROM Products WHERE ProductID = NEW.ProductID;
+
+    -- Tính SalePrice = Quantity * unit_price
+    SET NEW.SalePrice = NEW.Quantity * unit_price;
+END;
+//
+DELIMITER ;
+
+-- Tiếp theo (vẫn dừng ghi): "Partition Orders.sql", "Add Change Tracking.sql", rồi mới nạp lại
+-- "Advanced Database.sql" và triển khai bản Python mới. Nạp "Advanced Database.sql" ngay lúc này sẽ lỗi vì
+-- OrderDetails chưa có OrderDate / UpdatedAt.
+-- Khi đã ổn định có thể xoá các bảng *_varchar.
@@ -0,0 +1,218 @@
+-- Chuyển Orders / OrderDetails của database đang chạy sang phân vùng theo năm của OrderDate (xem "Database.sql").
+-- Chạy ngay sau bước 4 của "Migrate Integer Keys.sql", trong cùng lần dừng ghi (thủ tục của ứng dụng đã bị xoá
+-- ở bước đó và chỉ được tạo lại khi nạp "Advanced Database.sql"). Sau file này chạy "Add Change Tracking.sql"
+-- rồi nạp lại "Advanced Database.sql" (file chạy lại được, không cần --force).
+USE sales_management;
+
+
+-- Bước 1: OrderDetails mang theo OrderDate; trigger mới điền cột này cho các dòng được thêm từ bây giờ
+ALTER TABLE OrderDetails ADD COLUMN OrderDate DATE NULL, ALGORITHM=INSTANT;
+
+DROP TRIGGER IF EXISTS before_insert_orderdetails;
+DELIMITER //
+CREATE TRIGGER before_insert_orderdetails
+BEFORE INSERT ON OrderDetails
+FOR EACH ROW
+BEGIN
+    DECLARE unit_price DECIMAL(10,2) DEFAULT 0;
+    DECLARE product_found INT DEFAULT 0;
+    DECLARE order_date DATE DEFAULT NULL;
+
+    -- Lấy ngày đặt hàng từ Orders, thay cho khoá ngoại tới Orders
+    SELECT OrderDate INTO order_date FROM Orders WHERE OrderID = NEW.OrderID;
+    IF order_date IS NULL THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Order does not exist';
+    END IF;
+    SET NEW.OrderDate = order_date;
+
+    -- Lấy đơn giá từ bảng Products
+    SELECT Price, 1 INTO unit_price, product_found FROM Products WHERE ProductID = NEW.ProductID;
+    IF product_found = 0 THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Product does not exist';
+    END IF;
+
+    -- Tính SalePrice = Quantity * unit_price
+    SET NEW.SalePrice = NEW.Quantity * unit_price;
+END;
+//
+DELIMITER ;
+
+
+-- Bước 2: điền OrderDate cho các dòng cũ theo từng khoảng OrderDetailID, mỗi khoảng một transaction ngắn
+DELIMITER //
+CREATE PROCEDURE BackfillOrderDetailDates(IN p_BatchSize INT)
+BEGIN
+    DECLARE v_From BIGINT UNSIGNED DEFAULT 0;
+    DECLARE v_Max BIGINT UNSIGNED DEFAULT 0;
+
+    IF EXISTS (SELECT 1 FROM Orders WHERE OrderDate IS NULL) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Orders without OrderDate must be fixed before partitioning';
+    END IF;
+
+    SELECT COALESCE(MAX(OrderDetailID), 0) INTO v_Max FROM OrderDetails;
+    WHILE v_From <= v_Max DO
+        UPDATE OrderDetails OD
+        JOIN Orders O ON OD.OrderID = O.OrderID
+        SET OD.OrderDate = O.OrderDate
+        WHERE OD.OrderDetailID >= v_From AND OD.OrderDetailID < v_From + p_BatchSize
+          AND OD.OrderDate IS NULL;
+        COMMIT;
+        SET v_From = v_From + p_BatchSize;
+    END WHILE;
+END; //
+DELIMITER ;
+
+CALL BackfillOrderDetailDates(10000);
+DROP PROCEDURE BackfillOrderDetailDates;
+
+-- Phải trả về 0 trước khi sang bước 3
+SELECT COUNT(*) AS LinesWithoutDate FROM OrderDetails WHERE OrderDate IS NULL;
+
+
+-- Bước 3 (dừng ghi): bỏ khoá ngoại (bảng phân vùng không hỗ trợ), đổi khoá chính rồi phân vùng
+DELIMITER //
+CREATE PROCEDURE DropForeignKeys(IN p_Table VARCHAR(64))
+BEGIN
+    DECLARE v_Name VARCHAR(64);
+    DECLARE v_Done BOOLEAN DEFAULT FALSE;
+    DECLARE foreign_keys CURSOR FOR
+        SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = p_Table AND CONSTRAINT_TYPE = 'FOREIGN KEY';
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_Done = TRUE;
+
+    OPEN foreign_keys;
+    drop_loop: LOOP
+        FETCH foreign_keys INTO v_Name;
+        IF v_Done THEN
+            LEAVE drop_loop;
+        END IF;
+        SET @drop_sql = CONCAT('ALTER TABLE ', p_Table, ' DROP FOREIGN KEY ', v_Name);
+        PREPARE drop_stmt FROM @drop_sql;
+        EXECUTE drop_stmt;
+        DEALLOCATE PREPARE drop_stmt;
+    END LOOP;
+    CLOSE foreign_keys;
+END; //
+DELIMITER ;
+
+CALL DropForeignKeys('OrderDetails');
+CALL DropForeignKeys('Orders');
+DROP PROCEDURE DropForeignKeys;
+
+-- Bỏ index phụ đang bắt đầu bằng OrderID (tên khác nhau tuỳ lịch sử bảng, ví dụ index tự tạo theo khoá ngoại
+-- sau "Migrate Integer Keys.sql"); idx_orderdetails_order (OrderID, OrderDate) thay thế ở dưới
+DELIMITER //
+CREATE PROCEDURE DropIndexesOn(IN p_Table VARCHAR(64), IN p_Column VARCHAR(64))
+BEGIN
+    DECLARE v_Name VARCHAR(64);
+    DECLARE v_Done BOOLEAN DEFAULT FALSE;
+    DECLARE indexes CURSOR FOR
+        SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = p_Table AND COLUMN_NAME = p_Column
+          AND SEQ_IN_INDEX = 1 AND INDEX_NAME <> 'PRIMARY';
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_Done = TRUE;
+
+    OPEN indexes;
+    drop_loop: LOOP
+        FETCH indexes INTO v_Name;
+        IF v_Done THEN
+            LEAVE drop_loop;
+        END IF;
+        SET @drop_sql = CONCAT('ALTER TABLE ', p_Table, ' DROP INDEX `', v_Name, '`');
+        PREPARE drop_stmt FROM @drop_sql;
+        EXECUTE drop_stmt;
+        DEALLOCATE PREPARE drop_stmt;
+    END LOOP;
+    CLOSE indexes;
+END; //
+DELIMITER ;
+
+CALL DropIndexesOn('OrderDetails', 'OrderID');
+DROP PROCEDURE DropIndexesOn;
+
+ALTER TABLE Orders
+    MODIFY OrderDate DATE NOT NULL,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (OrderID, OrderDate),
+    ADD INDEX idx_orders_customer (CustomerID, OrderDate),
+    ADD INDEX idx_orders_employee (EmployeeID)
+PARTITION BY RANGE COLUMNS (OrderDate) (
+    PARTITION p2024 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p2025 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p2026 VALUES LESS THAN ('2027-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
+);
+
+ALTER TABLE OrderDetails
+    MODIFY OrderDate DATE NOT NULL,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (OrderDetailID, OrderDate),
+    ADD INDEX idx_orderdetails_order (OrderID, OrderDate),
+    ADD INDEX idx_orderdetails_product (ProductID)
+PARTITION BY RANGE COLUMNS (OrderDate) (
+    PARTITION p2024 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p2025 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p2026 VALUES LESS THAN ('2027-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
+);
+
+-- Kiểm tra khách hàng / nhân viên thay cho khoá ngoại vừa bỏ
+DROP TRIGGER IF EXISTS before_insert_orders;
+DELIMITER //
+CREATE TRIGGER before_insert_orders
+BEFORE INSERT ON Orders
+FOR EACH ROW
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM Customers WHERE CustomerID = NEW.CustomerID) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Customer does not exist';
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM Employees WHERE EmployeeID = NEW.EmployeeID) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Employee does not exist';
+    END IF;
+END;
+//
+DELIMITER ;
+
+-- Thủ tục, trigger, view và bảng tổng hợp của "Advanced Database.sql" được tạo lại khi nạp lại file đó
+DROP TRIGGER IF EXISTS UpdateSalesSummaryAfterOrderDetail;
+DROP TRIGGER IF EXISTS UpdateSalesSummaryAfterStatusChange;
+DROP TRIGGER IF EXISTS UpdateInventoryAfterCancel;
+DROP PROCEDURE IF EXISTS RegisterCustomer;
+DROP PROCEDURE IF EXISTS UpdateCustomer;
+DROP PROCEDURE IF EXISTS SearchCustomer;
+DROP PROCEDURE IF EXISTS ShowCustomer;
+DROP PROCEDURE IF EXISTS ShowCustomerPage;
+DROP PROCEDURE IF EXISTS AddProduct;
+DROP PROCEDURE IF EXISTS EditProduct;
+DROP PROCEDURE IF EXISTS DeleteProduct;
+DROP PROCEDURE IF EXISTS SearchProduct;
+DROP PROCEDURE IF EXISTS ShowProduct;
+DROP PROCEDURE IF EXISTS ShowProductPage;
+DROP PROCEDURE IF EXISTS CreateOrder;
+DROP PROCEDURE IF EXISTS CreateOrderReturningId;
+DROP PROCEDURE IF EXISTS UpdateOrderStatus;
+DROP PROCEDURE IF EXISTS AllOrderDetail;
+DROP PROCEDURE IF EXISTS AllOrderDetailPage;
+DROP PROCEDURE IF EXISTS AddOrderDetails;
+DROP PROCEDURE IF EXISTS SearchOrder;
+DROP PROCEDURE IF EXISTS AddEmployee;
+DROP PROCEDURE IF EXISTS UpdateEmployee;
+DROP PROCEDURE IF EXISTS SearchEmployee;
+DROP PROCEDURE IF EXISTS ShowEmployee;
+DROP PROCEDURE IF EXISTS ShowEmployeePage;
+DROP PROCEDURE IF EXISTS RebuildSalesSummaries;
+DROP PROCEDURE IF EXISTS VerifySalesSummaries;
+DROP PROCEDURE IF EXISTS GetSalesRollup;
+DROP PROCEDURE IF EXISTS SalesDashboard;
+DROP PROCEDURE IF EXISTS GetTopEmployees;
+DROP PROCEDURE IF EXISTS GetTopCustomers;
+DROP PROCEDURE IF EXISTS GetTopSellingProducts;
+DROP PROCEDURE IF EXISTS ReserveOrderStock;
+DROP PROCEDURE IF EXISTS ReleaseOrderStock;
+DROP PROCEDURE IF EXISTS ShowStockMovements;
+DROP VIEW IF EXISTS SalesReportByEmployee, SalesReportByCustomer, SalesReportByProduct;
+DROP TABLE IF EXISTS EmployeeSalesSummary, CustomerSalesSummary, ProductSalesSummary, DailySales;
+
+-- Tiếp theo: "Add Change Tracking.sql", mysql sales_management < "Advanced Database.sql",
+-- rồi chạy `python archive.py --before <năm>`
+-- để chuyển các năm đã khép sang kho lưu trữ.
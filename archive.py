@@ -0,0 +1,54 @@
+import argparse
+from datetime import date
+
+from database import add_connection_arguments, connect_from_args
+
+
+def add_year_partitions(db, through_year):
+    # Tạo trước phân vùng cho các năm tới để đơn mới không rơi vào pfuture
+    db.call_proc('AddOrderYearPartition', (through_year,), readonly=False)
+
+
+def archive_year(db, year, batch_size=5000):
+    if year >= date.today().year:
+        raise ValueError(f"Year {year} is not closed yet, only past years can be archived.")
+    try:
+        result = db.call_proc('ArchiveOrderYear', (year, batch_size), readonly=False)
+    finally:
+        # Các lô đã commit vẫn được chuyển dù lô sau lỗi nên luôn xoá cache
+        db.cache.invalidate('orders', 'order_details')
+    _, orders, lines = result[0]
+    return int(orders), int(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move Completed and Cancelled orders of closed years into the compressed archive tables."
+    )
+    add_connection_arguments(parser)
+    parser.add_argument("years", nargs="*", type=int, help="Years to archive, e.g. 2023 2024")
+    parser.add_argument("--before", type=int, help="Archive every year before this one that still has orders")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Orders moved per transaction")
+    parser.add_argument("--partitions-ahead", type=int, default=1,
+                        help="Make sure Orders and OrderDetails have partitions up to this many years ahead, -1 to skip")
+    args = parser.parse_args()
+
+    db = connect_from_args(args, pool_size=1, cache_size=0)
+    years = set(args.years)
+    if args.before is not None:
+        before = date(min(args.before, date.today().year), 1, 1)
+        rows = db.fetch_query("SELECT DISTINCT YEAR(OrderDate) FROM Orders WHERE OrderDate < %s", (before,))
+        years.update(int(row[0]) for row in rows)
+
+    for year in sorted(years):
+        orders, lines = archive_year(db, year, args.batch_size)
+        print(f"Archived {orders} orders and {lines} order lines from {year}.")
+
+    if args.partitions_ahead >= 0:
+        through_year = date.today().year + args.partitions_ahead
+        add_year_partitions(db, through_year)
+        print(f"Orders and OrderDetails are partitioned through {through_year}.")
+
+
+if __name__ == "__main__":
+    main()
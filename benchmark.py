@@ -0,0 +1,247 @@
+import argparse
+import json
+import statistics
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+
+import datagen
+from database import add_connection_arguments, connect_from_args
+from managers import CustomerManager, ProductManager, OrderManager, OrderDetailsManager, EmployeeManager, ReportManager
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def sample_values(db):
+    # Lấy tham số thật từ dữ liệu hiện có để truy vấn không trả về rỗng
+    def first(query):
+        rows = db.fetch_query(query)
+        return rows[0][0] if rows else None
+
+    customer_name = first("SELECT CustomerName FROM Customers ORDER BY CustomerID DESC LIMIT 1") or "Nguyen"
+    product_name = first("SELECT ProductName FROM Products ORDER BY ProductID DESC LIMIT 1") or "Laptop"
+    employee_name = first("SELECT EmployeeName FROM Employees ORDER BY EmployeeID DESC LIMIT 1") or "Nguyen"
+    last_date = first("SELECT MAX(OrderDate) FROM Orders") or date.today()
+    return {
+        "customer_id": first("SELECT CustomerID FROM Customers ORDER BY CustomerID DESC LIMIT 1"),
+        "product_id": first("SELECT ProductID FROM Products WHERE IsActive = TRUE ORDER BY ProductID DESC LIMIT 1"),
+        "employee_id": first("SELECT EmployeeID FROM Employees ORDER BY EmployeeID DESC LIMIT 1"),
+        "order_id": first("SELECT OrderID FROM Orders ORDER BY OrderID DESC LIMIT 1"),
+        "customer_term": customer_name.split()[-1],
+        "product_term": product_name.split()[0],
+        "employee_term": employee_name.split()[-1],
+        "start_date": last_date - timedelta(days=30),
+        "end_date": last_date
+    }
+
+
+def build_cases(db, values, include_writes):
+    customers = CustomerManager(db)
+    products = ProductManager(db)
+    orders = OrderManager(db)
+    order_details = OrderDetailsManager(db)
+    employees = EmployeeManager(db)
+    reports = ReportManager(db)
+    v = values
+
+    cases = [
+        ("CustomerManager.show_customer", customers.show_customer),
+        ("CustomerManager.show_customer_page", lambda: customers.show_customer_page(None, 50)),
+        ("CustomerManager.search_customer", lambda: customers.search_customer(v["customer_term"])),
+        ("ProductManager.show_product", products.show_product),
+        ("ProductManager.show_product_page", lambda: products.show_product_page(None, 50)),
+        ("ProductManager.search_product", lambda: products.search_product(v["product_term"])),
+        ("EmployeeManager.show_employee", employees.show_employee),
+        ("EmployeeManager.search_employee", lambda: employees.search_employee(v["employee_term"])),
+        ("OrderManager.search_order", lambda: orders.search_order(v["customer_term"])),
+        ("OrderManager.get_order_details_page", lambda: orders.get_order_details_page(None, 50)),
+        ("ReportManager.get_total_sales_report", lambda: reports.get_total_sales_report(v["start_date"], v["end_date"])),
+        ("ReportManager.get_sales_rollup", lambda: reports.get_sales_rollup(v["start_date"], v["end_date"], "week")),
+        ("ReportManager.get_sales_lines_page", lambda: reports.get_sales_lines_page(v["start_date"], v["end_date"])),
+        ("ReportManager.get_sales_by_employee", reports.get_sales_by_employee),
+        ("ReportManager.get_sales_by_product", reports.get_sales_by_product),
+        ("ReportManager.get_sales_by_customer", reports.get_sales_by_customer),
+        ("ReportManager.get_top_employees", lambda: reports.get_top_employees(10)),
+        ("ReportManager.get_top_selling_products", lambda: reports.get_top_selling_products(10)),
+        ("ReportManager.get_top_customers", lambda: reports.get_top_customers(10))
+    ]
+    if include_writes:
+        # Các thao tác ghi làm thay đổi dữ liệu nên chỉ chạy khi được yêu cầu
+        cases += [
+            ("CustomerManager.register_customer", lambda: customers.register_customer("Bench Customer", "1 Bench St", "0900000000")),
+            ("CustomerManager.update_customer", lambda: customers.update_customer(v["customer_id"], "Bench Customer", "2 Bench St", "0900000001")),
+            ("ProductManager.edit_product", lambda: products.edit_product(v["product_id"], "Bench Product", 1000, 10 ** 9)),
+            ("EmployeeManager.add_employee", lambda: employees.add_employee("Bench Employee", "Sales Assistant")),
+            ("OrderManager.create_order", lambda: orders.create_order(v["customer_id"], v["end_date"], v["employee_id"])),
+            ("OrderManager.place_order", lambda: orders.place_order(v["customer_id"], v["employee_id"], v["end_date"], [(v["product_id"], 1)] * 3)),
+            ("OrderDetailsManager.add_order_details", lambda: order_details.add_order_details(v["order_id"], v["product_id"], 1)),
+            ("OrderManager.update_order_status", lambda: orders.update_order_status(v["order_id"], "Shipped"))
+        ]
+    return cases
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def server_statements(probe):
+    # Bộ đếm toàn server nên chỉ chính xác khi không có client nào khác chạy trên database benchmark
+    rows = probe.fetch_query("SHOW GLOBAL STATUS WHERE Variable_name IN ('Questions', 'Com_stmt_prepare')")
+    return {name: int(value) for name, value in rows}
+
+
+def time_case(func, repeats, warmup, probe=None):
+    for _ in range(warmup):
+        func()
+    timings = []
+    rows = None
+    before = server_statements(probe) if probe else None
+    cpu_started = time.process_time()
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+        if isinstance(result, list):
+            rows = len(result)
+    cpu_ms = (time.process_time() - cpu_started) * 1000 / repeats
+    statements = {}
+    if probe:
+        after = server_statements(probe)
+        # Trừ chính câu SHOW STATUS của lần đo trước (Questions tính cả nó)
+        statements = {
+            "round_trips": round((after["Questions"] - before["Questions"] - 1) / repeats, 2),
+            "prepares": round((after["Com_stmt_prepare"] - before["Com_stmt_prepare"]) / repeats, 2)
+        }
+    timings.sort()
+    return {
+        "repeats": repeats,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "max_ms": round(timings[-1], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "cpu_ms": round(cpu_ms, 3),
+        "rows": rows,
+        **statements
+    }
+
+
+def run(db, scale, mode, repeats, warmup, include_writes, run_info, probe=None):
+    values = sample_values(db)
+    results = []
+    for name, func in build_cases(db, values, include_writes):
+        result = dict(run_info, scale=scale, mode=mode, method=name, **time_case(func, repeats, warmup, probe))
+        print(f"{name:45s} median {result['median_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms  "
+              f"cpu {result['cpu_ms']:8.3f} ms  round trips {result.get('round_trips', '-')}  rows {result['rows']}")
+        results.append(result)
+    return results
+
+
+def write_throughput(db, values, count):
+    # Gửi liên tục count lệnh ghi rồi chờ tất cả commit xong; với --write-behind các lệnh được commit theo nhóm
+    orders = OrderManager(db)
+    started = time.perf_counter()
+    pending = [orders.create_order(values["customer_id"], values["end_date"], values["employee_id"]) for _ in range(count)]
+    failed = sum(1 for done in pending if done is None or done.exception() is not None)
+    elapsed = time.perf_counter() - started
+    return {
+        "repeats": count,
+        "median_ms": round(elapsed * 1000 / count, 3),
+        "writes_per_s": round(count / elapsed, 1),
+        "errors": failed
+    }
+
+
+def print_mode_comparison(results):
+    by_key = {(result["scale"], result["method"], result["mode"]): result for result in results}
+    print(f"{'method':45s} {'median std/fast (ms)':>24s} {'cpu std/fast (ms)':>22s} {'round trips std/fast':>22s}")
+    for (scale, method, mode), standard in by_key.items():
+        fast = by_key.get((scale, method, "fast"))
+        if mode != "standard" or fast is None:
+            continue
+        print(f"{method:45s} {standard['median_ms']:11.3f}/{fast['median_ms']:<11.3f} "
+              f"{standard['cpu_ms']:10.3f}/{fast['cpu_ms']:<10.3f} "
+              f"{standard.get('round_trips', '-')!s:>10}/{fast.get('round_trips', '-')!s:<10}")
+
+
+def compare(results, baseline_file, threshold):
+    baseline = {}
+    with open(baseline_file) as f:
+        for line in f:
+            record = json.loads(line)
+            baseline[(record["scale"], record.get("mode", "standard"), record["method"])] = record
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["scale"], result["mode"], result["method"]))
+        if previous and previous["median_ms"] > 0:
+            ratio = result["median_ms"] / previous["median_ms"]
+            if ratio > 1 + threshold:
+                regressions.append((result["scale"], result["method"], previous["median_ms"], result["median_ms"], ratio))
+    for scale, method, before, after, ratio in regressions:
+        print(f"REGRESSION scale {scale} {method}: {before:.3f} ms -> {after:.3f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every manager method against generated data at one or more scales.")
+    add_connection_arguments(parser)
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0],
+                        help="Scale factors to benchmark; each one reloads the schema and regenerates data")
+    parser.add_argument("--no-load", action="store_true", help="Benchmark the current database without reloading it")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--include-writes", action="store_true")
+    parser.add_argument("--write-throughput", type=int, default=0, metavar="N",
+                        help="Also measure sustained throughput of N CreateOrder writes")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the result cache enabled (disabled by default)")
+    parser.add_argument("--modes", nargs="+", choices=["standard", "fast"], default=None,
+                        help="Connection modes to benchmark; 'fast' uses the C extension and prepared statements")
+    parser.add_argument("--count-round-trips", action="store_true",
+                        help="Measure statements per call from the server's global status counters")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.jsonl", help="JSON Lines file to append results to")
+    parser.add_argument("--compare", help="Previous JSON Lines results to compare medians against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    modes = args.modes or ["fast" if args.fast_path else "standard"]
+    run_info = {"run_id": datetime.now().strftime("%Y%m%dT%H%M%S"), "git_commit": git_commit()}
+    all_results = []
+    for scale in args.scales:
+        if not args.no_load:
+            datagen.load_schema(args)
+            loader = connect_from_args(args, pool_size=2, cache_size=0)
+            datagen.generate(loader, scale, args.seed)
+        # Đếm round trip trên primary; khi có replica, các lệnh đọc không được tính vào đây
+        probe = connect_from_args(args, pool_size=1, cache_size=0, pool_name="bench_probe",
+                                  fast_path=False, replicas=()) if args.count_round_trips else None
+        for mode in modes:
+            db = connect_from_args(args, pool_size=2, cache_size=256 if args.with_cache else 0,
+                                   pool_name=f"bench_{mode}", fast_path=mode == "fast")
+            print(f"--- scale {scale}, {mode} ---")
+            all_results += run(db, scale, mode, args.repeats, args.warmup, args.include_writes, run_info, probe)
+            if args.write_throughput > 0:
+                result = write_throughput(db, sample_values(db), args.write_throughput)
+                print(f"{'write throughput (CreateOrder)':45s} {result['writes_per_s']:10.1f} writes/s  errors {result['errors']}")
+                all_results.append(dict(run_info, scale=scale, mode=mode, method="OrderManager.create_order throughput", **result))
+            db.close()
+    if len(modes) > 1:
+        print_mode_comparison(all_results)
+
+    with open(args.output, "a") as f:
+        for result in all_results:
+            f.write(json.dumps(result, default=str) + "\n")
+    print(f"Wrote {len(all_results)} results to {args.output}.")
+
+    if args.compare and compare(all_results, args.compare, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import csv
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from database import add_connection_arguments, connect_from_args
+
+# Cột: (tên, kiểu, độ dài tối đa, bắt buộc) theo đúng tham số của RegisterCustomer / AddProduct / AddEmployee
+ImportSpec = namedtuple("ImportSpec", ["table", "columns", "tags"])
+ImportResult = namedtuple("ImportResult", ["loaded", "rejected", "errors"])
+
+IMPORTS = {
+    "customers": ImportSpec("Customers", [
+        ("CustomerName", "text", 100, True),
+        ("Address", "text", 100, False),
+        ("Phone", "text", 10, False)
+    ], ("customers",)),
+    "products": ImportSpec("Products", [
+        ("ProductName", "text", 100, True),
+        ("Price", "price", None, True),
+        ("StockQuantity", "quantity", None, True)
+    ], ("products",)),
+    "employees": ImportSpec("Employees", [
+        ("EmployeeName", "text", 100, True),
+        ("JobTitle", "text", 50, False)
+    ], ("employees",))
+}
+
+MAX_PRICE = 10 ** 8  # DECIMAL(10,2)
+MAX_QUANTITY = 2 ** 31 - 1
+
+
+def read_chunks(source, chunk_size):
+    # Đọc mọi cột dưới dạng chuỗi để tự kiểm tra và báo lỗi theo dòng thay vì để pandas đoán kiểu
+    return pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size, skipinitialspace=True)
+
+
+def validate(df, spec):
+    missing = [name for name, _, _, _ in spec.columns if name not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}.")
+
+    errors = []
+    bad = pd.Series(False, index=df.index)
+    clean = pd.DataFrame(index=df.index)
+
+    def reject(mask, column, message):
+        nonlocal bad
+        mask = mask & ~bad
+        # Dòng trong file = index + 2 (dòng tiêu đề và đánh số từ 1)
+        errors.extend({"row": int(index) + 2, "column": column, "error": message} for index in df.index[mask])
+        bad = bad | mask
+
+    for name, kind, max_length, required in spec.columns:
+        values = df[name].str.strip()
+        empty = values == ""
+        if required:
+            reject(empty, name, "is required")
+        if kind == "text":
+            if max_length:
+                reject(values.str.len() > max_length, name, f"is longer than {max_length} characters")
+            clean[name] = values.where(~empty, None)
+        else:
+            numbers = pd.to_numeric(values.str.replace(",", "", regex=False), errors="coerce")
+            reject(~empty & numbers.isna(), name, "is not a number")
+            if kind == "price":
+                reject((numbers < 0) | (numbers >= MAX_PRICE), name, f"must be between 0 and {MAX_PRICE}")
+                clean[name] = numbers.round(2)
+            else:
+                reject(numbers.notna() & ((numbers < 0) | (numbers > MAX_QUANTITY) | (numbers % 1 != 0)),
+                       name, "must be a non-negative whole number")
+                clean[name] = numbers
+    return clean[~bad], errors
+
+
+def _to_mysql(value, kind):
+    # Kiểu numpy không được connector chuyển đổi, đưa về kiểu Python; giá gửi dạng chuỗi để giữ đúng 2 chữ số thập phân
+    if value is None or pd.isna(value):
+        return None
+    if kind == "price":
+        return f"{value:.2f}"
+    if kind == "quantity":
+        return int(value)
+    return value
+
+
+def insert_rows(db, spec, df, batch_size):
+    # ID do AUTO_INCREMENT cấp, không cần cấp phát trước
+    columns = [name for name, _, _, _ in spec.columns]
+    query = f"INSERT INTO {spec.table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        rows = [
+            tuple(_to_mysql(value, kind) for value, (_, kind, _, _) in zip(values, spec.columns))
+            for values in batch.itertuples(index=False, name=None)
+        ]
+        # executemany gộp INSERT thành câu nhiều dòng; mỗi batch là một transaction
+        with db.transaction(f"import {spec.table}") as cursor:
+            cursor.executemany(query, rows)
+
+
+def import_file(db, name, source, batch_size=10000, chunk_size=100000, progress=None):
+    spec = IMPORTS[name]
+    loaded = 0
+    errors = []
+    seen = 0
+    started = time.monotonic()
+    try:
+        # read_csv đánh index liên tục qua các chunk nên số dòng trong báo lỗi đúng với file
+        for chunk in read_chunks(source, chunk_size):
+            seen += len(chunk)
+            valid, chunk_errors = validate(chunk, spec)
+            errors.extend(chunk_errors)
+            insert_rows(db, spec, valid, batch_size)
+            loaded += len(valid)
+            if progress:
+                progress(seen, loaded, len(errors), time.monotonic() - started)
+    finally:
+        if loaded:
+            db.cache.invalidate(*spec.tags)
+    # Mỗi dòng bị loại chỉ có một lỗi (lỗi đầu tiên) nên số lỗi bằng số dòng bị loại
+    return ImportResult(loaded, len(errors), errors)
+
+
+def write_error_report(errors, f):
+    writer = csv.DictWriter(f, fieldnames=["row", "column", "error"])
+    writer.writeheader()
+    writer.writerows(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and bulk load customers, products or employees from a CSV file.")
+    add_connection_arguments(parser)
+    parser.add_argument("name", choices=sorted(IMPORTS))
+    parser.add_argument("file", help="CSV file with a header row naming the columns")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per INSERT transaction")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows read and validated at a time")
+    parser.add_argument("--errors", default="import_errors.csv", help="Where to write rejected rows")
+    args = parser.parse_args()
+
+    def report(seen, loaded, rejected, elapsed):
+        print(f"Read {seen} rows, loaded {loaded}, rejected {rejected} ({seen / max(elapsed, 1e-9):.0f} rows/s)")
+
+    db = connect_from_args(args, pool_size=2, cache_size=0)
+    result = import_file(db, args.name, args.file, args.batch_size, args.chunk_size, report)
+    print(f"Loaded {result.loaded} {args.name}, rejected {result.rejected} rows.")
+    if result.errors:
+        with open(args.errors, "w", newline="", encoding="utf-8") as f:
+            write_error_report(result.errors, f)
+        print(f"Wrote {len(result.errors)} errors to {args.errors}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,866 @@
+import json
+import mysql.connector
+from mysql.connector import pooling, FieldType
+from contextlib import contextmanager
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+import atexit
+import queue
+import threading
+import time
+import contextvars
+
+from instrumentation import Instrumentation
+
+class ResultSet(list):
+    # Danh sách tuple như cũ, kèm cursor.description để dựng DataFrame theo kiểu cột
+    def __init__(self, rows=(), description=None):
+        super().__init__(rows)
+        self.description = list(description or [])
+
+    @property
+    def columns(self):
+        return [column[0] for column in self.description]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ResultSet(super().__getitem__(index), self.description)
+        return super().__getitem__(index)
+
+
+INTEGER_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG, FieldType.LONGLONG, FieldType.YEAR}
+DECIMAL_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL}
+FLOAT_TYPES = {FieldType.FLOAT, FieldType.DOUBLE}
+DATE_TYPES = {FieldType.DATE, FieldType.NEWDATE}
+DATETIME_TYPES = {FieldType.DATETIME, FieldType.TIMESTAMP}
+CATEGORY_COLUMNS = {"Status", "JobTitle", "Kind"}
+
+# Connector trước 9.2 đọc nhiều result set qua execute(multi=True); từ 9.2 tham số này bị bỏ, thay bằng nextset()
+LEGACY_MULTI_EXECUTE = mysql.connector.__version_info__[:2] < (9, 2)
+
+
+def _column_to_array(np, pd, name, type_code, values, exact_decimals):
+    has_nulls = any(value is None for value in values)
+    if type_code in INTEGER_TYPES:
+        if has_nulls:
+            return pd.array(values, dtype="Int64")
+        return np.fromiter(values, dtype=np.int64, count=len(values))
+    if type_code in DECIMAL_TYPES:
+        if exact_decimals:
+            import pyarrow as pa
+            sample = next((value for value in values if value is not None), None)
+            scale = -sample.as_tuple().exponent if sample is not None else 2
+            return pd.array(values, dtype=pd.ArrowDtype(pa.decimal128(38, max(scale, 0))))
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if type_code in FLOAT_TYPES:
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if type_code in DATE_TYPES:
+        return np.array(values, dtype="datetime64[D]")
+    if type_code in DATETIME_TYPES:
+        return np.array(values, dtype="datetime64[us]")
+    if name in CATEGORY_COLUMNS:
+        return pd.Categorical(values)
+    return np.array(values, dtype=object)
+
+
+def results_to_frame(results, exact_decimals=False):
+    # Dựng từng cột một từ cursor.description thay vì để pandas suy kiểu theo từng dòng.
+    # numpy / pandas chỉ nạp khi cần DataFrame để managers và API service khởi động nhanh
+    import numpy as np
+    import pandas as pd
+
+    description = getattr(results, "description", None)
+    if not description:
+        return pd.DataFrame(list(results))
+    columns = list(zip(*results)) if results else [()] * len(description)
+    data = {}
+    for column, values in zip(description, columns):
+        name, type_code = column[0], column[1]
+        data[name] = _column_to_array(np, pd, name, type_code, list(values), exact_decimals)
+    return pd.DataFrame(data, copy=False)
+
+
+class QueryCache:
+    def __init__(self, max_entries=256, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires_at, tags, value), thứ tự trong OrderedDict là thứ tự LRU
+        self._entries = OrderedDict()
+        # Mỗi lần invalidate một tag sẽ tăng generation của tag đó
+        self._generations = {}
+        # Thời điểm invalidate gần nhất của mỗi tag, để biết dữ liệu nào vừa được ghi
+        self._invalidated_at = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, tags, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, tags):
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def put(self, key, value, tags=(), generation=None):
+        with self._lock:
+            # Bỏ qua kết quả đã được đọc trước một lần ghi xảy ra trong lúc truy vấn
+            if generation is not None and generation != tuple(self._generations.get(tag, 0) for tag in tags):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, frozenset(tags), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        tags = set(tags)
+        with self._lock:
+            now = time.monotonic()
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                self._invalidated_at[tag] = now
+            stale = [key for key, (_, entry_tags, _) in self._entries.items() if entry_tags & tags]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def changed_within(self, tags, seconds):
+        with self._lock:
+            cutoff = time.monotonic() - seconds
+            return any(self._invalidated_at.get(tag, float("-inf")) > cutoff for tag in tags)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+def query_label(query):
+    return " ".join(query.split())[:120]
+
+
+# Phiên làm việc hiện tại (mỗi phiên UI một giá trị), dùng để đọc lại dữ liệu vừa ghi từ primary
+current_session = contextvars.ContextVar("current_session", default=None)
+
+
+class ServerPool:
+    # Pool connection tới một server (primary hoặc một replica), giới hạn số connection được mượn cùng lúc
+    def __init__(self, name, config, pool_name, pool_size, checkout_timeout, reset_session, instrumentation):
+        self.name = name
+        self.config = config
+        self.pool_name = pool_name
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.reset_session = reset_session
+        self.instrumentation = instrumentation
+        # Các request vượt quá pool_size sẽ chờ
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._pool_lock = threading.Lock()
+        self.pool = None
+        # Chỉ dùng cho replica: độ trễ đo lần cuối, lúc đo và thời điểm được thử lại sau khi lỗi
+        self.lag = None
+        self.lag_checked_at = float("-inf")
+        self.down_until = 0.0
+
+    def create(self):
+        with self._pool_lock:
+            if self.pool is not None:
+                return self.pool
+            try:
+                self.pool = pooling.MySQLConnectionPool(
+                    pool_name=self.pool_name,
+                    pool_size=self.pool_size,
+                    # Reset session sẽ huỷ mọi prepared statement nên fast path giữ nguyên session
+                    pool_reset_session=self.reset_session,
+                    **self.config
+                )
+                print(f"Database connection pool '{self.pool_name}' established with {self.pool_size} connections.")
+            except mysql.connector.Error as err:
+                print(f"Error connecting to the database: {err}")
+                self.pool = None
+            return self.pool
+
+    def checkout(self):
+        label = "checkout" if self.name == "primary" else f"checkout {self.name}"
+        with self.instrumentation.timed("pool", label):
+            acquired = self._slots.acquire(timeout=self.checkout_timeout)
+        if not acquired:
+            raise Exception(f"Timed out waiting for a free connection in pool '{self.pool_name}'.")
+        try:
+            pool = self.pool or self.create()
+            if pool is None:
+                raise Exception("Database connection is not established.")
+            conn = pool.get_connection()
+            # Kiểm tra connection còn sống, nếu bị rớt thì kết nối lại
+            try:
+                conn.ping(reconnect=True, attempts=3, delay=1)
+            except mysql.connector.Error:
+                conn.close()
+                raise
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            if not self.reset_session:
+                # Không reset session thì transaction mà lệnh đọc mở ra (autocommit=0) vẫn còn:
+                # kết thúc nó để lần mượn sau không đọc snapshot cũ và start_transaction() không lỗi
+                try:
+                    conn.rollback()
+                except mysql.connector.Error:
+                    pass
+            conn.close()  # Trả connection về pool
+        finally:
+            self._slots.release()
+
+
+def parse_server(server):
+    # "host", "host:port" hoặc dict cấu hình connection
+    if isinstance(server, dict):
+        return dict(server)
+    host, _, port = server.rpartition(":") if ":" in server else (server, "", "")
+    return {"host": host, "port": int(port)} if port else {"host": host}
+
+
+# Deadlock và hết thời gian chờ khoá: transaction bị huỷ trước khi commit nên ghi lại được an toàn
+ROLLED_BACK_ERRORS = {1213, 1205}
+
+
+# Một lệnh ghi đang chờ trong hàng đợi write-behind; future hoàn tất khi transaction chứa nó đã commit
+WriteRequest = namedtuple("WriteRequest", ["proc_name", "params", "tags", "session", "future"])
+
+
+class WriteBehindQueue:
+    # Một luồng nền gom các lệnh ghi thành từng transaction: mỗi lần commit (và fsync redo log)
+    # phục vụ cả lô thay vì một lệnh. Hàng đợi có giới hạn nên khi DB chậm, người gọi phải chờ (backpressure)
+    def __init__(self, db, max_size=10000, batch_size=100, max_delay_ms=5, put_timeout=30):
+        self.db = db
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_size)
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+        # Ghi nốt các lệnh còn trong hàng đợi trước khi tiến trình thoát
+        atexit.register(self.close)
+
+    def submit(self, proc_name, params, tags=()):
+        if self._closed:
+            raise Exception("Write queue is closed.")
+        request = WriteRequest(proc_name, tuple(params), tuple(tags), current_session.get(), Future())
+        try:
+            self._queue.put(request, timeout=self.put_timeout)
+        except queue.Full:
+            raise Exception(f"Write queue is full, {proc_name} was not accepted after {self.put_timeout}s.")
+        # Phiên vừa ghi đọc từ primary ngay từ bây giờ, kể cả trước khi lô được commit
+        self.db._note_write()
+        return request.future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _take_batch(self):
+        # Chờ lệnh đầu tiên, sau đó gom thêm trong tối đa max_delay hoặc tới khi đủ batch_size
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Đưa tín hiệu dừng về lại để vòng lặp chính kết thúc sau khi ghi lô này
+                self._queue.task_done()
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                self._queue.task_done()
+                return
+            try:
+                self._commit(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _commit(self, batch):
+        failed = {}
+        try:
+            with self.db.connection() as conn, self.db.instrumentation.timed("group_commit", "write-behind") as call:
+                call.rows = len(batch)
+                cursor = conn.cursor()
+                try:
+                    conn.start_transaction()
+                    for index, request in enumerate(batch):
+                        # Savepoint để lệnh lỗi chỉ huỷ phần của nó, các lệnh khác trong lô vẫn được commit
+                        cursor.execute("SAVEPOINT write_behind")
+                        try:
+                            self.db._run_proc(cursor, request.proc_name, request.params)
+                            cursor.execute("RELEASE SAVEPOINT write_behind")
+                        except mysql.connector.Error as err:
+                            if err.errno in ROLLED_BACK_ERRORS:
+                                raise
+                            cursor.execute("ROLLBACK TO SAVEPOINT write_behind")
+                            failed[index] = err
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cursor.close()
+        except mysql.connector.Error as err:
+            if err.errno not in ROLLED_BACK_ERRORS:
+                # Lỗi lúc commit hoặc mất kết nối: không biết lô đã được commit hay chưa, ghi lại có thể
+                # tạo đơn hai lần nên báo lỗi cho từng lệnh để người gọi tự kiểm tra
+                print(f"Group commit of {len(batch)} writes failed, outcome unknown: {err}")
+                for request in batch:
+                    request.future.set_exception(err)
+                return
+            # Deadlock / hết thời gian chờ khoá: cả lô chắc chắn đã bị huỷ, ghi lại từng lệnh một
+            # để lỗi chỉ thuộc về lệnh gây ra nó
+            print(f"Group commit of {len(batch)} writes was rolled back, retrying one by one: {err}")
+            for request in batch:
+                self.db._execute_now(request.proc_name, request.params, request.tags, request.future)
+            return
+        self._complete(batch, failed)
+
+    def _complete(self, batch, failed):
+        tags = set()
+        for index, request in enumerate(batch):
+            if index in failed:
+                print(f"Error executing procedure {request.proc_name}: {failed[index]}")
+                request.future.set_exception(failed[index])
+            else:
+                tags.update(request.tags)
+        if tags:
+            self.db.cache.invalidate(*tags)
+        self.db._note_write(*{request.session for request in batch})
+        for index, request in enumerate(batch):
+            if index not in failed:
+                request.future.set_result(None)
+
+    def flush(self):
+        # Chờ tới khi mọi lệnh đã xếp hàng được commit (hoặc báo lỗi)
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+
+class DatabaseConnection:
+    def __init__(self, host, user, password, database, pool_size=5, pool_name="sales_pool",
+                 checkout_timeout=10, cache_size=256, cache_ttl=60, port=3306, slow_threshold_ms=200,
+                 fast_path=False, statement_cache_size=64, replicas=(), max_replica_lag=5,
+                 replica_check_interval=2, replica_retry_after=30, write_behind=False, write_queue_size=10000,
+                 group_commit_size=100, group_commit_delay_ms=5, redact_params=True):
+        self.config = {
+            "host": host,
+            "port": port,
+            "user": user,
+            "password": password,
+            "database": database
+        }
+        # fast_path: C extension, CALL một round trip và prepared statement (binary protocol) cho truy vấn
+        self.fast_path = fast_path
+        self.statement_cache_size = statement_cache_size
+        if fast_path:
+            if mysql.connector.HAVE_CEXT:
+                self.config["use_pure"] = False
+            else:
+                print("C extension of mysql-connector is not available, using the pure Python connector.")
+        self.pool_size = pool_size
+        self.pool_name = pool_name
+        self.checkout_timeout = checkout_timeout
+        self.cache = QueryCache(max_entries=cache_size, ttl=cache_ttl)
+        self.instrumentation = Instrumentation(slow_threshold_ms=slow_threshold_ms, redact_params=redact_params)
+        self.primary = ServerPool(
+            "primary", self.config, pool_name, pool_size, checkout_timeout, not fast_path, self.instrumentation
+        )
+        # Ghi luôn vào primary; đọc và báo cáo vào replica có độ trễ không quá max_replica_lag giây
+        self.replicas = [
+            ServerPool(
+                f"replica{index}", {**self.config, **parse_server(server)}, f"{pool_name}_replica{index}",
+                pool_size, checkout_timeout, not fast_path, self.instrumentation
+            )
+            for index, server in enumerate(replicas, 1)
+        ]
+        self.max_replica_lag = max_replica_lag
+        self.replica_check_interval = replica_check_interval
+        self.replica_retry_after = replica_retry_after
+        # Sau một lần ghi, phiên đó đọc từ primary cho tới khi replica chắc chắn đã chép tới lần ghi
+        self.sticky_seconds = max_replica_lag + replica_check_interval
+        self._last_writes = {}
+        self._route_lock = threading.Lock()
+        self._next_replica = 0
+        self.route_counts = {"primary": 0, "replica": 0, "sticky": 0, "fresh": 0, "fallback": 0}
+        self.primary.create()
+        # write_behind: execute_proc xếp lệnh ghi vào hàng đợi và trả về Future, luồng nền commit theo nhóm
+        self.write_queue = None
+        if write_behind:
+            self.write_queue = WriteBehindQueue(self, write_queue_size, group_commit_size, group_commit_delay_ms)
+
+    def close(self):
+        if self.write_queue is not None:
+            self.write_queue.close()
+
+    def _count_route(self, route):
+        with self._route_lock:
+            self.route_counts[route] += 1
+
+    def _note_write(self, *sessions):
+        now = time.monotonic()
+        with self._route_lock:
+            for session in sessions or (current_session.get(),):
+                self._last_writes[session] = now
+            # Bỏ các phiên đã hết thời gian bám primary để dict không lớn dần
+            if len(self._last_writes) > 1000:
+                cutoff = now - self.sticky_seconds
+                self._last_writes = {key: at for key, at in self._last_writes.items() if at > cutoff}
+
+    def _is_sticky(self):
+        with self._route_lock:
+            last_write = self._last_writes.get(current_session.get())
+        return last_write is not None and time.monotonic() - last_write < self.sticky_seconds
+
+    def _replica_lag(self, conn):
+        # None nghĩa là server không phải replica hoặc đã dừng chép, không dùng để đọc
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except mysql.connector.Error:
+                cursor.execute("SHOW SLAVE STATUS")  # MySQL trước 8.0.22
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        if not row:
+            return None
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        return None if lag is None else int(lag)
+
+    def _checkout_replica(self):
+        # Thử lần lượt các replica (xoay vòng); replica lỗi bị bỏ qua replica_retry_after giây
+        now = time.monotonic()
+        with self._route_lock:
+            start = self._next_replica
+            self._next_replica += 1
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            check_due = now - replica.lag_checked_at >= self.replica_check_interval
+            if replica.down_until > now:
+                continue
+            if not check_due and (replica.lag is None or replica.lag > self.max_replica_lag):
+                continue
+            try:
+                conn = replica.checkout()
+            except Exception as e:
+                print(f"Replica {replica.name} is unavailable: {e}")
+                replica.down_until = now + self.replica_retry_after
+                continue
+            try:
+                if check_due:
+                    replica.lag = self._replica_lag(conn)
+                    replica.lag_checked_at = now
+            except mysql.connector.Error as err:
+                print(f"Could not check lag of replica {replica.name}: {err}")
+                replica.lag = None
+                replica.lag_checked_at = now
+            if replica.lag is not None and replica.lag <= self.max_replica_lag:
+                return replica, conn
+            replica.release(conn)
+        return None, None
+
+    def _read_route(self, fresh):
+        # fresh: cần dữ liệu mới nhất nên vẫn đọc primary
+        if not self.replicas:
+            return "primary"
+        if fresh:
+            return "fresh"
+        if self._is_sticky():
+            return "sticky"
+        return "replica"
+
+    def _checkout(self, readonly, fresh):
+        # readonly: được phép đọc từ replica
+        server, conn = None, None
+        if not readonly:
+            self._note_write()
+            route = "primary"
+        else:
+            route = self._read_route(fresh)
+        if route == "replica":
+            server, conn = self._checkout_replica()
+            route = "replica" if server is not None else "fallback"
+        self._count_route(route)
+        if server is None:
+            server, conn = self.primary, self.primary.checkout()
+        return server, conn
+
+    @contextmanager
+    def connection(self, readonly=False, fresh=False):
+        server, conn = self._checkout(readonly, fresh)
+        try:
+            yield conn
+        finally:
+            server.release(conn)
+
+    def read_server(self, fresh=False):
+        # Server cho một lần đọc không đi qua pool này (driver async của API service): cùng quy tắc
+        # định tuyến với connection(readonly=True) nhưng không mượn connection nào. Độ trễ là giá trị
+        # các lần đọc qua pool đo lần cuối; replica chưa được đo hoặc đang lỗi thì đọc primary
+        route = self._read_route(fresh)
+        server = None
+        if route == "replica":
+            now = time.monotonic()
+            with self._route_lock:
+                start = self._next_replica
+                self._next_replica += 1
+            for offset in range(len(self.replicas)):
+                replica = self.replicas[(start + offset) % len(self.replicas)]
+                if replica.down_until <= now and replica.lag is not None and replica.lag <= self.max_replica_lag:
+                    server = replica
+                    break
+            route = "replica" if server is not None else "fallback"
+        self._count_route(route)
+        return server or self.primary
+
+    def replica_status(self):
+        now = time.monotonic()
+        return [
+            {
+                "name": replica.name,
+                "host": f"{replica.config['host']}:{replica.config.get('port', 3306)}",
+                "lag_seconds": replica.lag,
+                "checked_seconds_ago": None if replica.lag_checked_at == float("-inf") else round(now - replica.lag_checked_at, 1),
+                "down": replica.down_until > now
+            }
+            for replica in self.replicas
+        ]
+
+    def execute_proc(self, proc_name, params, tags=(), defer=True):
+        # tags: nhóm cache bị xoá sau khi commit. Trả về Future hoàn tất khi dữ liệu đã commit;
+        # defer=False luôn chạy ngay, dùng cho thủ tục tự mở transaction như RebuildSalesSummaries
+        if defer and self.write_queue is not None:
+            return self.write_queue.submit(proc_name, params, tags)
+        return self._execute_now(proc_name, params, tags, Future())
+
+    def _execute_now(self, proc_name, params, tags, done):
+        try:
+            with self.connection() as conn, self.instrumentation.timed("proc", proc_name, params) as call:
+                cursor = conn.cursor()
+                try:
+                    self._run_proc(cursor, proc_name, params)
+                    conn.commit()
+                    print(f"Procedure {proc_name} executed successfully.")
+                except mysql.connector.Error as err:
+                    call.error = err
+                    print(f"Error executing procedure {proc_name}: {err}")
+                    conn.rollback()
+                    done.set_exception(err)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"Error: {e}")
+            if not done.done():
+                done.set_exception(e)
+        if not done.done():
+            if tags:
+                self.cache.invalidate(*tags)
+            done.set_result(None)
+        return done
+
+    def _run_proc(self, cursor, proc_name, params):
+        if self.fast_path:
+            for _ in self._execute_call(cursor, proc_name, params):
+                pass
+        else:
+            cursor.callproc(proc_name, params)
+
+    def call_proc(self, proc_name, params, all_results=False, readonly=True, fresh=False):
+        # Khác fetch_proc ở chỗ lỗi được ném ra cho người gọi (xuất file, lưu trữ cần biết là lỗi).
+        # all_results=True trả về mọi result set của thủ tục, mặc định chỉ lấy result set cuối.
+        # Thủ tục có ghi dữ liệu phải gọi với readonly=False để chạy trên primary
+        result_sets = []
+        with self.connection(readonly, fresh) as conn, self.instrumentation.timed("proc", proc_name, params) as call:
+            cursor = conn.cursor()
+            try:
+                if self.fast_path:
+                    result_sets.extend(self._execute_call(cursor, proc_name, params))
+                else:
+                    cursor.callproc(proc_name, params)
+                    for result in cursor.stored_results():
+                        result_sets.append(ResultSet(result.fetchall(), result.description))
+                conn.commit()
+                if len(result_sets) == 1:
+                    call.rows = result_sets[0]
+                else:
+                    call.rows = ResultSet(row for result_set in result_sets for row in result_set)
+            finally:
+                cursor.close()
+        if all_results:
+            return result_sets
+        return result_sets[-1] if result_sets else ResultSet()
+
+    def _execute_call(self, cursor, proc_name, params):
+        # callproc gửi SET @_p..., CALL rồi SELECT tham số OUT; thủ tục không có OUT chỉ cần một CALL
+        if not proc_name.isidentifier():
+            raise ValueError(f"Invalid procedure name '{proc_name}'.")
+        statement = f"CALL {proc_name}({', '.join(['%s'] * len(params))})"
+        result_sets = []
+        if LEGACY_MULTI_EXECUTE:
+            # Mỗi result set của CALL là một phần tử của execute(multi=True)
+            for result in cursor.execute(statement, params, multi=True):
+                if result.with_rows:
+                    result_sets.append(ResultSet(result.fetchall(), result.description))
+            return result_sets
+        # Các result set tiếp theo được đọc bằng nextset()
+        cursor.execute(statement, params)
+        while True:
+            if cursor.with_rows:
+                result_sets.append(ResultSet(cursor.fetchall(), cursor.description))
+            if not cursor.nextset():
+                return result_sets
+
+    def _statements(self, conn):
+        # Prepared statement thuộc về session nên cache theo connection thật và connection_id của nó
+        cnx = getattr(conn, "_cnx", conn)
+        cache = getattr(cnx, "_prepared_statements", None)
+        if cache is None or cache[0] != cnx.connection_id:
+            cache = (cnx.connection_id, OrderedDict())
+            cnx._prepared_statements = cache
+        return cache[1]
+
+    def _execute_prepared(self, conn, query, params):
+        statements = self._statements(conn)
+        cursor = statements.get(query)
+        if cursor is None:
+            cursor = conn.cursor(prepared=True)
+            statements[query] = cursor
+            if len(statements) > self.statement_cache_size:
+                _, evicted = statements.popitem(last=False)
+                evicted.close()
+        else:
+            statements.move_to_end(query)
+        try:
+            # Lần đầu gửi COM_STMT_PREPARE, các lần sau chỉ gửi COM_STMT_EXECUTE với tham số nhị phân
+            cursor.execute(query, params)
+            return ResultSet(cursor.fetchall(), cursor.description)
+        except Exception:
+            statements.pop(query, None)
+            cursor.close()
+            raise
+
+    def fetch_proc(self, proc_name, params, readonly=True, all_results=False, fresh=False):
+        try:
+            return self.call_proc(proc_name, params, all_results, readonly, fresh)
+        except Exception as e:
+            print(f"Error fetching results of {proc_name}: {e}")
+            return []
+
+    @contextmanager
+    def transaction(self, label="transaction"):
+        with self.connection() as conn, self.instrumentation.timed("transaction", label):
+            cursor = conn.cursor()
+            try:
+                conn.start_transaction()
+                yield cursor
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def call_proc_out(self, proc_name, params):
+        with self.connection() as conn, self.instrumentation.timed("proc", proc_name, params):
+            cursor = conn.cursor()
+            try:
+                result_args = cursor.callproc(proc_name, params)
+                conn.commit()
+                return result_args
+            except mysql.connector.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def _explain(self, conn, query, params):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("EXPLAIN FORMAT=JSON " + query.strip().rstrip(";"), params)
+            return json.loads(cursor.fetchall()[0][0])
+        except (mysql.connector.Error, ValueError, IndexError) as err:
+            return {"error": str(err)}
+        finally:
+            cursor.close()
+
+    def fetch_query(self, query, params=(), readonly=True, fresh=False):
+        with self.connection(readonly, fresh) as conn, self.instrumentation.timed("query", query_label(query), params) as call:
+            if self.fast_path:
+                results = self._execute_prepared(conn, query, params)
+            else:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(query, params)
+                    results = ResultSet(cursor.fetchall(), cursor.description)
+                finally:
+                    cursor.close()
+            call.rows = results
+            # Chỉ chạy EXPLAIN cho truy vấn chậm, sau khi đã dừng đồng hồ đo
+            if self.instrumentation.is_slow(call) and query.lstrip().upper().startswith("SELECT"):
+                call.stop()
+                call.explain = self._explain(conn, query, params)
+            return results
+
+    def stream_batches(self, query, params=(), chunk_size=1000, readonly=True):
+        # Cursor không buffer: connection bị giữ cho tới khi generator chạy hết hoặc bị đóng.
+        # Luôn trả ít nhất một batch (có thể rỗng) để người dùng biết tên và kiểu cột.
+        with self.connection(readonly) as conn, self.instrumentation.timed("stream", query_label(query), params) as call:
+            cursor = conn.cursor(buffered=False)
+            call.rows = 0
+            try:
+                cursor.execute(query, params)
+                emitted = False
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    call.rows += len(rows)
+                    emitted = True
+                    yield ResultSet(rows, cursor.description)
+                if not emitted:
+                    yield ResultSet((), cursor.description)
+            finally:
+                # Bỏ phần chưa đọc để connection trả về pool ở trạng thái sạch
+                if conn.unread_result:
+                    conn.consume_results()
+                cursor.close()
+
+    def stream_query(self, query, params=(), chunk_size=1000, readonly=True):
+        for rows in self.stream_batches(query, params, chunk_size, readonly):
+            yield from rows
+
+    def _recently_written(self, tags):
+        # Replica có thể chưa chép tới lần ghi vừa rồi; đọc từ đó rồi cache lại sẽ giữ dữ liệu cũ
+        # cho mọi phiên tới khi hết TTL, nên dữ liệu vừa ghi được đọc từ primary
+        return bool(self.replicas) and self.cache.changed_within(tags, self.sticky_seconds)
+
+    def cached_proc(self, proc_name, params, tags, all_results=False):
+        key = ("proc", proc_name, tuple(params), all_results)
+        results = self.cache.get(key)
+        if results is None:
+            generation = self.cache.generation(tags)
+            # Lỗi không được cache, lần gọi sau sẽ truy vấn lại
+            try:
+                results = self.call_proc(proc_name, params, all_results, fresh=self._recently_written(tags))
+            except Exception as e:
+                print(f"Error fetching results of {proc_name}: {e}")
+                return []
+            self.cache.put(key, results, tags, generation)
+        return results
+
+    def cached_query(self, query, params, tags):
+        key = ("query", query, tuple(params))
+        results = self.cache.get(key)
+        if results is None:
+            generation = self.cache.generation(tags)
+            results = self.fetch_query(query, params, fresh=self._recently_written(tags))
+            self.cache.put(key, results, tags, generation)
+        return results
+
+
+# Khoá chính là số nguyên; giao diện và báo cáo dùng mã hiển thị như C001, OD1234
+ID_PREFIXES = {
+    "Customers": "C",
+    "Employees": "E",
+    "Products": "P",
+    "Orders": "O",
+    "OrderDetails": "OD"
+}
+
+
+def format_id(prefix, value):
+    # Cùng quy tắc với hàm FormatId trong SQL
+    return f"{prefix}{value:03d}"
+
+
+def parse_id(code):
+    # Cùng quy tắc với hàm ParseId trong SQL: lấy phần số ở cuối mã, nhận cả số nguyên
+    if code is None or isinstance(code, int):
+        return code
+    digits = str(code).strip()
+    index = len(digits)
+    while index > 0 and digits[index - 1].isdigit():
+        index -= 1
+    if index == len(digits):
+        raise ValueError(f"Invalid ID '{code}'.")
+    return int(digits[index:])
+
+
+def add_connection_arguments(parser):
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="123456")
+    parser.add_argument("--database", default="sales_management")
+    parser.add_argument("--fast-path", action="store_true",
+                        help="Use the C extension, single-round-trip CALL and server-side prepared statements")
+    parser.add_argument("--replica", action="append", default=[], metavar="HOST[:PORT]",
+                        help="Read replica for queries and reports, can be repeated")
+    parser.add_argument("--max-replica-lag", type=float, default=5, help="Seconds a replica may lag and still serve reads")
+    parser.add_argument("--write-behind", action="store_true",
+                        help="Queue writes and commit them in groups from a background thread")
+
+
+def connect_from_args(args, **kwargs):
+    kwargs.setdefault("fast_path", getattr(args, "fast_path", False))
+    kwargs.setdefault("replicas", getattr(args, "replica", ()))
+    kwargs.setdefault("max_replica_lag", getattr(args, "max_replica_lag", 5))
+    kwargs.setdefault("write_behind", getattr(args, "write_behind", False))
+    return DatabaseConnection(args.host, args.user, args.password, args.database, port=args.port, **kwargs)
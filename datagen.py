@@ -0,0 +1,186 @@
+import argparse
+import random
+import subprocess
+import time
+from datetime import date, timedelta
+
+from database import add_connection_arguments, connect_from_args
+
+# Số dòng cho scale factor 1; scale N nhân tuyến tính (scale 1000 ~ 10 triệu đơn hàng)
+BASE_ROWS = {
+    "customers": 1000,
+    "products": 200,
+    "employees": 50
+}
+BASE_ORDERS = 10000
+
+FIRST_NAMES = ["Nguyen", "Tran", "Le", "Pham", "Hoang", "Vu", "Dang", "Bui", "Do", "Ngo", "Duong", "Ly"]
+MIDDLE_NAMES = ["Van", "Thi", "Minh", "Anh", "Duc", "Thu", "Quoc", "Ngoc", "Hai", "Thanh"]
+LAST_NAMES = ["An", "Binh", "Cuong", "Dung", "Giang", "Hanh", "Khoa", "Linh", "Mai", "Nam", "Phuc", "Quan", "Son", "Trang", "Vy"]
+STREETS = ["Tran Duy Hung", "Nguyen Trai", "Le Duan", "Le Loi", "Hai Ba Trung", "Tran Phu", "Vo Van Tan", "Doi Can"]
+CITIES = ["Hanoi", "HCMC", "Da Nang", "Hue", "Nha Trang", "Can Tho", "Hai Phong"]
+BRANDS = ["Dell", "Apple", "Samsung", "Sony", "Asus", "Logitech", "Lenovo", "Xiaomi", "HP", "Acer"]
+PRODUCT_TYPES = ["Laptop", "Phone", "Tablet", "Watch", "Headphones", "Mouse", "Keyboard", "Monitor", "Speaker", "Camera"]
+JOB_TITLES = [("Sales Representative", 60), ("Sales Assistant", 30), ("Manager", 10)]
+
+
+def load_schema(args):
+    # File SQL dùng DELIMITER nên phải chạy qua mysql client, không chạy được bằng connector
+    command = ["mysql", f"--host={args.host}", f"--port={args.port}", f"--user={args.user}", f"--password={args.password}"]
+    for script in ("Database.sql", "Advanced Database.sql"):
+        with open(script, "rb") as f:
+            subprocess.run(command, stdin=f, check=True)
+        print(f"Loaded {script}.")
+
+
+def skewed_index(rng, n, skew):
+    # skew > 1: một số ít khách hàng / sản phẩm chiếm phần lớn đơn hàng
+    return min(int(n * rng.random() ** skew), n - 1)
+
+
+def geometric(rng, p, cap):
+    value = 0
+    while value < cap and rng.random() > p:
+        value += 1
+    return value
+
+
+def person_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def order_status(rng, order_date, today):
+    if (today - order_date).days > 30:
+        return rng.choices(["Completed", "Shipped", "Cancelled"], weights=[85, 10, 5])[0]
+    return rng.choices(["Pending", "Shipped", "Completed", "Cancelled"], weights=[40, 30, 25, 5])[0]
+
+
+def next_ids(db, tables, id_column, count):
+    # Trình sinh dữ liệu là nơi ghi duy nhất nên tự đánh số tiếp sau MAX(); AUTO_INCREMENT tự nhảy qua các giá trị này.
+    # Đơn hàng lấy MAX trên cả bảng lưu trữ để không dùng lại ID đã được chuyển sang đó
+    maxima = ", ".join(f"(SELECT COALESCE(MAX({id_column}), 0) FROM {table})" for table in tables)
+    rows = db.fetch_query(f"SELECT GREATEST({maxima}, 0)", fresh=True)
+    first = int(rows[0][0]) + 1
+    return list(range(first, first + count))
+
+
+def insert_batches(db, query, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        with db.transaction() as cursor:
+            cursor.executemany(query, rows[start:start + batch_size])
+
+
+def generate_customers(db, rng, count, batch_size):
+    ids = next_ids(db, ("Customers",), "CustomerID", count)
+    rows = [
+        (customer_id, person_name(rng),
+         f"{rng.randint(1, 300)} {rng.choice(STREETS)}, {rng.choice(CITIES)}",
+         "09" + "".join(rng.choice("0123456789") for _ in range(8)))
+        for customer_id in ids
+    ]
+    insert_batches(db, "INSERT INTO Customers (CustomerID, CustomerName, Address, Phone) VALUES (%s, %s, %s, %s)", rows, batch_size)
+    return ids
+
+
+def generate_employees(db, rng, count, batch_size):
+    ids = next_ids(db, ("Employees",), "EmployeeID", count)
+    titles = [title for title, _ in JOB_TITLES]
+    weights = [weight for _, weight in JOB_TITLES]
+    rows = [(employee_id, person_name(rng), rng.choices(titles, weights=weights)[0]) for employee_id in ids]
+    insert_batches(db, "INSERT INTO Employees (EmployeeID, EmployeeName, JobTitle) VALUES (%s, %s, %s)", rows, batch_size)
+    return ids
+
+
+def generate_products(db, rng, count, batch_size):
+    ids = next_ids(db, ("Products",), "ProductID", count)
+    rows = []
+    for product_id in ids:
+        # Giá phân bố log-normal quanh vài triệu đồng, làm tròn tới nghìn
+        price = round(rng.lognormvariate(15.5, 0.9), -3)
+        # Tồn kho đủ lớn để các thao tác giữ hàng về sau không bị thiếu hàng
+        rows.append((product_id, f"{rng.choice(BRANDS)} {rng.choice(PRODUCT_TYPES)} {rng.randint(1, 999)}", price, 10 ** 9))
+    insert_batches(db, "INSERT INTO Products (ProductID, ProductName, Price, StockQuantity) VALUES (%s, %s, %s, %s)", rows, batch_size)
+    return ids
+
+
+def generate_orders(db, rng, count, customers, employees, products, years, batch_size):
+    order_ids = next_ids(db, ("Orders", "OrdersArchive"), "OrderID", count)
+    next_detail_id = next_ids(db, ("OrderDetails", "OrderDetailsArchive"), "OrderDetailID", 1)[0]
+    today = date.today()
+    span_days = 365 * years
+    lines_total = 0
+    started = time.monotonic()
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        orders = []
+        details = []
+        for order_id in order_ids[start:start + size]:
+            # sqrt làm đơn hàng gần đây dày hơn, mô phỏng doanh nghiệp đang tăng trưởng
+            order_date = today - timedelta(days=int(span_days * (1 - rng.random() ** 0.5)))
+            orders.append((
+                order_id,
+                customers[skewed_index(rng, len(customers), 2.0)],
+                order_date,
+                order_status(rng, order_date, today),
+                employees[rng.randrange(len(employees))]
+            ))
+            # Mỗi đơn 1-10 dòng, không lặp sản phẩm trong cùng một đơn
+            line_count = 1 + geometric(rng, 0.45, 9)
+            product_indexes = set()
+            for _ in range(line_count * 4):
+                if len(product_indexes) == line_count:
+                    break
+                product_indexes.add(skewed_index(rng, len(products), 3.0))
+            for product_index in product_indexes:
+                details.append((order_id, products[product_index], 1 + geometric(rng, 0.7, 4)))
+        detail_rows = [(next_detail_id + index,) + detail for index, detail in enumerate(details)]
+        next_detail_id += len(details)
+        with db.transaction() as cursor:
+            cursor.executemany(
+                "INSERT INTO Orders (OrderID, CustomerID, OrderDate, Status, EmployeeID) VALUES (%s, %s, %s, %s, %s)",
+                orders
+            )
+            cursor.executemany(
+                "INSERT INTO OrderDetails (OrderDetailID, OrderID, ProductID, Quantity) VALUES (%s, %s, %s, %s)",
+                detail_rows
+            )
+        lines_total += len(detail_rows)
+        elapsed = time.monotonic() - started
+        print(f"Orders {start + size}/{count}, lines {lines_total} ({(start + size) / elapsed:.0f} orders/s)")
+    return lines_total
+
+
+def generate(db, scale, seed=42, years=3, batch_size=5000):
+    rng = random.Random(seed)
+    counts = {name: max(1, int(rows * scale)) for name, rows in BASE_ROWS.items()}
+    order_count = max(1, int(BASE_ORDERS * scale))
+    customers = generate_customers(db, rng, counts["customers"], batch_size)
+    print(f"Inserted {len(customers)} customers.")
+    employees = generate_employees(db, rng, counts["employees"], batch_size)
+    print(f"Inserted {len(employees)} employees.")
+    products = generate_products(db, rng, counts["products"], batch_size)
+    print(f"Inserted {len(products)} products.")
+    lines = generate_orders(db, rng, order_count, customers, employees, products, years, batch_size)
+    print(f"Inserted {order_count} orders with {lines} order lines.")
+    return {"customers": len(customers), "employees": len(employees), "products": len(products),
+            "orders": order_count, "order_lines": lines}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load synthetic sales data into a local MySQL database.")
+    add_connection_arguments(parser)
+    parser.add_argument("--scale", type=float, default=1.0, help="1.0 = 1k customers, 10k orders")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--years", type=int, default=3, help="How many years of order history to spread orders over")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--reset", action="store_true", help="Recreate the schema from the SQL scripts first")
+    args = parser.parse_args()
+
+    if args.reset:
+        load_schema(args)
+    db = connect_from_args(args, pool_size=2, cache_size=0)
+    generate(db, args.scale, args.seed, args.years, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import csv
+import decimal
+from collections import namedtuple
+from datetime import date
+
+from database import DATE_TYPES, DATETIME_TYPES, DECIMAL_TYPES, FLOAT_TYPES, INTEGER_TYPES, add_connection_arguments, connect_from_args
+from managers import total_sales_query
+
+# kind "query": truy vấn được stream bằng cursor không buffer; kind "proc": báo cáo nhỏ có giới hạn số dòng
+ExportSpec = namedtuple("ExportSpec", ["kind", "source", "params"])
+
+EXPORTS = {
+    "customers": ExportSpec(
+        "query",
+        "SELECT FormatId('C', CustomerID) AS CustomerID, CustomerName, Address, Phone FROM Customers ORDER BY Customers.CustomerID",
+        ()
+    ),
+    "products": ExportSpec(
+        "query",
+        "SELECT FormatId('P', ProductID) AS ProductID, ProductName, Price, StockQuantity FROM Products "
+        "WHERE IsActive = TRUE ORDER BY Products.ProductID",
+        ()
+    ),
+    "employees": ExportSpec(
+        "query",
+        "SELECT FormatId('E', EmployeeID) AS EmployeeID, EmployeeName, JobTitle FROM Employees ORDER BY Employees.EmployeeID",
+        ()
+    ),
+    "orders": ExportSpec(
+        "query",
+        "SELECT FormatId('O', OrderID) AS OrderID, FormatId('C', CustomerID) AS CustomerID, OrderDate, Status, "
+        "FormatId('E', EmployeeID) AS EmployeeID FROM Orders ORDER BY Orders.OrderID",
+        ()
+    ),
+    "order_details": ExportSpec(
+        "query",
+        "SELECT FormatId('OD', OrderDetailID) AS OrderDetailID, FormatId('O', OrderID) AS OrderID, "
+        "FormatId('P', ProductID) AS ProductID, Quantity, SalePrice FROM OrderDetails ORDER BY OrderDetails.OrderDetailID",
+        ()
+    ),
+    "stock_movements": ExportSpec(
+        "query",
+        "SELECT MovementID, FormatId('P', ProductID) AS ProductID, FormatId('O', OrderID) AS OrderID, QuantityChange, Reason, "
+        "CreatedAt FROM StockMovements ORDER BY MovementID",
+        ()
+    ),
+    "total_sales": ExportSpec("query", total_sales_query(), ("start_date", "end_date") * 2),
+    "total_sales_with_archive": ExportSpec("query", total_sales_query(include_archive=True), ("start_date", "end_date") * 4),
+    "sales_by_employee": ExportSpec("query", "SELECT * FROM SalesReportByEmployee", ()),
+    "sales_by_product": ExportSpec("query", "SELECT * FROM SalesReportByProduct", ()),
+    "sales_by_customer": ExportSpec("query", "SELECT * FROM SalesReportByCustomer", ()),
+    "sales_rollup": ExportSpec(
+        "proc", "GetSalesRollup", ("start_date", "end_date", "granularity", "dimension")
+    ),
+    "top_employees": ExportSpec("proc", "GetTopEmployees", ("top_n",)),
+    "top_products": ExportSpec("proc", "GetTopSellingProducts", ("top_n",)),
+    "top_customers": ExportSpec("proc", "GetTopCustomers", ("top_n",))
+}
+
+FORMATS = ("csv", "parquet")
+
+
+def export_batches(db, name, params=(), chunk_size=10000):
+    spec = EXPORTS[name]
+    if len(params) != len(spec.params):
+        raise ValueError(f"Export '{name}' expects parameters {spec.params}, got {len(params)}.")
+    if spec.kind == "query":
+        yield from db.stream_batches(spec.source, tuple(params), chunk_size)
+    else:
+        yield db.call_proc(spec.source, tuple(params))
+
+
+def write_csv(batches, f):
+    writer = csv.writer(f)
+    rows = 0
+    for index, batch in enumerate(batches):
+        if index == 0:
+            writer.writerow(batch.columns)
+        writer.writerows(batch)
+        rows += len(batch)
+    return rows
+
+
+def _arrow_type(pa, type_code, sample):
+    if type_code in INTEGER_TYPES:
+        return pa.int64()
+    if type_code in DECIMAL_TYPES:
+        scale = -sample.as_tuple().exponent if isinstance(sample, decimal.Decimal) else 2
+        return pa.decimal128(38, max(scale, 0))
+    if type_code in FLOAT_TYPES:
+        return pa.float64()
+    if type_code in DATE_TYPES:
+        return pa.date32()
+    if type_code in DATETIME_TYPES:
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def write_parquet(batches, path):
+    # Mỗi batch là một row group, chỉ giữ một batch trong bộ nhớ tại một thời điểm
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    rows = 0
+    try:
+        for batch in batches:
+            columns = list(zip(*batch)) if batch else [()] * len(batch.description)
+            if writer is None:
+                schema = pa.schema([
+                    pa.field(column[0], _arrow_type(pa, column[1], next((v for v in values if v is not None), None)))
+                    for column, values in zip(batch.description, columns)
+                ])
+                writer = pq.ParquetWriter(path, schema)
+            if batch:
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for field, values in zip(schema, columns)], schema=schema
+                ))
+                rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def export(db, name, params, path, fmt="csv", chunk_size=10000):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'.")
+    batches = export_batches(db, name, params, chunk_size)
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            return write_csv(batches, f)
+    return write_parquet(batches, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a listing or report to CSV or Parquet without loading it into memory.")
+    add_connection_arguments(parser)
+    parser.add_argument("name", choices=sorted(EXPORTS))
+    parser.add_argument("--output", help="Output file, defaults to <name>.<format>")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows fetched per round trip and per Parquet row group")
+    parser.add_argument("--start-date", type=date.fromisoformat)
+    parser.add_argument("--end-date", type=date.fromisoformat)
+    parser.add_argument("--granularity", choices=["day", "week", "month"], default="day")
+    parser.add_argument("--dimension", choices=["employee", "product", "customer"])
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    spec = EXPORTS[args.name]
+    params = tuple(getattr(args, param) for param in spec.params)
+    # dict.fromkeys bỏ tham số lặp lại (ngày bắt đầu / kết thúc dùng cho cả Orders và OrderDetails)
+    missing = list(dict.fromkeys(param for param, value in zip(spec.params, params) if value is None and param != "dimension"))
+    if missing:
+        parser.error(f"Export '{args.name}' requires " + ", ".join("--" + param.replace("_", "-") for param in missing) + ".")
+    output = args.output or f"{args.name}.{args.format}"
+    db = connect_from_args(args, pool_size=1, cache_size=0)
+    rows = export(db, args.name, params, output, args.format, args.chunk_size)
+    print(f"Exported {rows} rows of {args.name} to {output}.")
+
+
+if __name__ == "__main__":
+    main()
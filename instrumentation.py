@@ -0,0 +1,237 @@
+import contextvars
+import decimal
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime
+
+# Cận trên (ms) của các bucket histogram độ trễ, bucket cuối là +Inf
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Trang / tác vụ đang gọi DB, UI đặt giá trị này ở đầu mỗi lần chạy lại
+current_source = contextvars.ContextVar("current_source", default="-")
+
+# Lỗi gần nhất của luồng / task hiện tại, kể cả lỗi đã được managers bắt và chỉ in ra
+last_error = contextvars.ContextVar("last_error", default=None)
+
+
+def estimate_bytes(rows, sample_size=100):
+    # Ước lượng từ vài dòng đầu để không phải duyệt toàn bộ kết quả trên hot path
+    if not rows:
+        return 0
+    sample = rows[:sample_size]
+    sampled = 0
+    for row in sample:
+        for value in row:
+            if isinstance(value, (str, bytes, bytearray)):
+                sampled += len(value)
+            elif value is not None:
+                sampled += 8
+    return int(sampled * len(rows) / len(sample))
+
+
+# Khoá ngẫu nhiên theo tiến trình: cùng một giá trị cho cùng dấu vân tay trong slow log,
+# nhưng không dò ngược được từ danh sách số điện thoại / tên như với hash không khoá
+_REDACT_KEY = os.urandom(16)
+
+
+def redact_param(param):
+    # Số, ngày và NULL giữ nguyên để còn chạy lại được truy vấn; chuỗi có thể là tên, địa chỉ, số điện thoại
+    if param is None or isinstance(param, (bool, int, float, decimal.Decimal, date)):
+        return str(param)
+    text = str(param)
+    digest = hmac.new(_REDACT_KEY, text.encode("utf-8"), hashlib.sha256).hexdigest()[:12]
+    return f"<redacted {len(text)} chars #{digest}>"
+
+
+def redact_explain(plan):
+    # attached_condition / index_condition của EXPLAIN FORMAT=JSON chứa nguyên giá trị tham số
+    if isinstance(plan, dict):
+        return {key: redact_explain(value) for key, value in plan.items() if not key.endswith("_condition")}
+    if isinstance(plan, list):
+        return [redact_explain(value) for value in plan]
+    return plan
+
+
+class CallStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed_ms, rows, nbytes, failed):
+        self.count += 1
+        self.errors += 1 if failed else 0
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        self.bytes += nbytes
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, fraction):
+        # Trả về cận trên của bucket chứa phân vị, đủ để so sánh giữa các thủ tục
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+class Call:
+    def __init__(self, kind, name, params):
+        self.kind = kind
+        self.name = name
+        self.params = params
+        self.source = current_source.get()
+        self.rows = None
+        self.error = None
+        self.explain = None
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+    def elapsed_ms(self):
+        if self.elapsed is not None:
+            return self.elapsed
+        return (time.perf_counter() - self.started) * 1000
+
+    def stop(self):
+        if self.elapsed is None:
+            self.elapsed = (time.perf_counter() - self.started) * 1000
+        return self.elapsed
+
+
+class Instrumentation:
+    def __init__(self, slow_threshold_ms=200, slow_log_size=100, enabled=True, redact_params=True):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.enabled = enabled
+        # Slow log được xem trên trang Diagnostics và xuất ra file, mặc định không giữ dữ liệu khách hàng
+        self.redact_params = redact_params
+        self.calls = {}
+        self.slow_calls = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, kind, name, params=()):
+        call = Call(kind, name, params)
+        try:
+            yield call
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self.record(call)
+
+    def is_slow(self, call):
+        return call.elapsed_ms() >= self.slow_threshold_ms
+
+    def record(self, call):
+        if call.error is not None:
+            last_error.set(call.error)
+        if not self.enabled:
+            return
+        elapsed_ms = call.stop()
+        rows = call.rows if call.rows is not None else []
+        row_count = len(rows) if isinstance(rows, list) else int(rows)
+        nbytes = estimate_bytes(rows) if isinstance(rows, list) else 0
+        with self._lock:
+            key = (call.source, call.kind, call.name)
+            stats = self.calls.get(key)
+            if stats is None:
+                stats = self.calls[key] = CallStats()
+            stats.observe(elapsed_ms, row_count, nbytes, call.error is not None)
+            if elapsed_ms >= self.slow_threshold_ms:
+                self.slow_calls.append({
+                    "time": datetime.now().isoformat(timespec="seconds"),
+                    "source": call.source,
+                    "kind": call.kind,
+                    "name": call.name,
+                    "params": [redact_param(param) if self.redact_params else str(param) for param in call.params],
+                    "elapsed_ms": round(elapsed_ms, 3),
+                    "rows": row_count,
+                    "error": str(call.error) if call.error else None,
+                    "explain": redact_explain(call.explain) if self.redact_params else call.explain
+                })
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.slow_calls.clear()
+
+    def snapshot(self):
+        with self._lock:
+            items = [(key, stats) for key, stats in self.calls.items()]
+            return [
+                {
+                    "source": source,
+                    "kind": kind,
+                    "name": name,
+                    "calls": stats.count,
+                    "errors": stats.errors,
+                    "error_rate": stats.errors / stats.count if stats.count else 0.0,
+                    "total_ms": round(stats.total_ms, 3),
+                    "mean_ms": round(stats.total_ms / stats.count, 3) if stats.count else 0.0,
+                    "p50_ms": stats.percentile(0.50),
+                    "p95_ms": stats.percentile(0.95),
+                    "p99_ms": stats.percentile(0.99),
+                    "max_ms": round(stats.max_ms, 3),
+                    "rows": stats.rows,
+                    "bytes": stats.bytes
+                }
+                for (source, kind, name), stats in items
+            ]
+
+    def to_json(self):
+        with self._lock:
+            slow_calls = list(self.slow_calls)
+        return json.dumps({"calls": self.snapshot(), "slow_calls": slow_calls}, indent=2, default=str)
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP sales_db_call_duration_seconds Latency of database calls.",
+            "# TYPE sales_db_call_duration_seconds histogram"
+        ]
+        totals = []
+        with self._lock:
+            items = list(self.calls.items())
+            for (source, kind, name), stats in items:
+                labels = f'source="{_escape(source)}",kind="{kind}",name="{_escape(name)}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS_MS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'sales_db_call_duration_seconds_bucket{{{labels},le="{bound / 1000}"}} {cumulative}')
+                lines.append(f'sales_db_call_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f"sales_db_call_duration_seconds_sum{{{labels}}} {stats.total_ms / 1000}")
+                lines.append(f"sales_db_call_duration_seconds_count{{{labels}}} {stats.count}")
+                totals.append((labels, stats))
+        for metric, attribute, help_text in (
+            ("sales_db_call_errors_total", "errors", "Database calls that raised an error."),
+            ("sales_db_rows_fetched_total", "rows", "Rows returned by database calls."),
+            ("sales_db_bytes_fetched_total", "bytes", "Estimated bytes returned by database calls.")
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for labels, stats in totals:
+                lines.append(f"{metric}{{{labels}}} {getattr(stats, attribute)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
@@ -1,308 +1,47 @@
-import mysql.connector
 import pandas as pd
 import streamlit as st
 from datetime import datetime
 import base64
-
-class DatabaseConnection:
-    def __init__(self, host, user, password, database):
-        try:
-            self.connection = mysql.connector.connect(
-                host=host,
-                user=user,
-                password=password,
-                database=database
-            )
-            self.cursor = self.connection.cursor()
-            print("Database connection established successfully.")
-        except mysql.connector.Error as err:
-            print(f"Error connecting to the database: {err}")
-            self.connection = None
-            self.cursor = None
-
-    def execute_proc(self, proc_name, params):
-        try:
-            if self.connection is None:
-                raise Exception("Database connection is not established.")
-            self.cursor.callproc(proc_name, params)
-            self.connection.commit()
-            print(f"Procedure {proc_name} executed successfully.")
-        except mysql.connector.Error as err:
-            print(f"Error executing procedure {proc_name}: {err}")
-            self.connection.rollback()
-        except Exception as e:
-            print(f"Error: {e}")
-
-    def fetch_results(self):
-        results = []
-        try:
-            if self.connection is None:
-                raise Exception("Database connection is not established.")
-            for result in self.cursor.stored_results():
-                results = result.fetchall()
-        except Exception as e:
-            print(f"Error fetching results: {e}")
-        return results
-
-class CustomerManager:
-    def __init__(self, db_connection):
-        self.db_connection = db_connection
-
-    def register_customer(self, name, address, phone):
-        try:
-            self.db_connection.execute_proc('RegisterCustomer', (name, address, phone))
-            print(f"Customer {name} registered successfully.")
-        except Exception as e:
-            print(f"Error registering customer {name}: {e}")
-
-    def update_customer(self, customer_id, name, address, phone):
-        try:
-            self.db_connection.execute_proc('UpdateCustomer', (customer_id, name, address, phone))
-            print(f"Customer {customer_id} updated successfully.")
-        except Exception as e:
-            print(f"Error updating customer {customer_id}: {e}")
-
-    def search_customer(self, customer_name):
-        try:
-            self.db_connection.execute_proc('SearchCustomer', (customer_name,))
-            results = self.db_connection.fetch_results()
-            print(f"Search result for customer '{customer_name}': {results}")
-            return results
-        except Exception as e:
-            print(f"Error searching customer '{customer_name}': {e}")
-
-    def show_customer(self):
-        try:
-            self.db_connection.execute_proc('ShowCustomer', ())
-            results = self.db_connection.fetch_results()
-            return results
-        except Exception as e:
-            print(f"Error showing customers: {e}")
-            return []
-
-class ProductManager:
-    def __init__(self, db_connection):
-        self.db_connection = db_connection
-
-    def add_product(self, name, price, stock_quantity):
-        try:
-            self.db_connection.execute_proc('AddProduct', (name, price, stock_quantity))
-            print(f"Product {name} added successfully.")
-        except Exception as e:
-            print(f"Error adding product {name}: {e}")
-
-    def edit_product(self, product_id, name, price, stock_quantity):
-        try:
-            self.db_connection.execute_proc('EditProduct', (product_id, name, price, stock_quantity))
-            print(f"Product {product_id} updated successfully.")
-        except Exception as e:
-            print(f"Error editing product {product_id}: {e}")
-
-    def delete_product(self, product_id):
-        try:
-            self.db_connection.execute_proc('DeleteProduct', (product_id,))
-            print(f"Product {product_id} deleted successfully.")
-        except Exception as e:
-            print(f"Error deleting product {product_id}: {e}")
-
-    def show_product(self):
-        try:
-            self.db_connection.execute_proc('ShowProduct', ())
-            results = self.db_connection.fetch_results()
-            return results
-        except Exception as e:
-            print(f"Error showing products: {e}")
-            return []
-
-    def search_product(self, product_name):
-        try:
-            self.db_connection.execute_proc('SearchProduct', (product_name,))
-            results = self.db_connection.fetch_results()
-            print(f"Search result for product '{product_name}': {results}")
-            return results
-        except Exception as e:
-            print(f"Error searching product '{product_name}': {e}")
-
-
-class OrderManager:
-    def __init__(self, db_connection):
-        self.db_connection = db_connection
-
-    def create_order(self, customer_id, order_date, employee_id):
-        try:
-            self.db_connection.execute_proc('CreateOrder', (customer_id, order_date, employee_id))
-            print(f"Order for customer {customer_id} created successfully.")
-        except Exception as e:
-            print(f"Error creating order for customer {customer_id}: {e}")
-
-    def update_order_status(self, order_id, status):
-        try:
-            self.db_connection.execute_proc('UpdateOrderStatus', (order_id, status))
-            print(f"Order {order_id} status updated to {status}.")
-        except Exception as e:
-            print(f"Error updating status for order {order_id}: {e}")
-
-    def track_order(self, order_id):
-        try:
-            self.db_connection.execute_proc('TrackOrder', (order_id,))
-            results = self.db_connection.fetch_results()
-            print(f"Order {order_id} status: {results}")
-            return results
-        except Exception as e:
-            print(f"Error tracking order {order_id}: {e}")
-
-    def search_order(self, search_term):
-        try:
-            self.db_connection.execute_proc('SearchOrder', (search_term,))
-            results = self.db_connection.fetch_results()
-            print(f"Search results for '{search_term}': {results}")
-            return results
-        except Exception as e:
-            print(f"Error searching orders with term '{search_term}': {e}")
-            return []
-
-    def get_all_order_details(self):
-        try:
-            self.db_connection.execute_proc('AllOrderDetail', ())
-            results = self.db_connection.fetch_results()
-            print(f"All order details retrieved: {results}")
-            return results
-        except Exception as e:
-            print(f"Error retrieving all order details: {e}")
-            return []
-
-class OrderDetailsManager:
-    def __init__(self, db_connection):
-        self.db_connection = db_connection
-
-    def add_order_details(self, order_id, product_id, quantity):
-        try:
-            self.db_connection.execute_proc('AddOrderDetails', (order_id, product_id, quantity))
-            print(f"Order details added for order {order_id}, product {product_id}.")
-        except Exception as e:
-            print(f"Error adding order details for order {order_id}, product {product_id}: {e}")
-
-class EmployeeManager:
-    def __init__(self, db_connection):
-        self.db_connection = db_connection
-
-    def add_employee(self, name, job_title):
-        try:
-            self.db_connection.execute_proc('AddEmployee', (name, job_title))
-            print(f"Employee {name} added successfully.")
-        except Exception as e:
-            print(f"Error adding employee {name}: {e}")
-
-    def update_employee(self, employee_id, name, job_title):
-        try:
-            self.db_connection.execute_proc('UpdateEmployee', (employee_id, name, job_title))
-            print(f"Employee {employee_id} updated successfully.")
-        except Exception as e:
-            print(f"Error updating employee {employee_id}: {e}")
-
-    def search_employee(self, employee_name):
-        try:
-            self.db_connection.execute_proc('SearchEmployee', (employee_name,))
-            results = self.db_connection.fetch_results()
-            print(f"Search result for customer '{employee_name}': {results}")
-            return results
-        except Exception as e:
-            print(f"Error searching customer '{employee_name}': {e}")
-
-    def show_employee(self):
-        try:
-            self.db_connection.execute_proc('ShowEmployee', ())
-            results = self.db_connection.fetch_results()
-            return results
-        except Exception as e:
-            print(f"Error showing employees: {e}")
-            return []
-
-class ReportManager:
-    def __init__(self, db_connection):
-        self.db_connection = db_connection
-
-    def get_total_sales_report(self, start_date, end_date):
-        try:
-            # Truy vấn trực tiếp mà không cần stored procedure
-            query = '''
-                SELECT 
-                    O.OrderID,
-                    OD.ProductID,
-                    OD.SalePrice,
-                    O.OrderDate
-                FROM Orders O
-                JOIN OrderDetails OD ON O.OrderID = OD.OrderID
-                WHERE O.OrderDate BETWEEN %s AND %s
-                ORDER BY O.OrderDate;
-            '''
-            self.db_connection.cursor.execute(query, (start_date, end_date))
-            return self.db_connection.cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching total sales report: {e}")
-            return []
-
-    def get_sales_by_employee(self):
-        try:
-            query = "SELECT * FROM SalesReportByEmployee;"
-            self.db_connection.cursor.execute(query)
-            return self.db_connection.cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching sales by employee: {e}")
-            return []
-
-    def get_sales_by_product(self):
-        try:
-            query = "SELECT * FROM SalesReportByProduct;"
-            self.db_connection.cursor.execute(query)
-            return self.db_connection.cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching sales by product: {e}")
-            return []
-
-    def get_sales_by_customer(self):
-        try:
-            query = "SELECT * FROM SalesReportByCustomer;"
-            self.db_connection.cursor.execute(query)
-            return self.db_connection.cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching sales by customer: {e}")
-            return []
-
-    def get_top_employees(self, top_n):
-        try:
-            query = "CALL GetTopEmployees(%s);"
-            self.db_connection.cursor.execute(query, (top_n,))
-            return self.db_connection.cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching top employees: {e}")
-            return []
-
-    def get_top_selling_products(self, top_n):
-        try:
-            query = "CALL GetTopSellingProducts(%s);"
-            self.db_connection.cursor.execute(query, (top_n,))
-            return self.db_connection.cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching top selling products: {e}")
-            return []
-
-    def get_top_customers(self, top_n):
-        try:
-            query = "CALL GetTopCustomers(%s);"
-            self.db_connection.cursor.execute(query, (top_n,))
-            return self.db_connection.cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching top customers: {e}")
-            return []
-
-
-db = DatabaseConnection('localhost', 'root', '123456', 'sales_management')
+import functools
+import io
+import os
+import tempfile
+import uuid
+
+from database import DatabaseConnection, current_session, results_to_frame
+from bulkimport import IMPORTS, import_file, write_error_report
+from export import EXPORTS, FORMATS, export
+from instrumentation import current_source
+from managers import (
+    CustomerManager,
+    ProductManager,
+    OrderManager,
+    OrderDetailsManager,
+    InventoryManager,
+    EmployeeManager,
+    ReportManager
+)
+
+# Pool được tạo một lần cho cả tiến trình và dùng chung giữa các session Streamlit.
+# SALES_DB_REPLICAS="host:port,host:port" để đọc và báo cáo từ replica, ghi vẫn vào primary.
+# SALES_DB_REDACT_PARAMS=0 giữ nguyên tham số trong slow log (chỉ dùng khi debug trên dữ liệu không thật)
+@st.cache_resource
+def get_database():
+    replicas = [server.strip() for server in os.environ.get("SALES_DB_REPLICAS", "").split(",") if server.strip()]
+    return DatabaseConnection(
+        'localhost', 'root', '123456', 'sales_management', pool_size=10, fast_path=True,
+        replicas=replicas, max_replica_lag=float(os.environ.get("SALES_DB_MAX_REPLICA_LAG", 5)),
+        redact_params=os.environ.get("SALES_DB_REDACT_PARAMS", "1").lower() not in ("0", "false", "no")
+    )
+
+
+db = get_database()
 
 customer_manager = CustomerManager(db)
 product_manager = ProductManager(db)
 order_manager = OrderManager(db)
 order_details_manager = OrderDetailsManager(db)
+inventory_manager = InventoryManager(db)
 employee_manager = EmployeeManager(db)
 report_manager = ReportManager(db)
 
@@ -324,6 +63,603 @@ def set_background(image_file):
     """
     st.markdown(css, unsafe_allow_html=True)
 
+def panel(func):
+    # Mỗi panel là một fragment: tương tác bên trong chỉ chạy lại panel đó, không chạy lại cả trang
+    @st.fragment
+    @functools.wraps(func)
+    def run_panel():
+        current_source.set(func.__name__)
+        current_session.set(st.session_state["db_session"])
+        func()
+    return run_panel
+
+
+def show_sections(key, sections):
+    # Khác với st.tabs, chỉ panel đang được chọn mới chạy và truy vấn DB
+    selected = st.radio("Section", list(sections), horizontal=True, key=f"{key}_section", label_visibility="collapsed")
+    sections[selected]()
+
+
+def refresh_button(key, *tags):
+    if st.button("Refresh", key=f"{key}_refresh"):
+        db.cache.invalidate(*tags)
+
+
+def show_paged_table(key, fetch_page, empty_message, cursor_of=lambda row: row[0], sortable=True, refresh_tags=()):
+    # Lưu con trỏ đầu mỗi trang đã xem để có thể quay lại trang trước
+    cursors_key = f"{key}_cursors"
+    col1, col2, col3 = st.columns([2, 2, 1])
+    page_size = col1.selectbox("Rows per page", [25, 50, 100, 500], index=1, key=f"{key}_page_size")
+    descending = col2.toggle("Newest first", key=f"{key}_descending") if sortable else False
+    with col3:
+        refresh_button(key, *refresh_tags)
+    if st.session_state.get(f"{key}_view") != (page_size, descending) or cursors_key not in st.session_state:
+        st.session_state[cursors_key] = [None]
+        st.session_state[f"{key}_view"] = (page_size, descending)
+    cursors = st.session_state[cursors_key]
+
+    # Lấy dư một dòng để biết còn trang sau hay không
+    rows = fetch_page(cursors[-1], page_size + 1, descending)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    if rows:
+        st.dataframe(results_to_frame(rows))
+    else:
+        st.info(empty_message)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    if col1.button("Previous", disabled=len(cursors) == 1, key=f"{key}_previous"):
+        cursors.pop()
+        st.rerun(scope="fragment")
+    col2.caption(f"Page {len(cursors)}")
+    if col3.button("Next", disabled=not has_next, key=f"{key}_next"):
+        cursors.append(cursor_of(rows[-1]))
+        st.rerun(scope="fragment")
+
+class LiveTable:
+    # Bảng đầy đủ giữ trong session: lần đầu tải cả danh sách, các lần sau chỉ lấy dòng đổi từ watermark trước
+    # rồi ghép vào DataFrame theo khoá, nên sửa một dòng chỉ phải truyền một dòng
+    def __init__(self, fetch_changes, key_column):
+        self.fetch_changes = fetch_changes
+        self.key_column = key_column
+        self.frame = None
+        self.watermark = None
+        self.last_transfer = 0
+
+    def refresh(self):
+        delta = self.fetch_changes(self.watermark)
+        if delta is None:
+            return self.frame
+        changes = results_to_frame(delta.rows).set_index(self.key_column)
+        # Sản phẩm bị xoá mềm được trả về với IsActive = FALSE
+        removed = changes.index[~changes.pop("IsActive").astype(bool)] if "IsActive" in changes.columns else []
+        changes = changes.drop(removed)
+        if delta.full_reload or self.frame is None:
+            # Cột category không nhận giá trị mới khi ghép, giữ dạng object
+            frame = changes.astype({column: object for column in changes.select_dtypes("category").columns})
+        else:
+            frame = self.frame.drop(removed, errors="ignore")
+            updated = changes.index.intersection(frame.index)
+            if len(updated):
+                frame.loc[updated, changes.columns] = changes.loc[updated]
+            added = changes.index.difference(frame.index)
+            if len(added):
+                frame = pd.concat([frame, changes.loc[added]])
+        self.frame = frame
+        self.watermark = delta.watermark
+        self.last_transfer = len(delta.rows)
+        return frame
+
+
+def show_live_table(key, fetch_changes, key_column, empty_message):
+    live_key = f"{key}_live"
+    if live_key not in st.session_state:
+        st.session_state[live_key] = LiveTable(fetch_changes, key_column)
+    table = st.session_state[live_key]
+    col1, col2 = st.columns([4, 1])
+    # Bấm Refresh chỉ chạy lại panel; bảng tự lấy phần thay đổi ở mỗi lần chạy
+    col2.button("Refresh", key=f"{key}_live_refresh")
+    if col1.button("Reload all", key=f"{key}_live_reload"):
+        table.watermark = None
+    frame = table.refresh()
+    if frame is None or frame.empty:
+        st.info(empty_message)
+        return
+    st.caption(f"{len(frame)} rows, last refresh transferred {table.last_transfer} rows (as of {table.watermark}).")
+    st.dataframe(frame.reset_index())
+
+
+def show_listing(key, fetch_page, fetch_changes, key_column, empty_message, refresh_tags):
+    if st.toggle("Live full listing", key=f"{key}_live_mode",
+                 help="Load the whole table once, then only fetch rows changed since the last refresh"):
+        show_live_table(key, fetch_changes, key_column, empty_message)
+    else:
+        show_paged_table(key, fetch_page, empty_message, refresh_tags=refresh_tags)
+
+
+def bulk_import_panel(name):
+    spec = IMPORTS[name]
+
+    def run_import():
+        st.subheader(f"Bulk Import {spec.table}")
+        st.caption("CSV columns: " + ", ".join(column for column, _, _, _ in spec.columns))
+        upload = st.file_uploader("CSV file", type="csv", key=f"import_{name}_file")
+        if upload is not None and st.button("Import", key=f"import_{name}_submit"):
+            progress_bar = st.progress(0.0)
+            status = st.empty()
+
+            def report(seen, loaded, rejected, elapsed):
+                progress_bar.progress(min(upload.tell() / max(upload.size, 1), 1.0))
+                status.caption(f"Read {seen} rows, loaded {loaded}, rejected {rejected} ({seen / max(elapsed, 1e-9):.0f} rows/s)")
+
+            try:
+                result = import_file(db, name, upload, progress=report)
+            except Exception as e:
+                st.error(f"Import failed: {e}")
+                return
+            progress_bar.progress(1.0)
+            st.success(f"Loaded {result.loaded} rows, rejected {result.rejected}.")
+            if result.errors:
+                report_file = io.StringIO()
+                write_error_report(result.errors, report_file)
+                st.dataframe(pd.DataFrame(result.errors[:1000]))
+                st.download_button("Download error report", report_file.getvalue(), f"{name}_import_errors.csv", "text/csv")
+
+    run_import.__name__ = f"bulk_import_{name}_panel"
+    return panel(run_import)
+
+
+# Customer Management
+@panel
+def register_customer_panel():
+    st.subheader("Register Customer")
+    with st.form(key="register_customer_form"):
+        name = st.text_input("Name", key="register_name")
+        address = st.text_input("Address", key="register_address")
+        phone = st.text_input("Phone", key="register_phone")
+        submit_button = st.form_submit_button("Register Customer")
+        if submit_button:
+            customer_manager.register_customer(name, address, phone)
+            st.success(f"Customer '{name}' registered successfully!")
+
+
+@panel
+def update_customer_panel():
+    st.subheader("Update Customer")
+    with st.form(key="update_customer_form"):
+        customer_id = st.text_input("Customer ID", key="update_id")
+        name = st.text_input("New Name", key="update_name")
+        address = st.text_input("New Address", key="update_address")
+        phone = st.text_input("New Phone", key="update_phone")
+        submit_button = st.form_submit_button("Update Customer")
+        if submit_button:
+            customer_manager.update_customer(customer_id, name, address, phone)
+            st.success(f"Customer ID '{customer_id}' updated successfully!")
+
+
+@panel
+def search_customer_panel():
+    st.subheader("Search Customer")
+    search_name = st.text_input("Enter Name to Search", key="search_customer")
+    if st.button("Search Customer"):
+        results = customer_manager.search_customer(search_name)
+        if results:
+            df = results_to_frame(results)
+            st.dataframe(df)  # Hiển thị kết quả dưới dạng bảng
+        else:
+            st.warning("No matching customer found.")
+
+
+@panel
+def all_customer_panel():
+    st.subheader("All Customer")
+    show_listing(
+        "all_customers",
+        customer_manager.show_customer_page,
+        customer_manager.customer_changes_since,
+        "CustomerID",
+        "No customers available.",
+        refresh_tags=('customers',)
+    )
+
+
+# Product Management
+@panel
+def add_product_panel():
+    st.subheader("Add Product")
+    with st.form(key="add_product_form"):
+        name = st.text_input("Product Name", key="add_name")
+        price = st.number_input("Price", min_value=0.0, key="add_price")
+        stock_quantity = st.number_input("Stock Quantity", min_value=0, step=1, key="add_stock")
+        submit_button = st.form_submit_button("Add Product")
+        if submit_button:
+            product_manager.add_product(name, price, stock_quantity)
+            st.success(f"Product '{name}' added successfully!")
+
+
+@panel
+def edit_product_panel():
+    st.subheader("Edit Product")
+    with st.form(key="edit_product_form"):
+        product_id = st.text_input("Product ID", key="edit_id")
+        name = st.text_input("New Product Name", key="edit_name")
+        price = st.number_input("New Price", min_value=0.0, key="edit_price")
+        stock_quantity = st.number_input("New Stock Quantity", min_value=0, step=1, key="edit_stock")
+        submit_button = st.form_submit_button("Update Product")
+        if submit_button:
+            product_manager.edit_product(product_id, name, price, stock_quantity)
+            st.success(f"Product ID '{product_id}' updated successfully!")
+
+
+@panel
+def delete_product_panel():
+    st.subheader("Delete Product")
+    with st.form(key="delete_product_form"):
+        product_id = st.text_input("Product ID to delete", key="delete_id")
+        submit_button = st.form_submit_button("Delete Product")
+        if submit_button:
+            product_manager.delete_product(product_id)
+            st.success(f"Product ID '{product_id}' deleted successfully!")
+
+
+@panel
+def search_product_panel():
+    st.subheader("Search Product")
+    product_name = st.text_input("Enter Product Name to search", key="search_name")
+    if st.button("Search Product"):
+        results = product_manager.search_product(product_name)
+        if results:
+            df = results_to_frame(results)
+            st.dataframe(df)  # Hiển thị kết quả dưới dạng bảng
+        else:
+            st.warning("No matching product found.")
+
+
+@panel
+def all_product_panel():
+    st.subheader("All Product")
+    show_listing(
+        "all_products",
+        product_manager.show_product_page,
+        product_manager.product_changes_since,
+        "ProductID",
+        "No products available.",
+        refresh_tags=('products',)
+    )
+
+
+@panel
+def stock_movements_panel():
+    st.subheader("Stock Movements")
+    product_id = st.text_input("Product ID", key="stock_movements_product_id")
+    if product_id:
+        results = inventory_manager.show_stock_movements(product_id)
+        if results:
+            st.dataframe(results_to_frame(results))
+        else:
+            st.info(f"No stock movements recorded for product {product_id}.")
+
+
+# Order Management
+@panel
+def place_order_panel():
+    st.subheader("Place Order")
+    with st.form(key="place_order_form"):
+        customer_id = st.text_input("Customer ID", key="place_customer_id")
+        employee_id = st.text_input("Employee ID", key="place_employee_id")
+        order_date = st.date_input("Order Date", value=datetime.today(), key="place_order_date")
+        cart = st.data_editor(
+            pd.DataFrame({"Product ID": pd.Series(dtype="str"), "Quantity": pd.Series(dtype="int")}),
+            num_rows="dynamic",
+            column_config={
+                "Product ID": st.column_config.TextColumn("Product ID", required=True),
+                "Quantity": st.column_config.NumberColumn("Quantity", min_value=1, step=1, required=True)
+            },
+            key="place_order_cart"
+        )
+        submit_button = st.form_submit_button("Place Order")
+
+        if submit_button:
+            cart = cart.dropna()
+            lines = list(zip(cart["Product ID"].str.strip(), cart["Quantity"]))
+            if not customer_id or not employee_id or not lines:
+                st.warning("Please enter customer, employee and at least one product line.")
+            else:
+                order_id = order_manager.place_order(customer_id, employee_id, order_date, lines)
+                if order_id:
+                    st.success(f"Order {order_id} placed with {len(lines)} lines.")
+                else:
+                    st.error("Order could not be placed. No changes were saved.")
+
+
+@panel
+def create_order_panel():
+    st.subheader("Create Order")
+    with st.form(key="create_order_form"):
+        customer_id = st.text_input("Customer ID", key="create_customer_id")
+        employee_id = st.text_input("Employee ID", key="create_employee_id")
+        order_date = st.date_input("Order Date", value=datetime.today())
+        submit_button = st.form_submit_button("Create Order")
+
+        if submit_button:
+            order_manager.create_order(customer_id, order_date, employee_id)
+            st.success(f"Order for customer {customer_id} created successfully!")
+
+
+@panel
+def update_order_status_panel():
+    st.subheader("Update Order Status")
+    with st.form(key="update_order_status_form"):
+        order_id = st.text_input("Order ID", key="update_order_id")
+        status = st.selectbox("Order Status", ["Pending", "Completed", "Cancelled", "Shipped"])
+        submit_button = st.form_submit_button("Update Order Status")
+
+        if submit_button:
+            order_manager.update_order_status(order_id, status)
+            st.success(f"Order {order_id} status updated to {status}")
+
+
+@panel
+def add_order_details_panel():
+    st.subheader("Add Order Details")
+    with st.form(key="add_order_details_form"):
+        order_id = st.text_input("Order ID", key="add_order_id")
+        product_id = st.text_input("Product ID", key="add_product_id")
+        quantity = st.number_input("Quantity", min_value=1, step=1, key="add_quantity")
+        submit_button = st.form_submit_button("Add Order Details")
+
+        if submit_button:
+            try:
+                order_details_manager.add_order_details(order_id, product_id, quantity)
+                st.success(f"Order details added for order {order_id}, product {product_id}.")
+            except Exception as e:
+                st.error(f"Error adding order details: {e}")
+
+
+@panel
+def all_order_details_panel():
+    st.subheader("All Order Details")
+    show_listing(
+        "all_order_details",
+        order_manager.get_order_details_page,
+        order_manager.order_detail_changes_since,
+        "OrderDetailID",
+        "No order details found.",
+        refresh_tags=('order_details',)
+    )
+
+
+@panel
+def search_orders_panel():
+    st.subheader("Search Orders")
+    with st.form(key="search_order_form"):
+        search_term = st.text_input("Customer Name", key="search_customer_name")
+        include_archive = st.checkbox("Include archived orders", key="search_order_archive")
+        submit_button = st.form_submit_button("Search")
+
+        if submit_button:
+            try:
+                results = order_manager.search_order(search_term, include_archive=include_archive)
+                if results:
+                    df = results_to_frame(results)
+                    st.dataframe(df)
+                else:
+                    st.warning(f"No orders found for customer name containing '{search_term}'.")
+            except Exception as e:
+                st.error(f"Error searching orders: {e}")
+
+
+# Employee Management
+@panel
+def add_employee_panel():
+    st.subheader("Add New Employee")
+    with st.form(key="add_employee_form"):
+        name = st.text_input("Employee Name")
+        job_title = st.text_input("Job Title")
+        submit_button = st.form_submit_button("Add Employee")
+
+        if submit_button:
+            employee_manager.add_employee(name, job_title)
+            st.success(f"Employee {name} added successfully!")
+
+
+@panel
+def update_employee_panel():
+    st.subheader("Update Existing Employee")
+    with st.form(key="update_employee_form"):
+        employee_id = st.text_input("Employee ID")
+        updated_name = st.text_input("Updated Name")
+        updated_job_title = st.text_input("Updated Job Title")
+        update_button = st.form_submit_button("Update Employee")
+
+        if update_button:
+            if employee_id and updated_name and updated_job_title:
+                try:
+                    employee_manager.update_employee(employee_id, updated_name, updated_job_title)
+                    st.success(f"Employee {employee_id} updated successfully!")
+                except Exception as e:
+                    st.error(f"Error updating employee: {e}")
+            else:
+                st.warning("Please fill in all fields for update.")
+
+
+@panel
+def search_employee_panel():
+    st.subheader("Search Employee")
+    search_name = st.text_input("Enter Name to Search", key="search_employee")
+    if st.button("Search Employee"):
+        results = employee_manager.search_employee(search_name)
+        if results:
+            df = results_to_frame(results)
+            st.dataframe(df)  
+        else:
+            st.warning("No matching employee found.")
+
+
+@panel
+def all_employee_panel():
+    st.subheader("All Employee")
+    show_listing(
+        "all_employees",
+        employee_manager.show_employee_page,
+        employee_manager.employee_changes_since,
+        "EmployeeID",
+        "No employees available.",
+        refresh_tags=('employees',)
+    )
+
+
+# Sales Reports
+@panel
+def dashboard_panel():
+    st.subheader("Dashboard")
+    col1, col2, col3 = st.columns(3)
+    all_time = col1.checkbox("All time", value=True, key="dashboard_all_time")
+    start_date = col2.date_input("Start Date", key="dashboard_start", disabled=all_time)
+    end_date = col3.date_input("End Date", key="dashboard_end", disabled=all_time)
+    top_n = st.number_input("Top N", min_value=1, value=5, key="dashboard_top_n")
+    refresh_button("dashboard", 'sales')
+
+    if all_time:
+        start_date = end_date = None
+    snapshot = report_manager.dashboard_snapshot(start_date, end_date, top_n)
+    if snapshot is None:
+        st.error("Could not load the sales dashboard.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Sales", f"{snapshot.total_sales:,.0f}")
+    col2.metric("Order Lines", f"{snapshot.order_lines:,}")
+    col3.metric("Units Sold", f"{snapshot.quantity:,}")
+
+    col1, col2, col3 = st.columns(3)
+    for column, title, results in (
+        (col1, "Top Employees", snapshot.top_employees),
+        (col2, "Top Selling Products", snapshot.top_products),
+        (col3, "Top Customers", snapshot.top_customers)
+    ):
+        column.markdown(f"**{title}**")
+        column.dataframe(results_to_frame(results))
+
+    for title, results in (
+        ("Sales by Employee", snapshot.by_employee),
+        ("Sales by Product", snapshot.by_product),
+        ("Sales by Customer", snapshot.by_customer)
+    ):
+        with st.expander(title):
+            st.dataframe(results_to_frame(results))
+
+
+@panel
+def total_sales_by_date_panel():
+    st.subheader("Total Sales by Date")
+    start_date = st.date_input("Start Date", key="total_sales_start")
+    end_date = st.date_input("End Date", key="total_sales_end")
+    col1, col2 = st.columns(2)
+    granularity = col1.selectbox("Group by period", ["day", "week", "month"], key="total_sales_granularity")
+    dimension = col2.selectbox("Break down by", ["total", "product", "employee", "customer"], key="total_sales_dimension")
+    if st.button("Get Total Sales Report"):
+        st.session_state["total_sales_range"] = (start_date, end_date)
+        st.session_state.pop("total_sales_lines_cursors", None)
+        st.session_state.pop("total_sales_lines_archive_cursors", None)
+
+    if "total_sales_range" in st.session_state:
+        start_date, end_date = st.session_state["total_sales_range"]
+        results = report_manager.get_sales_rollup(
+            start_date, end_date, granularity, None if dimension == "total" else dimension
+        )
+        df = results_to_frame(results)
+        if dimension == "total":
+            df = df.drop(columns=["DimensionID"], errors="ignore")
+        st.dataframe(df)
+
+        if st.checkbox("Show individual order lines", key="total_sales_show_lines"):
+            include_archive = st.checkbox("Include archived orders", key="total_sales_archive")
+            show_paged_table(
+                "total_sales_lines_archive" if include_archive else "total_sales_lines",
+                lambda after, page_size, descending: report_manager.get_sales_lines_page(
+                    start_date, end_date, after, page_size, include_archive
+                ),
+                "No order lines in this range.",
+                cursor_of=lambda row: (row[3], row[4]),
+                sortable=False,
+                refresh_tags=('orders', 'order_details')
+            )
+
+
+@panel
+def sales_by_employee_panel():
+    st.subheader("Sales by Employee")
+    refresh_button("sales_by_employee", 'sales')
+    results = report_manager.get_sales_by_employee()
+    df = results_to_frame(results)
+    st.dataframe(df)
+
+
+@panel
+def sales_by_product_panel():
+    st.subheader("Sales by Product")
+    refresh_button("sales_by_product", 'sales')
+    results = report_manager.get_sales_by_product()
+    df = results_to_frame(results)
+    st.dataframe(df)
+
+
+@panel
+def sales_by_customer_panel():
+    st.subheader("Sales by Customer")
+    refresh_button("sales_by_customer", 'sales')
+    results = report_manager.get_sales_by_customer()
+    df = results_to_frame(results)
+    st.dataframe(df)
+
+
+@panel
+def top_employees_panel():
+    st.subheader("Top Employees")
+    top_n = st.number_input("Number of Top Employees", min_value=1, value=5)
+    if st.button("Get Top Employees"):
+        results = report_manager.get_top_employees(top_n)
+        df = results_to_frame(results)
+        st.dataframe(df)
+
+
+@panel
+def top_selling_products_panel():
+    st.subheader("Top Selling Products")
+    top_n = st.number_input("Number of Top Products", min_value=1, value=5, key="top_products")
+    if st.button("Get Top Selling Products"):
+        results = report_manager.get_top_selling_products(top_n)
+        df = results_to_frame(results)
+        st.dataframe(df)
+
+
+@panel
+def top_customers_panel():
+    st.subheader("Top Customers")
+    top_n = st.number_input("Number of Top Customers", min_value=1, value=5, key="top_customers")
+    if st.button("Get Top Customers"):
+        results = report_manager.get_top_customers(top_n)
+        df = results_to_frame(results)
+        st.dataframe(df)
+
+
+@panel
+def summary_maintenance_panel():
+    st.subheader("Summary Maintenance")
+    col1, col2 = st.columns(2)
+    if col1.button("Verify Sales Summaries"):
+        mismatches = report_manager.verify_sales_summaries()
+        if mismatches:
+            st.warning(f"{len(mismatches)} summary rows differ from the live totals.")
+            st.dataframe(results_to_frame(mismatches))
+        else:
+            st.success("Summary tables match the live totals.")
+    if col2.button("Rebuild Sales Summaries"):
+        report_manager.rebuild_sales_summaries()
+        st.success("Sales summary tables rebuilt.")
+
+
 # Gọi hàm để đặt ảnh nền
 set_background("background.jpg")
 
@@ -334,9 +670,22 @@ menu = [
     "Product Management", 
     "Order Management", 
     "Employee Management", 
-    "Sales Reports"
+    "Sales Reports",
+    "Export",
+    "Diagnostics"
 ]
 choice = st.sidebar.selectbox("Select a task", menu, index=0)
+# Gắn tên trang cho mọi truy vấn trong lần chạy này để biết trang nào tốn DB nhất
+current_source.set(choice)
+# Mỗi session trình duyệt đọc lại được dữ liệu chính nó vừa ghi dù replica đang trễ
+st.session_state.setdefault("db_session", uuid.uuid4().hex)
+current_session.set(st.session_state["db_session"])
+
+cache_stats = db.cache.stats()
+st.sidebar.caption(
+    f"Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+    f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['entries']} entries)"
+)
 
 # Trang Welcome
 if choice == "Welcome":
@@ -352,297 +701,153 @@ if choice == "Welcome":
 
 elif choice == "Customer Management":
     st.subheader("Customer Management")
-
-    tab1, tab2, tab3, tab4 = st.tabs(["Register Customer", "Update Customer", "Search Customer", "All Customer"])
-
-    with tab1:
-        st.subheader("Register Customer")
-        with st.form(key="register_customer_form"):
-            name = st.text_input("Name", key="register_name")
-            address = st.text_input("Address", key="register_address")
-            phone = st.text_input("Phone", key="register_phone")
-            submit_button = st.form_submit_button("Register Customer")
-            if submit_button:
-                customer_manager.register_customer(name, address, phone)
-                st.success(f"Customer '{name}' registered successfully!")
-
-    with tab2:
-        st.subheader("Update Customer")
-        with st.form(key="update_customer_form"):
-            customer_id = st.text_input("Customer ID", key="update_id")
-            name = st.text_input("New Name", key="update_name")
-            address = st.text_input("New Address", key="update_address")
-            phone = st.text_input("New Phone", key="update_phone")
-            submit_button = st.form_submit_button("Update Customer")
-            if submit_button:
-                customer_manager.update_customer(customer_id, name, address, phone)
-                st.success(f"Customer ID '{customer_id}' updated successfully!")
-
-    with tab3:
-        st.subheader("Search Customer")
-        search_name = st.text_input("Enter Name to Search", key="search_customer")
-        if st.button("Search Customer"):
-            results = customer_manager.search_customer(search_name)
-            if results:
-                df = pd.DataFrame(results, columns=["CustomerID", "Name", "Address", "Phone"])
-                st.dataframe(df)  # Hiển thị kết quả dưới dạng bảng
-            else:
-                st.warning("No matching customer found.")
-
-    with tab4:
-        st.subheader("All Customer")
-        results = customer_manager.show_customer()
-        if results:
-            df = pd.DataFrame(results, columns=["Customer ID", "Customer Name", "Address", "Phone"])
-            st.dataframe(df)
-        else:
-            st.info("No customers available.")
+    show_sections("customer_management", {
+        "Register Customer": register_customer_panel,
+        "Update Customer": update_customer_panel,
+        "Search Customer": search_customer_panel,
+        "All Customer": all_customer_panel,
+        "Bulk Import": bulk_import_panel("customers")
+    })
 
 elif choice == "Product Management":
     st.subheader("Product Management")
-
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Add Product", "Edit Product", "Delete Product", "Search Product", "All Product"])
-
-    with tab1:
-        st.subheader("Add Product")
-        with st.form(key="add_product_form"):
-            name = st.text_input("Product Name", key="add_name")
-            price = st.number_input("Price", min_value=0.0, key="add_price")
-            stock_quantity = st.number_input("Stock Quantity", min_value=0, step=1, key="add_stock")
-            submit_button = st.form_submit_button("Add Product")
-            if submit_button:
-                product_manager.add_product(name, price, stock_quantity)
-                st.success(f"Product '{name}' added successfully!")
-
-    with tab2:
-        st.subheader("Edit Product")
-        with st.form(key="edit_product_form"):
-            product_id = st.text_input("Product ID", key="edit_id")
-            name = st.text_input("New Product Name", key="edit_name")
-            price = st.number_input("New Price", min_value=0.0, key="edit_price")
-            stock_quantity = st.number_input("New Stock Quantity", min_value=0, step=1, key="edit_stock")
-            submit_button = st.form_submit_button("Update Product")
-            if submit_button:
-                product_manager.edit_product(product_id, name, price, stock_quantity)
-                st.success(f"Product ID '{product_id}' updated successfully!")
-
-    with tab3:
-        st.subheader("Delete Product")
-        with st.form(key="delete_product_form"):
-            product_id = st.text_input("Product ID to delete", key="delete_id")
-            submit_button = st.form_submit_button("Delete Product")
-            if submit_button:
-                product_manager.delete_product(product_id)
-                st.success(f"Product ID '{product_id}' deleted successfully!")
-
-    with tab4:
-        st.subheader("Search Product")
-        product_name = st.text_input("Enter Product Name to search", key="search_name")
-        if st.button("Search Product"):
-            results = product_manager.search_product(product_name)
-            if results:
-                df = pd.DataFrame(results, columns=["ProductID", "ProductName", "Price", "Stock", "Is Active"])
-                st.dataframe(df)  # Hiển thị kết quả dưới dạng bảng
-            else:
-                st.warning("No matching product found.")
-
-    with tab5:
-        st.subheader("All Product")
-        results = product_manager.show_product()
-        if results:
-            df = pd.DataFrame(results, columns=["Product ID", "Product Name", "Price", "Stock Quantity"])
-            st.dataframe(df)
-        else:
-            st.info("No products available.")
+    show_sections("product_management", {
+        "Add Product": add_product_panel,
+        "Edit Product": edit_product_panel,
+        "Delete Product": delete_product_panel,
+        "Search Product": search_product_panel,
+        "All Product": all_product_panel,
+        "Stock Movements": stock_movements_panel,
+        "Bulk Import": bulk_import_panel("products")
+    })
 
 elif choice == "Order Management":
     st.subheader("Order Management")
-
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Create Order", "Update Order Status", "Add Order Details", "All Order Details", "Search Orders"])
-
-    with tab1:
-        st.subheader("Create Order")
-        with st.form(key="create_order_form"):
-            customer_id = st.text_input("Customer ID", key="create_customer_id")
-            employee_id = st.text_input("Employee ID", key="create_employee_id")
-            order_date = st.date_input("Order Date", value=datetime.today())
-            submit_button = st.form_submit_button("Create Order")
-            
-            if submit_button:
-                order_manager.create_order(customer_id, order_date, employee_id)
-                st.success(f"Order for customer {customer_id} created successfully!")
-
-    with tab2:
-        st.subheader("Update Order Status")
-        with st.form(key="update_order_status_form"):
-            order_id = st.text_input("Order ID", key="update_order_id")
-            status = st.selectbox("Order Status", ["Pending", "Completed", "Cancelled", "Shipped"])
-            submit_button = st.form_submit_button("Update Order Status")
-            
-            if submit_button:
-                order_manager.update_order_status(order_id, status)
-                st.success(f"Order {order_id} status updated to {status}")
-
-    with tab3:
-        st.subheader("Add Order Details")
-        with st.form(key="add_order_details_form"):
-            order_id = st.text_input("Order ID", key="add_order_id")
-            product_id = st.text_input("Product ID", key="add_product_id")
-            quantity = st.number_input("Quantity", min_value=1, step=1, key="add_quantity")
-            submit_button = st.form_submit_button("Add Order Details")
-            
-            if submit_button:
-                try:
-                    order_details_manager.add_order_details(order_id, product_id, quantity)
-                    st.success(f"Order details added for order {order_id}, product {product_id}.")
-                except Exception as e:
-                    st.error(f"Error adding order details: {e}")
-
-    with tab4:
-        st.subheader("All Order Details")
-        try:
-            results = order_manager.get_all_order_details()
-            if results:
-                df = pd.DataFrame(results, columns=[
-                    "Order Detail ID", "Order ID", "Product ID", "Quantity", "Sale Price"
-                ])  
-                st.dataframe(df)
-            else:
-                st.warning("No order details found.")
-        except Exception as e:
-            st.error(f"Error retrieving order details: {e}")
-
-    with tab5:
-        st.subheader("Search Orders")
-        with st.form(key="search_order_form"):
-            search_term = st.text_input("Customer Name", key="search_customer_name")
-            submit_button = st.form_submit_button("Search")
-
-            if submit_button:
-                try:
-                    results = order_manager.search_order(search_term)
-                    if results:
-                        df = pd.DataFrame(results, columns=["Order ID", "Customer Name", "Employee Name", "Order Date", "Status"])
-                        st.dataframe(df)
-                    else:
-                        st.warning(f"No orders found for customer name containing '{search_term}'.")
-                except Exception as e:
-                    st.error(f"Error searching orders: {e}")
+    show_sections("order_management", {
+        "Place Order": place_order_panel,
+        "Create Order": create_order_panel,
+        "Update Order Status": update_order_status_panel,
+        "Add Order Details": add_order_details_panel,
+        "All Order Details": all_order_details_panel,
+        "Search Orders": search_orders_panel
+    })
 
 elif choice == "Employee Management":
     st.subheader("Employee Management")
-
-    tab1, tab2, tab3, tab4 = st.tabs(["Add Employee", "Update Employee", "Search Employee", "All Employee"])
-
-    with tab1:
-        st.subheader("Add New Employee")
-        with st.form(key="add_employee_form"):
-            name = st.text_input("Employee Name")
-            job_title = st.text_input("Job Title")
-            submit_button = st.form_submit_button("Add Employee")
-            
-            if submit_button:
-                employee_manager.add_employee(name, job_title)
-                st.success(f"Employee {name} added successfully!")
-
-    with tab2:
-        st.subheader("Update Existing Employee")
-        with st.form(key="update_employee_form"):
-            employee_id = st.text_input("Employee ID")
-            updated_name = st.text_input("Updated Name")
-            updated_job_title = st.text_input("Updated Job Title")
-            update_button = st.form_submit_button("Update Employee")
-
-            if update_button:
-                if employee_id and updated_name and updated_job_title:
-                    try:
-                        employee_manager.update_employee(employee_id, updated_name, updated_job_title)
-                        st.success(f"Employee {employee_id} updated successfully!")
-                    except Exception as e:
-                        st.error(f"Error updating employee: {e}")
-                else:
-                    st.warning("Please fill in all fields for update.")
-
-    with tab3:
-        st.subheader("Search Employee")
-        search_name = st.text_input("Enter Name to Search", key="search_employee")
-        if st.button("Search Employee"):
-            results = employee_manager.search_employee(search_name)
-            if results:
-                df = pd.DataFrame(results, columns=["Employee ID", "Name", "Job Title"])
-                st.dataframe(df)  
-            else:
-                st.warning("No matching employee found.")
-
-    with tab4:
-        st.subheader("All Employee")
-        results = employee_manager.show_employee()
-        if results:
-            df = pd.DataFrame(results, columns=["Employee ID", "Employee Name", "Job Title"])
-            st.dataframe(df)
-        else:
-            st.info("No customers available.")
+    show_sections("employee_management", {
+        "Add Employee": add_employee_panel,
+        "Update Employee": update_employee_panel,
+        "Search Employee": search_employee_panel,
+        "All Employee": all_employee_panel,
+        "Bulk Import": bulk_import_panel("employees")
+    })
 
 elif choice == "Sales Reports":
     st.subheader("Sales Reports")
+    show_sections("sales_reports", {
+        "Dashboard": dashboard_panel,
+        "Total Sales by Date": total_sales_by_date_panel,
+        "Sales by Employee": sales_by_employee_panel,
+        "Sales by Product": sales_by_product_panel,
+        "Sales by Customer": sales_by_customer_panel,
+        "Top Employees": top_employees_panel,
+        "Top Selling Products": top_selling_products_panel,
+        "Top Customers": top_customers_panel,
+        "Summary Maintenance": summary_maintenance_panel
+    })
+
+elif choice == "Export":
+    st.subheader("Export")
+    name = st.selectbox("Listing or report", sorted(EXPORTS))
+    fmt = st.radio("Format", FORMATS, horizontal=True)
+    spec = EXPORTS[name]
+    values = {}
+    if "start_date" in spec.params:
+        values["start_date"] = st.date_input("Start Date", key="export_start_date")
+        values["end_date"] = st.date_input("End Date", key="export_end_date")
+    if "granularity" in spec.params:
+        values["granularity"] = st.selectbox("Granularity", ["day", "week", "month"], key="export_granularity")
+        values["dimension"] = st.selectbox("Break down by", [None, "employee", "product", "customer"], key="export_dimension")
+    if "top_n" in spec.params:
+        values["top_n"] = st.number_input("Top N", min_value=1, value=10, key="export_top_n")
+
+    if st.button("Prepare export"):
+        # Ghi ra file tạm theo từng chunk để bộ nhớ của tiến trình không phụ thuộc kích thước kết quả
+        handle, path = tempfile.mkstemp(suffix=f".{fmt}")
+        os.close(handle)
+        try:
+            rows = export(db, name, tuple(values[param] for param in spec.params), path, fmt)
+        except Exception as e:
+            os.remove(path)
+            st.error(f"Export failed: {e}")
+        else:
+            previous = st.session_state.pop("export_file", None)
+            if previous and os.path.exists(previous["path"]):
+                os.remove(previous["path"])
+            st.session_state["export_file"] = {"path": path, "name": f"{name}.{fmt}", "rows": rows}
+
+    export_file = st.session_state.get("export_file")
+    if export_file and os.path.exists(export_file["path"]):
+        st.caption(f"{export_file['rows']} rows, {os.path.getsize(export_file['path']) / 1024 ** 2:.1f} MB")
+        with open(export_file["path"], "rb") as f:
+            st.download_button(
+                f"Download {export_file['name']}", f, export_file["name"],
+                "text/csv" if export_file["name"].endswith(".csv") else "application/octet-stream"
+            )
 
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
-        "Total Sales by Date", 
-        "Sales by Employee",
-        "Sales by Product", 
-        "Sales by Customer", 
-        "Top Employees", 
-        "Top Selling Products",
-        "Top Customers"
-    ])
-
-    with tab1:
-        st.subheader("Total Sales by Date")
-        start_date = st.date_input("Start Date", key="total_sales_start")
-        end_date = st.date_input("End Date", key="total_sales_end")
-        if st.button("Get Total Sales Report"):
-            results = report_manager.get_total_sales_report(start_date, end_date)
-            df = pd.DataFrame(results, columns=["OrderID", "ProductID", "SalePrice", "OrderDate"])
-            st.dataframe(df)
-
-    with tab2:
-        st.subheader("Sales by Employee")
-        results = report_manager.get_sales_by_employee()
-        df = pd.DataFrame(results, columns=["EmployeeID", "EmployeeName", "TotalSales"])
-        st.dataframe(df)
-
-    with tab3:
-        st.subheader("Sales by Product")
-        results = report_manager.get_sales_by_product()
-        df = pd.DataFrame(results, columns=["ProductID", "ProductName", "TotalSales"])
-        st.dataframe(df)
-
-    with tab4:
-        st.subheader("Sales by Customer")
-        results = report_manager.get_sales_by_customer()
-        df = pd.DataFrame(results, columns=["CustomerID", "CustomerName", "TotalSales"])
+elif choice == "Diagnostics":
+    st.subheader("Diagnostics")
+    instrumentation = db.instrumentation
+
+    # Ngưỡng dùng chung cho mọi session nên chỉ đổi khi bấm Apply, không phải mỗi lần trang chạy lại
+    with st.form(key="slow_threshold_form"):
+        threshold = st.number_input(
+            "Slow call threshold (ms)", min_value=1, value=int(instrumentation.slow_threshold_ms), step=50
+        )
+        if st.form_submit_button("Apply"):
+            instrumentation.slow_threshold_ms = threshold
+    st.caption(
+        "Slow log parameters are redacted." if instrumentation.redact_params
+        else "Slow log parameters are kept raw (SALES_DB_REDACT_PARAMS=0)."
+    )
+
+    calls = instrumentation.snapshot()
+    if calls:
+        df = pd.DataFrame(calls).sort_values("total_ms", ascending=False)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Calls", int(df["calls"].sum()))
+        col2.metric("Errors", int(df["errors"].sum()))
+        col3.metric("DB time (s)", f"{df['total_ms'].sum() / 1000:.2f}")
+
+        st.markdown("**Time by page and panel**")
+        st.dataframe(df.groupby("source")[["calls", "errors", "total_ms", "rows", "bytes"]].sum().sort_values("total_ms", ascending=False))
+        st.markdown("**Calls**")
         st.dataframe(df)
-
-    with tab5:
-        st.subheader("Top Employees")
-        top_n = st.number_input("Number of Top Employees", min_value=1, value=5)
-        if st.button("Get Top Employees"):
-            results = report_manager.get_top_employees(top_n)
-            df = pd.DataFrame(results, columns=["EmployeeID", "EmployeeName", "TotalSales"])
-            st.dataframe(df)
-
-    with tab6:
-        st.subheader("Top Selling Products")
-        top_n = st.number_input("Number of Top Products", min_value=1, value=5, key="top_products")
-        if st.button("Get Top Selling Products"):
-            results = report_manager.get_top_selling_products(top_n)
-            df = pd.DataFrame(results, columns=["ProductID", "ProductName", "TotalSales"])
-            st.dataframe(df)
-
-    with tab7:
-        st.subheader("Top Customers")
-        top_n = st.number_input("Number of Top Customers", min_value=1, value=5, key="top_customers")
-        if st.button("Get Top Customers"):
-            results = report_manager.get_top_customers(top_n)
-            df = pd.DataFrame(results, columns=["CustomerID", "CustomerName", "TotalSales"])
-            st.dataframe(df)
+    else:
+        st.info("No database calls recorded yet.")
+
+    if db.replicas:
+        st.markdown("**Read routing**")
+        st.caption(
+            "primary: writes and reads without replicas · replica: reads served by a replica · "
+            "sticky: reads after this session wrote · fresh: reads of data written moments ago · "
+            "fallback: no replica was healthy and within the lag limit"
+        )
+        st.dataframe(pd.DataFrame([db.route_counts]))
+        st.dataframe(pd.DataFrame(db.replica_status()))
+
+    st.markdown("**Slow calls**")
+    slow_calls = list(instrumentation.slow_calls)
+    if slow_calls:
+        for slow_call in reversed(slow_calls):
+            with st.expander(f"{slow_call['time']}  {slow_call['elapsed_ms']:.0f} ms  {slow_call['name']}"):
+                st.json(slow_call)
+    else:
+        st.info("No calls above the threshold.")
+
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("Export Prometheus metrics", instrumentation.to_prometheus(), "metrics.prom", "text/plain")
+    col2.download_button("Export JSON", instrumentation.to_json(), "diagnostics.json", "application/json")
+    if col3.button("Reset statistics"):
+        instrumentation.reset()
+        st.rerun()
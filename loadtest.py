@@ -0,0 +1,297 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import datagen
+from benchmark import git_commit, percentile
+from database import add_connection_arguments, connect_from_args, current_session
+from instrumentation import current_source, last_error
+from managers import CustomerManager, ProductManager, OrderManager, OrderDetailsManager, ReportManager
+
+# Mã lỗi MySQL của deadlock và hết thời gian chờ khoá
+LOCK_ERRORS = {1213: "deadlock", 1205: "lock wait timeout"}
+
+# Tỉ trọng thao tác của từng vai trò, mô phỏng thu ngân ở quầy và người xem trang Sales Reports
+WORKLOADS = {
+    "cashier": {
+        "place_order": 35,
+        "add_order_details": 10,
+        "update_order_status": 15,
+        "search_customer": 15,
+        "search_product": 15,
+        "track_order": 10
+    },
+    "analyst": {
+        "dashboard": 40,
+        "total_sales_report": 20,
+        "sales_rollup": 20,
+        "sales_lines_page": 10,
+        "top_products": 10
+    }
+}
+
+
+class OperationStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.deadlocks = 0
+        self.last_error = None
+
+    def merge(self, other):
+        self.latencies += other.latencies
+        self.errors += other.errors
+        self.deadlocks += other.deadlocks
+        self.last_error = other.last_error or self.last_error
+
+
+def sample_data(db, limit=1000):
+    # ID thật để mọi thao tác chạm vào dữ liệu có sẵn; khách hàng / sản phẩm lấy ngẫu nhiên để không dồn vào vài dòng
+    def ids(query):
+        return [row[0] for row in db.fetch_query(query, (limit,))]
+
+    last_date = db.fetch_query("SELECT MAX(OrderDate) FROM Orders")[0][0] or date.today()
+    data = {
+        "customers": ids("SELECT CustomerID FROM Customers ORDER BY RAND() LIMIT %s"),
+        "products": ids("SELECT ProductID FROM Products WHERE IsActive = TRUE ORDER BY RAND() LIMIT %s"),
+        "employees": ids("SELECT EmployeeID FROM Employees LIMIT %s"),
+        "orders": ids("SELECT OrderID FROM Orders ORDER BY OrderID DESC LIMIT %s"),
+        "start_date": last_date - timedelta(days=30),
+        "end_date": last_date
+    }
+    names = db.fetch_query("SELECT CustomerName FROM Customers ORDER BY RAND() LIMIT %s", (100,))
+    data["customer_terms"] = [row[0].split()[-1] for row in names] or ["Nguyen"]
+    products = db.fetch_query("SELECT ProductName FROM Products ORDER BY RAND() LIMIT %s", (100,))
+    data["product_terms"] = [row[0].split()[0] for row in products] or ["Laptop"]
+    if not (data["customers"] and data["products"] and data["employees"]):
+        raise SystemExit("The database has no customers, products or employees; run datagen.py first.")
+    return data
+
+
+def write_ok(done):
+    # execute_proc trả về Future; chờ tới khi commit để độ trễ tính cả thời gian ghi bền vững
+    if done is None:
+        return False
+    error = done.exception()
+    if error is not None:
+        last_error.set(error)
+        return False
+    return True
+
+
+class Session(threading.Thread):
+    def __init__(self, name, role, db, data, stop_at, think_ms, seed):
+        super().__init__(name=name, daemon=True)
+        self.role = role
+        self.data = data
+        self.stop_at = stop_at
+        self.think = think_ms / 1000
+        self.rng = random.Random(seed)
+        self.customers = CustomerManager(db)
+        self.products = ProductManager(db)
+        self.orders = OrderManager(db)
+        self.order_details = OrderDetailsManager(db)
+        self.reports = ReportManager(db)
+        # Đơn của chính phiên này, các thao tác sửa đơn ưu tiên đơn vừa tạo như một thu ngân thật
+        self.recent_orders = list(self.rng.sample(data["orders"], min(5, len(data["orders"]))))
+        self.stats = {}
+
+    def pick(self, key):
+        return self.rng.choice(self.data[key])
+
+    def recent_order(self):
+        return self.rng.choice(self.recent_orders) if self.recent_orders else self.pick("orders")
+
+    # ---- Thu ngân ----
+    def place_order(self):
+        products = self.rng.sample(self.data["products"], min(self.rng.randint(1, 5), len(self.data["products"])))
+        lines = [(product_id, self.rng.randint(1, 3)) for product_id in products]
+        order_id = self.orders.place_order(self.pick("customers"), self.pick("employees"), date.today(), lines)
+        if order_id is None:
+            return False
+        self.recent_orders = (self.recent_orders + [order_id])[-20:]
+        return True
+
+    def add_order_details(self):
+        return write_ok(self.order_details.add_order_details(self.recent_order(), self.pick("products"), 1))
+
+    def update_order_status(self):
+        status = self.rng.choices(["Shipped", "Completed", "Cancelled"], weights=[50, 40, 10])[0]
+        return write_ok(self.orders.update_order_status(self.recent_order(), status))
+
+    def search_customer(self):
+        return self.customers.search_customer(self.pick("customer_terms")) is not None
+
+    def search_product(self):
+        return self.products.search_product(self.pick("product_terms")) is not None
+
+    def track_order(self):
+        return self.orders.track_order(self.recent_order()) is not None
+
+    # ---- Người xem báo cáo ----
+    def dashboard(self):
+        return self.reports.dashboard_snapshot(self.data["start_date"], self.data["end_date"], 5) is not None
+
+    def total_sales_report(self):
+        self.reports.get_total_sales_report(self.data["start_date"], self.data["end_date"])
+        return True
+
+    def sales_rollup(self):
+        self.reports.get_sales_rollup(self.data["start_date"], self.data["end_date"], "week")
+        return True
+
+    def sales_lines_page(self):
+        self.reports.get_sales_lines_page(self.data["start_date"], self.data["end_date"])
+        return True
+
+    def top_products(self):
+        self.reports.get_top_selling_products(10)
+        return True
+
+    def run(self):
+        current_session.set(self.name)
+        current_source.set(f"loadtest {self.role}")
+        names = list(WORKLOADS[self.role])
+        weights = list(WORKLOADS[self.role].values())
+        while time.monotonic() < self.stop_at:
+            name = self.rng.choices(names, weights=weights)[0]
+            stats = self.stats.setdefault(name, OperationStats())
+            last_error.set(None)
+            started = time.perf_counter()
+            try:
+                ok = getattr(self, name)()
+                error = last_error.get() if ok is not False else (last_error.get() or "failed")
+            except Exception as e:
+                error = e
+            stats.latencies.append((time.perf_counter() - started) * 1000)
+            if error is not None:
+                stats.errors += 1
+                stats.last_error = str(error)
+                if getattr(error, "errno", None) in LOCK_ERRORS:
+                    stats.deadlocks += 1
+            if self.think:
+                # Thời gian nghĩ ngẫu nhiên quanh giá trị trung bình để các phiên không chạy đồng bộ
+                time.sleep(self.rng.expovariate(1 / self.think))
+
+
+def run_step(db, data, cashiers, analysts, seconds, think_ms, seed, quiet):
+    stop_at = time.monotonic() + seconds
+    sessions = [
+        Session(f"cashier-{index}", "cashier", db, data, stop_at, think_ms, seed * 100003 + index)
+        for index in range(cashiers)
+    ] + [
+        Session(f"analyst-{index}", "analyst", db, data, stop_at, think_ms, seed * 100003 + cashiers + index)
+        for index in range(analysts)
+    ]
+    # Managers in ra từng thao tác; khi chạy hàng trăm phiên việc in làm sai lệch kết quả
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext():
+        started = time.monotonic()
+        for session in sessions:
+            session.start()
+        for session in sessions:
+            session.join()
+        elapsed = time.monotonic() - started
+    stats = {}
+    for session in sessions:
+        for name, operation in session.stats.items():
+            stats.setdefault(name, OperationStats()).merge(operation)
+    return stats, elapsed
+
+
+def summarize(stats, elapsed):
+    rows = []
+    for name, operation in sorted(stats.items()):
+        latencies = sorted(operation.latencies)
+        count = len(latencies)
+        rows.append({
+            "operation": name,
+            "count": count,
+            "throughput": round(count / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "error_rate": round(operation.errors / count, 4),
+            "deadlock_rate": round(operation.deadlocks / count, 4),
+            "last_error": operation.last_error
+        })
+    return rows
+
+
+def print_step(sessions, rows, elapsed):
+    total = sum(row["count"] for row in rows)
+    errors = sum(row["error_rate"] * row["count"] for row in rows)
+    print(f"--- {sessions} sessions: {total / elapsed:.1f} ops/s, {errors / max(total, 1):.2%} errors ---")
+    print(f"{'operation':22s} {'ops/s':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'errors':>8s} {'deadlocks':>10s}")
+    for row in rows:
+        print(f"{row['operation']:22s} {row['throughput']:9.1f} {row['p50_ms']:9.2f} {row['p95_ms']:9.2f} {row['p99_ms']:9.2f} "
+              f"{row['error_rate']:8.2%} {row['deadlock_rate']:10.2%}")
+        if row["last_error"]:
+            print(f"{'':22s} last error: {row['last_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a mixed cashier / analyst workload from many concurrent sessions through the manager classes "
+                    "and ramp the session count to find where throughput stops growing."
+    )
+    add_connection_arguments(parser)
+    parser.add_argument("--ramp", type=int, nargs="+", default=[5, 10, 25, 50, 100],
+                        help="Total concurrent sessions for each step")
+    parser.add_argument("--analyst-share", type=float, default=0.1, help="Fraction of sessions that load Sales Reports")
+    parser.add_argument("--step-seconds", type=float, default=30)
+    parser.add_argument("--think-ms", type=float, default=0, help="Mean pause between operations of one session, 0 for closed-loop load")
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the result cache")
+    parser.add_argument("--scale", type=float, help="Reload the schema and generate data at this scale first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Keep the managers' per-call output")
+    parser.add_argument("--output", default="loadtest_results.jsonl", help="JSON Lines file to append results to")
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        datagen.load_schema(args)
+        loader = connect_from_args(args, pool_size=2, cache_size=0)
+        datagen.generate(loader, args.scale, args.seed)
+    db = connect_from_args(args, pool_size=args.pool_size, cache_size=0 if args.no_cache else 256)
+    data = sample_data(db)
+    run_info = {"run_id": datetime.now().strftime("%Y%m%dT%H%M%S"), "git_commit": git_commit(),
+                "pool_size": args.pool_size, "think_ms": args.think_ms, "write_behind": args.write_behind}
+
+    results = []
+    best = None
+    saturated_at = None
+    for step, sessions in enumerate(args.ramp):
+        analysts = round(sessions * args.analyst_share)
+        cashiers = sessions - analysts
+        stats, elapsed = run_step(db, data, cashiers, analysts, args.step_seconds, args.think_ms, args.seed + step, not args.verbose)
+        rows = summarize(stats, elapsed)
+        print_step(sessions, rows, elapsed)
+        throughput = sum(row["count"] for row in rows) / elapsed
+        results += [dict(run_info, sessions=sessions, cashiers=cashiers, analysts=analysts, **row) for row in rows]
+        # Bão hoà: thêm phiên mà tổng throughput tăng chưa tới 10%
+        if best is not None and saturated_at is None and throughput < best[1] * 1.1:
+            saturated_at = sessions
+        if best is None or throughput > best[1]:
+            best = (sessions, throughput)
+    db.close()
+
+    print(f"\nPeak throughput {best[1]:.1f} ops/s at {best[0]} sessions.")
+    if saturated_at is not None:
+        print(f"Throughput stopped growing at {saturated_at} sessions; latency beyond this point is queueing.")
+    else:
+        print("Throughput was still growing at the last step; extend --ramp to find the saturation point.")
+    print(f"Pool: {db.route_counts}, cache: {db.cache.stats()}")
+
+    with open(args.output, "a") as f:
+        for result in results:
+            f.write(json.dumps(result, default=str) + "\n")
+    print(f"Wrote {len(results)} results to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
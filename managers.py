@@ -0,0 +1,480 @@
+from collections import namedtuple
+
+from database import parse_id
+
+
+DashboardSnapshot = namedtuple("DashboardSnapshot", [
+    "start_date", "end_date", "top_n",
+    "total_sales", "order_lines", "quantity",
+    "by_employee", "by_product", "by_customer",
+    "top_employees", "top_products", "top_customers"
+])
+
+# Phần thay đổi của một danh sách: rows là các dòng đổi từ lần trước, hoặc cả danh sách khi full_reload
+ListingDelta = namedtuple("ListingDelta", ["watermark", "full_reload", "rows"])
+
+# Dòng bán hàng trong khoảng ngày; {orders} / {details} là bảng chính hoặc bảng lưu trữ.
+# Điều kiện ngày đặt trên cả hai bảng để mỗi bảng chỉ quét các phân vùng trong khoảng.
+TOTAL_SALES_QUERY = '''
+    SELECT
+        FormatId('O', O.OrderID) AS OrderID,
+        FormatId('P', OD.ProductID) AS ProductID,
+        OD.SalePrice,
+        O.OrderDate
+    FROM {orders} O
+    JOIN {details} OD ON O.OrderID = OD.OrderID AND O.OrderDate = OD.OrderDate
+    WHERE O.OrderDate BETWEEN %s AND %s AND OD.OrderDate BETWEEN %s AND %s
+'''
+
+
+def total_sales_query(include_archive=False):
+    # Dùng chung cho báo cáo và xuất file; tham số là (start_date, end_date) * 2, gấp đôi khi có kho lưu trữ
+    query = TOTAL_SALES_QUERY.format(orders="Orders", details="OrderDetails")
+    if include_archive:
+        query += " UNION ALL " + TOTAL_SALES_QUERY.format(orders="OrdersArchive", details="OrderDetailsArchive")
+    return query + " ORDER BY OrderDate"
+
+
+# LineID (OrderDetailID dạng số) chỉ dùng để sắp xếp khi gộp hai nhánh, không trả về
+SALES_LINES_QUERY = '''
+    SELECT
+        FormatId('O', O.OrderID) AS OrderID,
+        FormatId('P', OD.ProductID) AS ProductID,
+        OD.SalePrice,
+        O.OrderDate,
+        FormatId('OD', OD.OrderDetailID) AS OrderDetailID,
+        O.Status,
+        OD.OrderDetailID AS LineID
+    FROM {orders} O
+    JOIN {details} OD ON O.OrderID = OD.OrderID AND O.OrderDate = OD.OrderDate
+    WHERE O.OrderDate BETWEEN %s AND %s AND OD.OrderDate BETWEEN %s AND %s{keyset}
+    ORDER BY O.OrderDate, OD.OrderDetailID LIMIT %s
+'''
+
+
+def fetch_changes(db_connection, proc_name, since):
+    # Luôn đọc từ primary: watermark của replica đang trễ sẽ bỏ sót các dòng chưa chép tới.
+    # Watermark đã lùi về transaction cũ nhất còn mở, trừ thêm 1 giây (ChangeWatermark) nên có thể lấy trùng
+    # vài dòng, không sao vì client ghép theo khoá
+    result_sets = db_connection.fetch_proc(proc_name, (since,), all_results=True, fresh=True)
+    if len(result_sets) != 2:
+        print(f"{proc_name} returned {len(result_sets)} result sets, expected 2.")
+        return None
+    watermark, full_reload = result_sets[0][0]
+    return ListingDelta(watermark, bool(full_reload), result_sets[1])
+
+
+def report_write(done, message):
+    # Với write-behind, execute_proc trả về khi lệnh mới được xếp hàng: chỉ báo thành công sau khi commit,
+    # lỗi đã được in ở nơi chạy lệnh
+    def report(future):
+        if future.exception() is None:
+            print(message)
+    done.add_done_callback(report)
+    return done
+
+
+class CustomerManager:
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def register_customer(self, name, address, phone):
+        try:
+            done = self.db_connection.execute_proc('RegisterCustomer', (name, address, phone), ('customers',))
+            return report_write(done, f"Customer {name} registered successfully.")
+        except Exception as e:
+            print(f"Error registering customer {name}: {e}")
+
+    def update_customer(self, customer_id, name, address, phone):
+        try:
+            done = self.db_connection.execute_proc('UpdateCustomer', (customer_id, name, address, phone), ('customers',))
+            return report_write(done, f"Customer {customer_id} updated successfully.")
+        except Exception as e:
+            print(f"Error updating customer {customer_id}: {e}")
+
+    def search_customer(self, customer_name, limit=50):
+        try:
+            results = self.db_connection.cached_proc('SearchCustomer', (customer_name, limit), ('customers',))
+            print(f"Search result for customer '{customer_name}': {results}")
+            return results
+        except Exception as e:
+            print(f"Error searching customer '{customer_name}': {e}")
+
+    def show_customer(self):
+        try:
+            results = self.db_connection.cached_proc('ShowCustomer', (), ('customers',))
+            return results
+        except Exception as e:
+            print(f"Error showing customers: {e}")
+            return []
+
+
+    def show_customer_page(self, after_id=None, page_size=50, descending=False):
+        try:
+            return self.db_connection.cached_proc('ShowCustomerPage', (after_id, page_size, descending), ('customers',))
+        except Exception as e:
+            print(f"Error showing customer page after {after_id}: {e}")
+            return []
+
+    def customer_changes_since(self, since=None):
+        return fetch_changes(self.db_connection, 'CustomerChangesSince', since)
+
+class ProductManager:
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def add_product(self, name, price, stock_quantity):
+        try:
+            done = self.db_connection.execute_proc('AddProduct', (name, price, stock_quantity), ('products',))
+            return report_write(done, f"Product {name} added successfully.")
+        except Exception as e:
+            print(f"Error adding product {name}: {e}")
+
+    def edit_product(self, product_id, name, price, stock_quantity):
+        try:
+            done = self.db_connection.execute_proc('EditProduct', (product_id, name, price, stock_quantity), ('products',))
+            return report_write(done, f"Product {product_id} updated successfully.")
+        except Exception as e:
+            print(f"Error editing product {product_id}: {e}")
+
+    def delete_product(self, product_id):
+        try:
+            done = self.db_connection.execute_proc('DeleteProduct', (product_id,), ('products',))
+            return report_write(done, f"Product {product_id} deleted successfully.")
+        except Exception as e:
+            print(f"Error deleting product {product_id}: {e}")
+
+    def show_product(self):
+        try:
+            results = self.db_connection.cached_proc('ShowProduct', (), ('products',))
+            return results
+        except Exception as e:
+            print(f"Error showing products: {e}")
+            return []
+
+
+    def show_product_page(self, after_id=None, page_size=50, descending=False):
+        try:
+            return self.db_connection.cached_proc('ShowProductPage', (after_id, page_size, descending), ('products',))
+        except Exception as e:
+            print(f"Error showing product page after {after_id}: {e}")
+            return []
+
+    def search_product(self, product_name, limit=50):
+        try:
+            results = self.db_connection.cached_proc('SearchProduct', (product_name, limit), ('products',))
+            print(f"Search result for product '{product_name}': {results}")
+            return results
+        except Exception as e:
+            print(f"Error searching product '{product_name}': {e}")
+
+    def product_changes_since(self, since=None):
+        # Dòng có IsActive = FALSE là sản phẩm vừa bị xoá mềm
+        return fetch_changes(self.db_connection, 'ProductChangesSince', since)
+
+
+class OrderManager:
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def create_order(self, customer_id, order_date, employee_id):
+        try:
+            done = self.db_connection.execute_proc('CreateOrder', (customer_id, order_date, employee_id), ('orders',))
+            return report_write(done, f"Order for customer {customer_id} created successfully.")
+        except Exception as e:
+            print(f"Error creating order for customer {customer_id}: {e}")
+
+    def place_order(self, customer_id, employee_id, order_date, lines):
+        # lines: danh sách (product_id, quantity); header và toàn bộ chi tiết nằm trong một transaction
+        lines = [(product_id, int(quantity)) for product_id, quantity in lines]
+        if not lines:
+            print(f"Order for customer {customer_id} has no lines.")
+            return None
+        if any(not product_id or quantity <= 0 for product_id, quantity in lines):
+            print(f"Order for customer {customer_id} has an invalid line: {lines}")
+            return None
+        try:
+            with self.db_connection.transaction('place_order') as cursor:
+                result_args = cursor.callproc('CreateOrderReturningId', (customer_id, order_date, employee_id, None))
+                order_id = result_args[3]
+                cursor.executemany(
+                    "INSERT INTO OrderDetails (OrderID, ProductID, Quantity) VALUES (%s, %s, %s)",
+                    [(parse_id(order_id), parse_id(product_id), quantity) for product_id, quantity in lines]
+                )
+                # Kiểm tra và trừ tồn kho một lần cho cả đơn, trong cùng transaction
+                cursor.callproc('ReserveOrderStock', (order_id,))
+            self.db_connection.cache.invalidate('orders', 'order_details', 'products', 'sales')
+            print(f"Order {order_id} placed for customer {customer_id} with {len(lines)} lines.")
+            return order_id
+        except Exception as e:
+            print(f"Error placing order for customer {customer_id}: {e}")
+            return None
+
+    def update_order_status(self, order_id, status):
+        try:
+            done = self.db_connection.execute_proc('UpdateOrderStatus', (order_id, status), ('orders', 'products', 'sales'))
+            return report_write(done, f"Order {order_id} status updated to {status}.")
+        except Exception as e:
+            print(f"Error updating status for order {order_id}: {e}")
+
+    def track_order(self, order_id):
+        try:
+            results = self.db_connection.cached_proc('TrackOrder', (order_id,), ('orders',))
+            print(f"Order {order_id} status: {results}")
+            return results
+        except Exception as e:
+            print(f"Error tracking order {order_id}: {e}")
+
+    def search_order(self, search_term, limit=50, include_archive=False):
+        try:
+            results = self.db_connection.cached_proc(
+                'SearchOrder', (search_term, limit, include_archive), ('orders', 'customers', 'employees')
+            )
+            print(f"Search results for '{search_term}': {results}")
+            return results
+        except Exception as e:
+            print(f"Error searching orders with term '{search_term}': {e}")
+            return []
+
+    def get_all_order_details(self):
+        try:
+            results = self.db_connection.cached_proc('AllOrderDetail', (), ('order_details',))
+            print(f"All order details retrieved: {results}")
+            return results
+        except Exception as e:
+            print(f"Error retrieving all order details: {e}")
+            return []
+
+
+    def get_order_details_page(self, after_id=None, page_size=50, descending=False):
+        try:
+            return self.db_connection.cached_proc('AllOrderDetailPage', (after_id, page_size, descending), ('order_details',))
+        except Exception as e:
+            print(f"Error retrieving order details page after {after_id}: {e}")
+            return []
+
+    def iter_all_order_details(self, chunk_size=1000):
+        query = ("SELECT FormatId('OD', OrderDetailID) AS OrderDetailID, FormatId('O', OrderID) AS OrderID, "
+                 "FormatId('P', ProductID) AS ProductID, Quantity, SalePrice FROM OrderDetails ORDER BY OrderDetails.OrderDetailID")
+        return self.db_connection.stream_query(query, (), chunk_size)
+
+    def order_detail_changes_since(self, since=None):
+        return fetch_changes(self.db_connection, 'OrderDetailChangesSince', since)
+
+class OrderDetailsManager:
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def add_order_details(self, order_id, product_id, quantity):
+        try:
+            done = self.db_connection.execute_proc('AddOrderDetails', (order_id, product_id, quantity), ('order_details', 'products', 'sales'))
+            return report_write(done, f"Order details added for order {order_id}, product {product_id}.")
+        except Exception as e:
+            print(f"Error adding order details for order {order_id}, product {product_id}: {e}")
+
+class InventoryManager:
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def reserve_order_stock(self, order_id):
+        try:
+            self.db_connection.call_proc_out('ReserveOrderStock', (order_id,))
+            self.db_connection.cache.invalidate('products')
+            print(f"Stock reserved for order {order_id}.")
+            return True
+        except Exception as e:
+            print(f"Error reserving stock for order {order_id}: {e}")
+            return False
+
+    def release_order_stock(self, order_id):
+        try:
+            self.db_connection.call_proc_out('ReleaseOrderStock', (order_id,))
+            self.db_connection.cache.invalidate('products')
+            print(f"Stock released for order {order_id}.")
+            return True
+        except Exception as e:
+            print(f"Error releasing stock for order {order_id}: {e}")
+            return False
+
+    def show_stock_movements(self, product_id, limit=100):
+        try:
+            return self.db_connection.cached_proc('ShowStockMovements', (product_id, limit), ('products',))
+        except Exception as e:
+            print(f"Error showing stock movements for product {product_id}: {e}")
+            return []
+
+
+class EmployeeManager:
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def add_employee(self, name, job_title):
+        try:
+            done = self.db_connection.execute_proc('AddEmployee', (name, job_title), ('employees',))
+            return report_write(done, f"Employee {name} added successfully.")
+        except Exception as e:
+            print(f"Error adding employee {name}: {e}")
+
+    def update_employee(self, employee_id, name, job_title):
+        try:
+            done = self.db_connection.execute_proc('UpdateEmployee', (employee_id, name, job_title), ('employees',))
+            return report_write(done, f"Employee {employee_id} updated successfully.")
+        except Exception as e:
+            print(f"Error updating employee {employee_id}: {e}")
+
+    def search_employee(self, employee_name, limit=50):
+        try:
+            results = self.db_connection.cached_proc('SearchEmployee', (employee_name, limit), ('employees',))
+            print(f"Search result for customer '{employee_name}': {results}")
+            return results
+        except Exception as e:
+            print(f"Error searching customer '{employee_name}': {e}")
+
+    def show_employee(self):
+        try:
+            results = self.db_connection.cached_proc('ShowEmployee', (), ('employees',))
+            return results
+        except Exception as e:
+            print(f"Error showing employees: {e}")
+            return []
+
+
+    def show_employee_page(self, after_id=None, page_size=50, descending=False):
+        try:
+            return self.db_connection.cached_proc('ShowEmployeePage', (after_id, page_size, descending), ('employees',))
+        except Exception as e:
+            print(f"Error showing employee page after {after_id}: {e}")
+            return []
+
+    def employee_changes_since(self, since=None):
+        return fetch_changes(self.db_connection, 'EmployeeChangesSince', since)
+
+class ReportManager:
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def get_total_sales_report(self, start_date, end_date, include_archive=False):
+        try:
+            # Truy vấn trực tiếp mà không cần stored procedure
+            params = (start_date, end_date) * (4 if include_archive else 2)
+            return self.db_connection.cached_query(total_sales_query(include_archive), params, ('orders', 'order_details'))
+        except Exception as e:
+            print(f"Error fetching total sales report: {e}")
+            return []
+
+    def get_sales_rollup(self, start_date, end_date, granularity="day", dimension=None):
+        if granularity not in ("day", "week", "month"):
+            raise ValueError(f"Unsupported granularity '{granularity}'.")
+        try:
+            return self.db_connection.cached_proc(
+                'GetSalesRollup', (start_date, end_date, granularity, dimension), ('sales',)
+            )
+        except Exception as e:
+            print(f"Error fetching sales rollup: {e}")
+            return []
+
+    def get_sales_lines_page(self, start_date, end_date, after=None, page_size=100, include_archive=False):
+        # after: (OrderDate, OrderDetailID) của dòng cuối trang trước
+        try:
+            keyset = ""
+            params = [start_date, end_date] * 2
+            if after is not None:
+                keyset = " AND (O.OrderDate > %s OR (O.OrderDate = %s AND OD.OrderDetailID > %s))"
+                params += [after[0], after[0], parse_id(after[1])]
+            params.append(page_size)
+            lines = "(" + SALES_LINES_QUERY.format(orders="Orders", details="OrderDetails", keyset=keyset) + ")"
+            if include_archive:
+                # Mỗi nhánh tự lấy tối đa một trang theo index rồi mới gộp và cắt lại
+                lines += " UNION ALL (" + SALES_LINES_QUERY.format(
+                    orders="OrdersArchive", details="OrderDetailsArchive", keyset=keyset
+                ) + ")"
+                params *= 2
+            query = f'''
+                SELECT OrderID, ProductID, SalePrice, OrderDate, OrderDetailID, Status
+                FROM ({lines}) L
+                ORDER BY OrderDate, LineID LIMIT %s;
+            '''
+            params.append(page_size)
+            return self.db_connection.cached_query(query, tuple(params), ('orders', 'order_details'))
+        except Exception as e:
+            print(f"Error fetching sales lines page: {e}")
+            return []
+
+    def get_sales_by_employee(self):
+        try:
+            query = "SELECT * FROM SalesReportByEmployee;"
+            return self.db_connection.cached_query(query, (), ('sales', 'employees'))
+        except Exception as e:
+            print(f"Error fetching sales by employee: {e}")
+            return []
+
+    def get_sales_by_product(self):
+        try:
+            query = "SELECT * FROM SalesReportByProduct;"
+            return self.db_connection.cached_query(query, (), ('sales', 'products'))
+        except Exception as e:
+            print(f"Error fetching sales by product: {e}")
+            return []
+
+    def get_sales_by_customer(self):
+        try:
+            query = "SELECT * FROM SalesReportByCustomer;"
+            return self.db_connection.cached_query(query, (), ('sales', 'customers'))
+        except Exception as e:
+            print(f"Error fetching sales by customer: {e}")
+            return []
+
+    def get_top_employees(self, top_n):
+        try:
+            return self.db_connection.cached_proc('GetTopEmployees', (top_n,), ('sales', 'employees'))
+        except Exception as e:
+            print(f"Error fetching top employees: {e}")
+            return []
+
+    def get_top_selling_products(self, top_n):
+        try:
+            return self.db_connection.cached_proc('GetTopSellingProducts', (top_n,), ('sales', 'products'))
+        except Exception as e:
+            print(f"Error fetching top selling products: {e}")
+            return []
+
+    def get_top_customers(self, top_n):
+        try:
+            return self.db_connection.cached_proc('GetTopCustomers', (top_n,), ('sales', 'customers'))
+        except Exception as e:
+            print(f"Error fetching top customers: {e}")
+            return []
+
+    def dashboard_snapshot(self, start_date=None, end_date=None, top_n=5):
+        # Một lần gọi SalesDashboard trả về 7 result set, thay cho 7 truy vấn riêng lẻ
+        try:
+            result_sets = self.db_connection.cached_proc(
+                'SalesDashboard', (start_date, end_date, top_n), ('sales', 'employees', 'products', 'customers'),
+                all_results=True
+            )
+            if len(result_sets) != 7:
+                raise Exception(f"SalesDashboard returned {len(result_sets)} result sets, expected 7.")
+            overview = result_sets[0][0]
+            return DashboardSnapshot(
+                start_date, end_date, top_n,
+                overview[0], int(overview[1]), int(overview[2]),
+                *result_sets[1:]
+            )
+        except Exception as e:
+            print(f"Error fetching sales dashboard: {e}")
+            return None
+
+    def rebuild_sales_summaries(self):
+        try:
+            done = self.db_connection.execute_proc('RebuildSalesSummaries', (), ('sales',), defer=False)
+            return report_write(done, "Sales summary tables rebuilt.")
+        except Exception as e:
+            print(f"Error rebuilding sales summaries: {e}")
+
+    def verify_sales_summaries(self):
+        # Không dùng cache: kết quả phải phản ánh dữ liệu hiện tại
+        try:
+            return self.db_connection.fetch_proc('VerifySalesSummaries', ())
+        except Exception as e:
+            print(f"Error verifying sales summaries: {e}")
+            return []
@@ -0,0 +1,408 @@
+import argparse
+import json
+import re
+from collections import namedtuple
+from datetime import date
+
+import datagen
+from benchmark import sample_values
+from database import add_connection_arguments, connect_from_args
+from export import EXPORTS
+from managers import OrderManager, ReportManager
+
+SCHEMA_SCRIPT = "Advanced Database.sql"
+ANALYZED_TABLES = ("Customers", "Products", "Employees", "Orders", "OrderDetails", "OrdersArchive", "OrderDetailsArchive",
+                   "EmployeeSalesSummary", "CustomerSalesSummary", "ProductSalesSummary", "DailySales", "StockMovements")
+
+# Một câu lệnh cần EXPLAIN: tên (Thủ_tục#thứ_tự, Manager.method hoặc export:tên), SQL dùng %s và tham số
+PlanCase = namedtuple("PlanCase", ["name", "query", "params"])
+
+STATEMENT_START = re.compile(r"^\s*(SELECT|UPDATE|DELETE|INSERT|CREATE\s+TEMPORARY\s+TABLE)\b", re.IGNORECASE | re.MULTILINE)
+TABLE_ALIAS = re.compile(
+    r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|LEFT\b|INNER\b|SET\b|GROUP\b|ORDER\b|LIMIT\b|UNION\b|HAVING\b|VALUES\b)(\w+))?",
+    re.IGNORECASE
+)
+
+
+def split_script(text):
+    # Tách file SQL theo DELIMITER giống mysql client
+    delimiter = ";"
+    statement = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split()[1]
+            continue
+        statement.append(line)
+        if stripped.endswith(delimiter):
+            text = "\n".join(statement).rstrip()
+            yield text[:-len(delimiter)].strip()
+            statement = []
+
+
+def strip_comments(sql):
+    return "\n".join(line.split("--", 1)[0] for line in sql.splitlines())
+
+
+def sample_param(name, values):
+    # Giá trị mẫu theo tên tham số; KeyError nghĩa là không đoán được, câu lệnh được báo là lỗi.
+    # Tham số của lệnh ghi chỉ cần đúng kiểu vì EXPLAIN không thực thi câu lệnh
+    name = name.lower()
+    if name in ("p_customername", "p_searchterm"):
+        return values["customer_term"]
+    if name == "p_productname":
+        return values["product_term"]
+    if name == "p_employeename":
+        return values["employee_term"]
+    if name in ("p_limit", "p_pagesize"):
+        return 50
+    if name in ("top_n", "p_topn"):
+        return 10
+    if name == "p_afterid":
+        return None
+    if name == "p_descending":
+        return False
+    # Bật nhánh lưu trữ để plan của bảng archive cũng được kiểm tra
+    if name == "p_includearchive":
+        return True
+    if name == "p_startdate":
+        return values["start_date"]
+    if name == "p_enddate":
+        return values["end_date"]
+    if name == "p_granularity":
+        return "week"
+    if name == "p_dimension":
+        return "product"
+    if name in ("p_address", "p_phone", "p_jobtitle"):
+        return "plan check"
+    if name in ("p_price", "p_stockquantity", "p_quantity"):
+        return 1
+    if name == "p_status":
+        return "Shipped"
+    if name == "p_since":
+        return values["start_date"]
+    if name == "p_year":
+        return values["end_date"].year - 1
+    for key in ("customer_id", "product_id", "employee_id", "order_id"):
+        if name == "p_" + key.replace("_", ""):
+            return values[key]
+    raise KeyError(name)
+
+
+def procedure_cases(script, values):
+    # Lấy câu lệnh trực tiếp từ thân thủ tục nên suite luôn khớp với file SQL đang được nạp.
+    # Câu lệnh dùng biến cục bộ, biến @ hoặc bảng tạm không EXPLAIN được từ ngoài và bị bỏ qua.
+    # Tham số chưa có giá trị mẫu được trả về trong unsampled để thủ tục mới không lọt khỏi kiểm tra
+    cases, unsampled = [], []
+    with open(script, encoding="utf-8") as f:
+        statements = list(split_script(f.read()))
+    for statement in statements:
+        lines = [line for line in strip_comments(statement).splitlines() if line.strip()]
+        header = re.match(r"CREATE\s+PROCEDURE\s+(\w+)\s*\((.*)\)\s*$", lines[0].strip(), re.IGNORECASE) if lines else None
+        if not header:
+            continue
+        name = header.group(1)
+        params = re.findall(r"\b(?:IN|OUT|INOUT)\s+(\w+)", header.group(2), re.IGNORECASE)
+        body = "\n".join(lines[1:])
+        local_names = re.findall(r"\bDECLARE\s+(\w+)", body, re.IGNORECASE)
+        temp_tables = re.findall(r"CREATE\s+TEMPORARY\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", body, re.IGNORECASE)
+        index = 0
+        for piece in body.split(";"):
+            start = STATEMENT_START.search(piece)
+            if not start:
+                continue
+            sql = piece[start.start():].strip()
+            if start.group(1).upper().startswith("CREATE"):
+                select = re.search(r"\bAS\s+(SELECT\b.*)", sql, re.IGNORECASE | re.DOTALL)
+                if not select:
+                    continue
+                sql = select.group(1)
+            if start.group(1).upper() == "INSERT" and not re.search(r"\bSELECT\b", sql, re.IGNORECASE):
+                continue
+            if start.group(1).upper() == "SELECT" and re.search(r"\bINTO\b", sql, re.IGNORECASE):
+                continue
+            index += 1
+            if "@" in sql or any(re.search(rf"\b{re.escape(local)}\b", sql) for local in local_names + temp_tables):
+                continue
+            # % trong LIKE phải được escape trước khi thay tham số bằng %s
+            sql = sql.replace("%", "%%")
+            used = []
+
+            def substitute(match):
+                used.append(sample_param(match.group(1), values))
+                return "%s"
+
+            try:
+                if params:
+                    sql = re.sub(r"\b(" + "|".join(map(re.escape, params)) + r")\b", substitute, sql)
+            except KeyError as e:
+                unsampled.append((f"{name}#{index}", f"no sample value for parameter {e}, add it to sample_param"))
+                continue
+            cases.append(PlanCase(f"{name}#{index}", sql, tuple(used)))
+    return cases, unsampled
+
+
+class QueryRecorder:
+    # Thay cho DatabaseConnection khi gọi các method của manager: chỉ ghi lại SQL và tham số sẽ được gửi
+    def __init__(self):
+        self.queries = []
+
+    def cached_query(self, query, params, tags=()):
+        self.queries.append((query, tuple(params)))
+        return []
+
+    def fetch_query(self, query, params=(), readonly=True, fresh=False):
+        return self.cached_query(query, params)
+
+    def stream_batches(self, query, params=(), chunk_size=1000, readonly=True):
+        self.cached_query(query, params)
+        return iter(())
+
+    def stream_query(self, query, params=(), chunk_size=1000, readonly=True):
+        return self.stream_batches(query, params, chunk_size)
+
+    def cached_proc(self, proc_name, params, tags, all_results=False):
+        return []
+
+
+def manager_cases(values):
+    recorder = QueryRecorder()
+    reports = ReportManager(recorder)
+    orders = OrderManager(recorder)
+    start, end = values["start_date"], values["end_date"]
+    calls = [
+        ("ReportManager.get_total_sales_report", lambda: reports.get_total_sales_report(start, end)),
+        ("ReportManager.get_total_sales_report[archive]", lambda: reports.get_total_sales_report(start, end, True)),
+        ("ReportManager.get_sales_lines_page", lambda: reports.get_sales_lines_page(start, end)),
+        ("ReportManager.get_sales_lines_page[after]", lambda: reports.get_sales_lines_page(start, end, (start, 1))),
+        ("ReportManager.get_sales_lines_page[archive]", lambda: reports.get_sales_lines_page(start, end, None, 100, True)),
+        ("ReportManager.get_sales_by_employee", reports.get_sales_by_employee),
+        ("ReportManager.get_sales_by_product", reports.get_sales_by_product),
+        ("ReportManager.get_sales_by_customer", reports.get_sales_by_customer),
+        ("OrderManager.iter_all_order_details", lambda: list(orders.iter_all_order_details()))
+    ]
+    cases = []
+    for name, func in calls:
+        recorder.queries.clear()
+        func()
+        for index, (query, params) in enumerate(recorder.queries):
+            cases.append(PlanCase(name if index == 0 else f"{name}#{index + 1}", query, params))
+    return cases
+
+
+def export_cases(values):
+    return [
+        PlanCase(f"export:{name}", spec.source, tuple(values[param] for param in spec.params))
+        for name, spec in EXPORTS.items()
+        if spec.kind == "query"
+    ]
+
+
+def table_aliases(query):
+    # Alias dùng cho nhiều bảng (O cho cả Orders và OrdersArchive) được giữ nguyên tên alias
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(query):
+        aliases.setdefault(table, set()).add(table)
+        if alias:
+            aliases.setdefault(alias, set()).add(table)
+    return {alias: tables.pop() if len(tables) == 1 else alias for alias, tables in aliases.items()}
+
+
+def walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from walk(value)
+
+
+def summarize(plan, query, min_rows):
+    # full_scans: bảng bị quét toàn bộ (access_type ALL) với ít nhất min_rows dòng ước lượng
+    aliases = table_aliases(query)
+    tables = {table for table, _ in TABLE_ALIAS.findall(query)}
+    full_scans, keys, lookups = set(), set(), []
+    filesort = temporary = False
+    for node in walk(plan):
+        filesort = filesort or node.get("using_filesort") is True
+        temporary = temporary or node.get("using_temporary_table") is True
+        if "table_name" not in node or "access_type" not in node:
+            continue
+        alias = node["table_name"]
+        if alias.startswith("<"):
+            # Bảng dẫn xuất / kết quả UNION, không phải bảng thật
+            continue
+        table = aliases.get(alias, alias)
+        rows = int(node.get("rows_examined_per_scan", 0))
+        if node.get("key"):
+            keys.add(f"{table}.{node['key']}")
+        if node["access_type"] == "ALL" and rows >= min_rows:
+            full_scans.add(table)
+        # Chỉ gợi ý index cho bảng thật xác định được (view và alias dùng chung được bỏ qua)
+        if table in tables:
+            lookups.append((table, node, rows))
+    cost = float(plan.get("query_block", {}).get("cost_info", {}).get("query_cost", 0) or 0)
+    summary = {
+        "full_scans": sorted(full_scans),
+        "filesort": filesort,
+        "temporary": temporary,
+        "keys": sorted(keys),
+        "cost": round(cost, 2)
+    }
+    return summary, lookups
+
+
+def primary_key_columns(db, table, cache):
+    if table not in cache:
+        rows = db.fetch_query(
+            "SELECT COLUMN_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = 'PRIMARY' ORDER BY SEQ_IN_INDEX",
+            (table,)
+        )
+        cache[table] = [row[0] for row in rows]
+    return cache[table]
+
+
+def suggest_index(db, table, node, pk_cache, max_columns=4):
+    # Gợi ý index phủ: cột của key đang dùng, rồi cột trong điều kiện lọc, rồi các cột còn lại được đọc.
+    # InnoDB tự thêm khoá chính vào index phụ nên không cần liệt kê lại
+    if node.get("using_index"):
+        return None
+    used = node.get("used_columns") or []
+    if not used:
+        return None
+    primary = primary_key_columns(db, table, pk_cache)
+    condition = node.get("attached_condition", "")
+    columns = list(node.get("used_key_parts") or []) if node.get("key") != "PRIMARY" else []
+    columns += [column for column in used if f"`{column}`" in condition]
+    columns += used
+    ordered = []
+    for column in columns:
+        if column not in ordered and (column not in primary or column in (node.get("used_key_parts") or [])):
+            ordered.append(column)
+    if not ordered or len(ordered) > max_columns:
+        return None
+    return f"CREATE INDEX idx_{table.lower()}_{'_'.join(column.lower() for column in ordered)} ON {table}({', '.join(ordered)});"
+
+
+def explain(db, case):
+    rows = db.fetch_query("EXPLAIN FORMAT=JSON " + case.query.strip().rstrip(";"), case.params)
+    return json.loads(rows[0][0])
+
+
+def check(db, cases, baseline, min_rows, cost_threshold):
+    results, regressions, suggestions = {}, [], {}
+    pk_cache = {}
+    for case in cases:
+        try:
+            plan = explain(db, case)
+        except Exception as e:
+            print(f"ERROR       {case.name}: {e}")
+            regressions.append((case.name, f"EXPLAIN failed: {e}"))
+            continue
+        summary, lookups = summarize(plan, case.query, min_rows)
+        results[case.name] = summary
+        for table, node, rows in lookups:
+            if rows >= min_rows:
+                suggestion = suggest_index(db, table, node, pk_cache)
+                if suggestion:
+                    suggestions.setdefault(suggestion, []).append(case.name)
+
+        previous = baseline.get(case.name)
+        problems = []
+        if previous is None:
+            status = "NEW"
+        else:
+            problems += [f"new full scan of {table}" for table in summary["full_scans"] if table not in previous["full_scans"]]
+            if summary["filesort"] and not previous["filesort"]:
+                problems.append("new filesort")
+            if summary["temporary"] and not previous["temporary"]:
+                problems.append("new temporary table")
+            problems += [f"no longer uses {key}" for key in previous["keys"] if key not in summary["keys"]]
+            if previous["cost"] > 0 and summary["cost"] > previous["cost"] * cost_threshold:
+                problems.append(f"cost {previous['cost']} -> {summary['cost']}")
+            status = "REGRESSION" if problems else "ok"
+        regressions += [(case.name, problem) for problem in problems]
+        flags = ", ".join(
+            [f"full scan {table}" for table in summary["full_scans"]]
+            + (["filesort"] if summary["filesort"] else []) + (["temporary"] if summary["temporary"] else [])
+        ) or "-"
+        print(f"{status:11s} {case.name:55s} cost {summary['cost']:>12}  {flags}")
+        for problem in problems:
+            print(f"            - {problem}")
+    missing = sorted(set(baseline) - set(results))
+    for name in missing:
+        print(f"MISSING     {name} is in the baseline but was not checked")
+    return results, regressions, suggestions
+
+
+def load_dataset(args):
+    datagen.load_schema(args)
+    loader = connect_from_args(args, pool_size=2, cache_size=0)
+    datagen.generate(loader, args.scale, args.seed)
+    # Thống kê mới để plan ổn định giữa các lần chạy
+    loader.fetch_query("ANALYZE TABLE " + ", ".join(ANALYZED_TABLES), readonly=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN every stored procedure statement, report query and export against a scaled dataset "
+                    "and compare the plans with a checked-in baseline."
+    )
+    add_connection_arguments(parser)
+    parser.add_argument("--scale", type=float, default=10.0, help="Scale factor of the generated dataset")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-load", action="store_true", help="Check the current database without reloading it")
+    parser.add_argument("--baseline", default="plan_baseline.json")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the current plans as the new baseline")
+    parser.add_argument("--min-rows", type=int, default=1000, help="Full scans of fewer estimated rows are ignored")
+    parser.add_argument("--cost-threshold", type=float, default=2.0, help="Relative query cost increase reported as a regression")
+    parser.add_argument("--only", help="Only check cases whose name contains this text")
+    args = parser.parse_args()
+
+    if not args.no_load:
+        load_dataset(args)
+    # Luôn EXPLAIN trên primary: replica có thể có thống kê khác
+    db = connect_from_args(args, pool_size=1, cache_size=0, replicas=())
+    values = sample_values(db)
+    cases, unsampled = procedure_cases(SCHEMA_SCRIPT, values)
+    cases += manager_cases(values) + export_cases(values)
+    if args.only:
+        cases = [case for case in cases if args.only in case.name]
+        unsampled = [(name, problem) for name, problem in unsampled if args.only in name]
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["plans"]
+    except FileNotFoundError:
+        # Lần chạy đầu: ghi baseline từ plan hiện tại rồi thoát 0, commit file này để các lần sau có gì để so
+        print(f"No baseline at {args.baseline}; writing the current plans as the baseline.")
+        args.update_baseline = True
+        baseline = {}
+    results, regressions, suggestions = check(db, cases, baseline, args.min_rows, args.cost_threshold)
+    for name, problem in unsampled:
+        print(f"UNCHECKED   {name}: {problem}")
+
+    if suggestions:
+        print("\nCandidate covering indexes:")
+        for statement, names in sorted(suggestions.items()):
+            print(f"  {statement}  -- {', '.join(sorted(set(names)))}")
+
+    if args.update_baseline:
+        plans = dict(baseline) if args.only else {}
+        plans.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"scale": args.scale, "updated": date.today().isoformat(), "plans": plans}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote {len(plans)} plans to {args.baseline}.")
+    elif regressions:
+        print(f"\n{len(regressions)} plan regressions.")
+    if unsampled:
+        print(f"{len(unsampled)} procedure statements could not be checked.")
+    if unsampled or (regressions and not args.update_baseline):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+import argparse
+import asyncio
+import decimal
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from aiohttp import web
+
+from database import add_connection_arguments, connect_from_args, current_session
+from export import EXPORTS
+from instrumentation import current_source
+from managers import CustomerManager, ProductManager, OrderManager, OrderDetailsManager, EmployeeManager, ReportManager
+
+
+def json_default(value):
+    # Giữ nguyên độ chính xác của tiền tệ: DECIMAL được trả về dạng chuỗi
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    return json.dumps(value, default=json_default, ensure_ascii=False)
+
+
+def rows_to_json(rows):
+    columns = getattr(rows, "columns", None)
+    if not columns:
+        return [list(row) for row in rows or []]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def json_response(value, status=200):
+    return web.Response(text=dumps(value), status=status, content_type="application/json")
+
+
+def bad_request(message):
+    return web.HTTPBadRequest(text=dumps({"error": message}), content_type="application/json")
+
+
+def query_value(request, name, parse=str, default=None, required=False):
+    raw = request.query.get(name)
+    if raw in (None, ""):
+        if required:
+            raise bad_request(f"Missing query parameter '{name}'.")
+        return default
+    try:
+        return parse(raw)
+    except ValueError:
+        raise bad_request(f"Invalid value for '{name}': {raw}")
+
+
+def parse_bool(raw):
+    if raw.lower() in ("1", "true", "yes"):
+        return True
+    if raw.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(raw)
+
+
+async def json_body(request, *fields):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise bad_request("Request body must be a JSON object.")
+    if not isinstance(body, dict):
+        raise bad_request("Request body must be a JSON object.")
+    missing = [field for field in fields if body.get(field) in (None, "")]
+    if missing:
+        raise bad_request(f"Missing fields: {', '.join(missing)}")
+    return body
+
+
+async def call(request, func, *args):
+    # Phạm vi driver async: chỉ export dạng query đi qua aiomysql (stream_export). Mọi request khác dùng
+    # managers trên connector đồng bộ, chạy trong thread pool cùng kích thước với pool connection, để giữ
+    # chung cache, write-behind, prepared statement và định tuyến replica với giao diện Streamlit.
+    # Số request đồng thời vì vậy bị giới hạn bởi số thread, không phải số coroutine.
+    # to_thread chép contextvars nên phiên (đọc lại dữ liệu vừa ghi) và nguồn gọi trong instrumentation vẫn đúng
+    current_session.set(request.headers.get("X-Session-Id"))
+    current_source.set(f"api {request.method} {request.match_info.route.resource.canonical}")
+    return await asyncio.to_thread(func, *args)
+
+
+def wait_arg(request):
+    # Đọc trước khi gọi manager: tham số sai phải trả 400 trước khi lệnh ghi được gửi đi
+    return query_value(request, "wait", parse_bool, True)
+
+
+async def write_result(done, wait, **extra):
+    # done là Future của execute_proc; ?wait=false trả về ngay khi lệnh ghi đã được nhận (chế độ write-behind)
+    if done is None:
+        return json_response({"error": "Write was not accepted, see server log."}, status=500)
+    if not wait:
+        return json_response({"status": "accepted", **extra}, status=202)
+    try:
+        await asyncio.wrap_future(done)
+    except Exception as e:
+        return json_response({"error": str(e)}, status=422)
+    return json_response({"status": "committed", **extra})
+
+
+async def health(request):
+    db = request.app["db"]
+    pending = db.write_queue.pending() if db.write_queue is not None else 0
+    return json_response({"status": "ok", "pending_writes": pending, "cache": db.cache.stats()})
+
+
+async def metrics(request):
+    return web.Response(text=request.app["db"].instrumentation.to_prometheus(), content_type="text/plain")
+
+
+def page_args(request):
+    return (
+        query_value(request, "after"),
+        query_value(request, "page_size", int, 50),
+        query_value(request, "descending", parse_bool, False)
+    )
+
+
+# ---- Customers ----
+async def list_customers(request):
+    return json_response(rows_to_json(await call(request, request.app["customers"].show_customer_page, *page_args(request))))
+
+
+async def search_customers(request):
+    results = await call(request, request.app["customers"].search_customer,
+                         query_value(request, "q", required=True), query_value(request, "limit", int, 50))
+    return json_response(rows_to_json(results))
+
+
+async def create_customer(request):
+    wait = wait_arg(request)
+    body = await json_body(request, "name", "address", "phone")
+    done = await call(request, request.app["customers"].register_customer, body["name"], body["address"], body["phone"])
+    return await write_result(done, wait)
+
+
+async def update_customer(request):
+    wait = wait_arg(request)
+    body = await json_body(request, "name", "address", "phone")
+    done = await call(request, request.app["customers"].update_customer,
+                      request.match_info["id"], body["name"], body["address"], body["phone"])
+    return await write_result(done, wait)
+
+
+# ---- Products ----
+async def list_products(request):
+    return json_response(rows_to_json(await call(request, request.app["products"].show_product_page, *page_args(request))))
+
+
+async def search_products(request):
+    results = await call(request, request.app["products"].search_product,
+                         query_value(request, "q", required=True), query_value(request, "limit", int, 50))
+    return json_response(rows_to_json(results))
+
+
+async def create_product(request):
+    wait = wait_arg(request)
+    body = await json_body(request, "name", "price", "stock_quantity")
+    done = await call(request, request.app["products"].add_product, body["name"], body["price"], body["stock_quantity"])
+    return await write_result(done, wait)
+
+
+async def update_product(request):
+    wait = wait_arg(request)
+    body = await json_body(request, "name", "price", "stock_quantity")
+    done = await call(request, request.app["products"].edit_product,
+                      request.match_info["id"], body["name"], body["price"], body["stock_quantity"])
+    return await write_result(done, wait)
+
+
+async def delete_product(request):
+    wait = wait_arg(request)
+    done = await call(request, request.app["products"].delete_product, request.match_info["id"])
+    return await write_result(done, wait)
+
+
+# ---- Employees ----
+async def list_employees(request):
+    return json_response(rows_to_json(await call(request, request.app["employees"].show_employee_page, *page_args(request))))
+
+
+async def search_employees(request):
+    results = await call(request, request.app["employees"].search_employee,
+                         query_value(request, "q", required=True), query_value(request, "limit", int, 50))
+    return json_response(rows_to_json(results))
+
+
+async def create_employee(request):
+    wait = wait_arg(request)
+    body = await json_body(request, "name", "job_title")
+    done = await call(request, request.app["employees"].add_employee, body["name"], body["job_title"])
+    return await write_result(done, wait)
+
+
+async def update_employee(request):
+    wait = wait_arg(request)
+    body = await json_body(request, "name", "job_title")
+    done = await call(request, request.app["employees"].update_employee,
+                      request.match_info["id"], body["name"], body["job_title"])
+    return await write_result(done, wait)
+
+
+# ---- Orders ----
+async def search_orders(request):
+    results = await call(request, request.app["orders"].search_order,
+                         query_value(request, "q", required=True), query_value(request, "limit", int, 50),
+                         query_value(request, "include_archive", parse_bool, False))
+    return json_response(rows_to_json(results))
+
+
+async def get_order(request):
+    results = await call(request, request.app["orders"].track_order, request.match_info["id"])
+    if not results:
+        raise web.HTTPNotFound(text=dumps({"error": "Order not found."}), content_type="application/json")
+    return json_response(rows_to_json(results))
+
+
+async def list_order_details(request):
+    return json_response(rows_to_json(await call(request, request.app["orders"].get_order_details_page, *page_args(request))))
+
+
+async def place_order(request):
+    # lines: [{"product_id": "P001", "quantity": 2}, ...]; header và chi tiết được ghi trong một transaction
+    body = await json_body(request, "customer_id", "employee_id", "lines")
+    try:
+        order_date = date.fromisoformat(body["order_date"]) if body.get("order_date") else date.today()
+        lines = [(line["product_id"], int(line["quantity"])) for line in body["lines"]]
+    except (KeyError, TypeError, ValueError) as e:
+        raise bad_request(f"Invalid order: {e}")
+    order_id = await call(request, request.app["orders"].place_order, body["customer_id"], body["employee_id"], order_date, lines)
+    if order_id is None:
+        return json_response({"error": "Order was not placed, see server log."}, status=422)
+    return json_response({"status": "committed", "order_id": order_id}, status=201)
+
+
+async def update_order_status(request):
+    wait = wait_arg(request)
+    body = await json_body(request, "status")
+    done = await call(request, request.app["orders"].update_order_status, request.match_info["id"], body["status"])
+    return await write_result(done, wait)
+
+
+async def add_order_details(request):
+    wait = wait_arg(request)
+    body = await json_body(request, "product_id", "quantity")
+    done = await call(request, request.app["order_details"].add_order_details,
+                      request.match_info["id"], body["product_id"], body["quantity"])
+    return await write_result(done, wait)
+
+
+# ---- Reports ----
+def date_range(request):
+    return (
+        query_value(request, "start_date", date.fromisoformat, required=True),
+        query_value(request, "end_date", date.fromisoformat, required=True)
+    )
+
+
+async def total_sales(request):
+    results = await call(request, request.app["reports"].get_total_sales_report,
+                         *date_range(request), query_value(request, "include_archive", parse_bool, False))
+    return json_response(rows_to_json(results))
+
+
+async def sales_lines(request):
+    # after_date + after_id: khoá của dòng cuối trang trước
+    after_date = query_value(request, "after_date", date.fromisoformat)
+    after = (after_date, query_value(request, "after_id", required=True)) if after_date else None
+    results = await call(request, request.app["reports"].get_sales_lines_page, *date_range(request), after,
+                         query_value(request, "page_size", int, 100), query_value(request, "include_archive", parse_bool, False))
+    return json_response(rows_to_json(results))
+
+
+async def sales_rollup(request):
+    granularity = query_value(request, "granularity", default="day")
+    if granularity not in ("day", "week", "month"):
+        raise bad_request(f"Unsupported granularity '{granularity}'.")
+    results = await call(request, request.app["reports"].get_sales_rollup,
+                         *date_range(request), granularity, query_value(request, "dimension"))
+    return json_response(rows_to_json(results))
+
+
+async def dashboard(request):
+    snapshot = await call(request, request.app["reports"].dashboard_snapshot,
+                          query_value(request, "start_date", date.fromisoformat),
+                          query_value(request, "end_date", date.fromisoformat),
+                          query_value(request, "top_n", int, 5))
+    if snapshot is None:
+        return json_response({"error": "Dashboard is not available, see server log."}, status=500)
+    return json_response({
+        field: rows_to_json(value) if isinstance(value, list) else value
+        for field, value in snapshot._asdict().items()
+    })
+
+
+TOP_REPORTS = {
+    "employees": "get_top_employees",
+    "products": "get_top_selling_products",
+    "customers": "get_top_customers"
+}
+
+
+async def top(request):
+    method = TOP_REPORTS.get(request.match_info["kind"])
+    if method is None:
+        raise web.HTTPNotFound(text=dumps({"error": "Unknown report."}), content_type="application/json")
+    results = await call(request, getattr(request.app["reports"], method), query_value(request, "n", int, 10))
+    return json_response(rows_to_json(results))
+
+
+# ---- Streaming ----
+async def export_rows(request):
+    # NDJSON: dòng đầu là danh sách cột, mỗi dòng sau là một bản ghi. Dữ liệu được gửi theo từng lô
+    # nên bộ nhớ không phụ thuộc kích thước báo cáo
+    name = request.match_info["name"]
+    spec = EXPORTS.get(name)
+    if spec is None:
+        raise web.HTTPNotFound(text=dumps({"error": f"Unknown export '{name}'."}), content_type="application/json")
+    values = {
+        "start_date": query_value(request, "start_date", date.fromisoformat),
+        "end_date": query_value(request, "end_date", date.fromisoformat),
+        "granularity": query_value(request, "granularity", default="day"),
+        "dimension": query_value(request, "dimension"),
+        "top_n": query_value(request, "top_n", int, 10)
+    }
+    missing = [param for param in dict.fromkeys(spec.params) if values[param] is None]
+    if missing:
+        raise bad_request(f"Export '{name}' needs {', '.join(missing)}.")
+    params = tuple(values[param] for param in spec.params)
+    chunk_size = query_value(request, "chunk_size", int, 1000)
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    async for columns, rows in stream_export(request, spec, params, chunk_size):
+        if columns is not None:
+            await response.write((dumps(columns) + "\n").encode())
+        if rows:
+            await response.write("".join(dumps(list(row)) + "\n" for row in rows).encode())
+    await response.write_eof()
+    return response
+
+
+async def aio_pool_for(app, server):
+    # Mỗi server (primary, từng replica) một pool aiomysql, tạo khi được dùng lần đầu
+    import aiomysql
+
+    pools = app["aio_pools"]
+    async with app["aio_pools_lock"]:
+        if server.name not in pools:
+            config = server.config
+            pools[server.name] = await aiomysql.create_pool(
+                host=config["host"], port=config.get("port", 3306), user=config["user"], password=config["password"],
+                db=config["database"], minsize=1, maxsize=app["stream_pool_size"], autocommit=True
+            )
+    return pools[server.name]
+
+
+async def stream_export(request, spec, params, chunk_size):
+    db = request.app["db"]
+    if spec.kind == "query" and request.app["aio_pools"] is not None:
+        # Cursor không buffer của driver async: chờ mạng không giữ thread nào.
+        # Export là lệnh đọc nặng nhất nên cũng đi tới replica khoẻ như các lệnh đọc khác
+        import aiomysql
+
+        server = await call(request, db.read_server)
+        aio_pool = await aio_pool_for(request.app, server)
+        async with aio_pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSCursor) as cursor:
+                await cursor.execute(spec.source, params)
+                yield [column[0] for column in cursor.description], None
+                while True:
+                    rows = await cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield None, rows
+        return
+    if spec.kind == "proc":
+        results = await call(request, db.fetch_proc, spec.source, params)
+        yield getattr(results, "columns", []), results
+        return
+    # Không có aiomysql: duyệt stream_batches trong thread pool, mỗi lần lấy một lô
+    batches = db.stream_batches(spec.source, params, chunk_size)
+    try:
+        first = True
+        while True:
+            batch = await call(request, next, batches, None)
+            if batch is None:
+                break
+            yield (batch.columns if first else None), batch
+            first = False
+    finally:
+        await asyncio.to_thread(batches.close)
+
+
+# ---- App ----
+@web.middleware
+async def limit_concurrency(request, handler):
+    # Tối đa max_concurrency request được xử lý cùng lúc; request chờ quá queue_timeout nhận 503
+    slots = request.app["slots"]
+    try:
+        await asyncio.wait_for(slots.acquire(), request.app["queue_timeout"])
+    except asyncio.TimeoutError:
+        return json_response({"error": "Server is busy, try again later."}, status=503)
+    try:
+        return await handler(request)
+    finally:
+        slots.release()
+
+
+async def aio_pool_context(app):
+    # aiomysql là tuỳ chọn; không có thì export chạy qua connector đồng bộ trong thread pool
+    try:
+        import aiomysql
+    except ImportError:
+        print("aiomysql is not installed, streaming exports use the synchronous connector.")
+        app["aio_pools"] = None
+        yield
+        return
+    app["aio_pools"] = {}
+    app["aio_pools_lock"] = asyncio.Lock()
+    yield
+    for pool in app["aio_pools"].values():
+        pool.close()
+        await pool.wait_closed()
+
+
+async def executor_context(app):
+    # Thread pool mặc định của event loop (asyncio.to_thread) có cùng kích thước với pool connection
+    executor = ThreadPoolExecutor(max_workers=app["threads"], thread_name_prefix="api")
+    asyncio.get_running_loop().set_default_executor(executor)
+    yield
+    executor.shutdown(wait=True)
+    # Ghi nốt hàng đợi write-behind trước khi dừng
+    app["db"].close()
+
+
+def create_app(db, max_concurrency=256, queue_timeout=5, threads=None, stream_pool_size=4):
+    app = web.Application(middlewares=[limit_concurrency])
+    app["db"] = db
+    app["customers"] = CustomerManager(db)
+    app["products"] = ProductManager(db)
+    app["employees"] = EmployeeManager(db)
+    app["orders"] = OrderManager(db)
+    app["order_details"] = OrderDetailsManager(db)
+    app["reports"] = ReportManager(db)
+    app["slots"] = asyncio.Semaphore(max_concurrency)
+    app["queue_timeout"] = queue_timeout
+    app["threads"] = threads or db.pool_size * (1 + len(db.replicas))
+    app["stream_pool_size"] = stream_pool_size
+    app.cleanup_ctx.append(executor_context)
+    app.cleanup_ctx.append(aio_pool_context)
+    app.add_routes([
+        web.get("/health", health),
+        web.get("/metrics", metrics),
+        web.get("/customers", list_customers),
+        web.get("/customers/search", search_customers),
+        web.post("/customers", create_customer),
+        web.put("/customers/{id}", update_customer),
+        web.get("/products", list_products),
+        web.get("/products/search", search_products),
+        web.post("/products", create_product),
+        web.put("/products/{id}", update_product),
+        web.delete("/products/{id}", delete_product),
+        web.get("/employees", list_employees),
+        web.get("/employees/search", search_employees),
+        web.post("/employees", create_employee),
+        web.put("/employees/{id}", update_employee),
+        web.get("/orders/search", search_orders),
+        web.get("/orders/details", list_order_details),
+        web.post("/orders", place_order),
+        web.get("/orders/{id}", get_order),
+        web.put("/orders/{id}/status", update_order_status),
+        web.post("/orders/{id}/details", add_order_details),
+        web.get("/reports/total-sales", total_sales),
+        web.get("/reports/sales-lines", sales_lines),
+        web.get("/reports/rollup", sales_rollup),
+        web.get("/reports/dashboard", dashboard),
+        web.get("/reports/top/{kind}", top),
+        web.get("/export/{name}", export_rows)
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="HTTP/JSON API over the manager classes for POS terminals and batch jobs. "
+                    "Requests run the synchronous managers in a thread pool; only streaming exports use aiomysql."
+    )
+    add_connection_arguments(parser)
+    parser.add_argument("--listen", default="127.0.0.1", help="Address the API listens on")
+    parser.add_argument("--listen-port", type=int, default=8080)
+    parser.add_argument("--pool-size", type=int, default=16,
+                        help="Connections per server in the synchronous pool, also the number of request threads")
+    parser.add_argument("--max-concurrency", type=int, default=256, help="Requests handled at the same time")
+    parser.add_argument("--queue-timeout", type=float, default=5, help="Seconds a request may wait for a slot before 503")
+    parser.add_argument("--stream-pool-size", type=int, default=4, help="aiomysql connections used for streaming exports")
+    args = parser.parse_args()
+
+    db = connect_from_args(args, pool_size=args.pool_size)
+    app = create_app(db, args.max_concurrency, args.queue_timeout, stream_pool_size=args.stream_pool_size)
+    web.run_app(app, host=args.listen, port=args.listen_port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
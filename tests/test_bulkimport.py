@@ -0,0 +1,62 @@
+import io
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("mysql.connector")
+
+from bulkimport import IMPORTS, import_file, read_chunks, validate
+
+
+class RecordingCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def executemany(self, query, rows):
+        self.rows.extend(rows)
+
+
+class RecordingCache:
+    def __init__(self):
+        self.invalidated = []
+
+    def invalidate(self, *tags):
+        self.invalidated.extend(tags)
+
+
+class RecordingDatabase:
+    def __init__(self):
+        self.rows = []
+        self.cache = RecordingCache()
+
+    @contextmanager
+    def transaction(self, label="transaction"):
+        yield RecordingCursor(self.rows)
+
+
+CUSTOMERS = (
+    "CustomerName,Address,Phone\n"
+    "An,Hanoi,0912345678\n"
+    ",Hanoi,0912345678\n"
+    "Binh,HCMC,\n"
+    "Chi,Hue,09123456789\n"
+    "Dung,Da Nang,+84 912\n"
+)
+
+
+def test_validate_reports_file_rows():
+    chunk = next(read_chunks(io.StringIO(CUSTOMERS), 100))
+    valid, errors = validate(chunk, IMPORTS["customers"])
+    assert list(valid["CustomerName"]) == ["An", "Binh", "Dung"]
+    assert [(error["row"], error["column"]) for error in errors] == [(3, "CustomerName"), (5, "Phone")]
+
+
+def test_import_file_row_numbers_across_chunks():
+    db = RecordingDatabase()
+    result = import_file(db, "customers", io.StringIO(CUSTOMERS), batch_size=1, chunk_size=2)
+    assert result.loaded == 3
+    assert [row[0] for row in db.rows] == ["An", "Binh", "Dung"]
+    # Dòng 3 nằm ở chunk đầu, dòng 5 ở chunk thứ hai
+    assert [error["row"] for error in result.errors] == [3, 5]
+    assert db.cache.invalidated == ["customers"]
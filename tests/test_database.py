@@ -0,0 +1,311 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+import mysql.connector
+from mysql.connector import FieldType
+
+import database
+from database import (
+    DatabaseConnection, QueryCache, ResultSet, WriteBehindQueue, WriteRequest, format_id, parse_id, results_to_frame
+)
+from instrumentation import Instrumentation
+
+
+class Result:
+    def __init__(self, rows, description):
+        self.rows = rows
+        self.description = description
+        self.with_rows = description is not None
+
+    def fetchall(self):
+        return self.rows
+
+
+class MultiResultCursor:
+    # Trả các result set của một CALL lần lượt qua nextset(), như connector từ 9.2
+    def __init__(self, results):
+        self.results = list(results)
+        self.statements = []
+
+    def execute(self, statement, params=None, **kwargs):
+        assert not kwargs
+        self.statements.append((statement, params))
+
+    @property
+    def with_rows(self):
+        return self.results[0].with_rows
+
+    @property
+    def description(self):
+        return self.results[0].description
+
+    def fetchall(self):
+        return self.results[0].fetchall()
+
+    def nextset(self):
+        self.results.pop(0)
+        return bool(self.results) or None
+
+
+class LegacyCursor:
+    def __init__(self, results):
+        self.results = results
+        self.statements = []
+
+    def execute(self, statement, params=None, multi=False):
+        assert multi
+        self.statements.append((statement, params))
+        return iter(self.results)
+
+
+RESULTS = [
+    Result([(1, "An")], [("CustomerID",), ("CustomerName",)]),
+    Result([(2,)], [("Total",)]),
+    Result([], None)
+]
+
+
+def execute_call(cursor):
+    return DatabaseConnection.__new__(DatabaseConnection)._execute_call(cursor, "ShowCustomer", ("C001",))
+
+
+def test_execute_call_reads_every_result_set_with_nextset(monkeypatch):
+    monkeypatch.setattr(database, "LEGACY_MULTI_EXECUTE", False)
+    cursor = MultiResultCursor(RESULTS)
+    result_sets = execute_call(cursor)
+    assert cursor.statements == [("CALL ShowCustomer(%s)", ("C001",))]
+    assert [list(result_set) for result_set in result_sets] == [[(1, "An")], [(2,)]]
+    assert result_sets[0].columns == ["CustomerID", "CustomerName"]
+
+
+def test_execute_call_uses_multi_on_old_connectors(monkeypatch):
+    monkeypatch.setattr(database, "LEGACY_MULTI_EXECUTE", True)
+    cursor = LegacyCursor(RESULTS)
+    result_sets = execute_call(cursor)
+    assert [list(result_set) for result_set in result_sets] == [[(1, "An")], [(2,)]]
+
+
+def test_execute_call_rejects_invalid_procedure_names():
+    with pytest.raises(ValueError):
+        DatabaseConnection.__new__(DatabaseConnection)._execute_call(LegacyCursor([]), "Show; DROP TABLE Orders", ())
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_query_cache_expires_entries_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(database.time, "monotonic", clock)
+    cache = QueryCache(max_entries=10, ttl=60)
+    cache.put("customers", [(1,)], ("customers",))
+    clock.now += 59
+    assert cache.get("customers") == [(1,)]
+    clock.now += 2
+    assert cache.get("customers") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_query_cache_evicts_least_recently_used():
+    cache = QueryCache(max_entries=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_query_cache_invalidates_by_tag():
+    cache = QueryCache()
+    cache.put("customers", 1, ("customers",))
+    cache.put("sales", 2, ("orders", "sales"))
+    cache.put("products", 3, ("products",))
+    cache.invalidate("sales", "customers")
+    assert cache.get("customers") is None
+    assert cache.get("sales") is None
+    assert cache.get("products") == 3
+    assert cache.invalidations == 2
+    assert cache.changed_within(("sales",), 60)
+    assert not cache.changed_within(("products",), 60)
+
+
+def test_query_cache_drops_results_read_before_a_write():
+    cache = QueryCache()
+    generation = cache.generation(("orders",))
+    cache.invalidate("orders")
+    cache.put("orders", 1, ("orders",), generation)
+    assert cache.get("orders") is None
+
+
+def test_format_and_parse_id_round_trip():
+    assert format_id("C", 7) == "C007"
+    assert format_id("OD", 12345) == "OD12345"
+    assert parse_id("C007") == 7
+    assert parse_id(" OD12345 ") == 12345
+    assert parse_id(format_id("P", 42)) == 42
+
+
+def test_parse_id_accepts_integers_and_none():
+    assert parse_id(5) == 5
+    assert parse_id(None) is None
+    assert parse_id("17") == 17
+
+
+@pytest.mark.parametrize("code", ["", "C", "C01A"])
+def test_parse_id_rejects_codes_without_trailing_digits(code):
+    with pytest.raises(ValueError):
+        parse_id(code)
+
+
+class WriteCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, params=None):
+        self.connection.log.append(statement)
+
+    def close(self):
+        pass
+
+
+class WriteConnection:
+    def __init__(self, commit_error=None):
+        self.log = []
+        self.commit_error = commit_error
+
+    def cursor(self):
+        return WriteCursor(self)
+
+    def start_transaction(self):
+        self.log.append("START TRANSACTION")
+
+    def commit(self):
+        if self.commit_error is not None:
+            raise self.commit_error
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+class WriteDatabase:
+    # Chỉ những gì WriteBehindQueue dùng: thủ tục nằm trong failures báo lỗi với errno tương ứng
+    def __init__(self, failures=(), commit_error=None):
+        self.failures = dict(failures)
+        self.conn = WriteConnection(commit_error)
+        self.instrumentation = Instrumentation(enabled=False)
+        self.cache = QueryCache()
+        self.retried = []
+        self.sessions = []
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+    def _run_proc(self, cursor, proc_name, params):
+        if proc_name in self.failures:
+            raise mysql.connector.Error(f"{proc_name} failed", errno=self.failures[proc_name])
+        cursor.execute(f"CALL {proc_name}")
+
+    def _execute_now(self, proc_name, params, tags, done):
+        self.retried.append(proc_name)
+        done.set_result(None)
+        return done
+
+    def _note_write(self, *sessions):
+        self.sessions.extend(sessions)
+
+
+def commit_batch(db, *proc_names):
+    batch = [WriteRequest(name, (), (name.lower(),), "session", Future()) for name in proc_names]
+    write_queue = WriteBehindQueue(db)
+    try:
+        write_queue._commit(batch)
+    finally:
+        write_queue.close()
+    return [request.future for request in batch]
+
+
+def test_write_behind_rolls_back_only_the_failed_write_to_its_savepoint():
+    db = WriteDatabase({"UpdateCustomer": 1062})
+    for tag in ("registercustomer", "updatecustomer", "addproduct"):
+        db.cache.put(tag, 1, (tag,))
+    futures = commit_batch(db, "RegisterCustomer", "UpdateCustomer", "AddProduct")
+    assert db.conn.log == [
+        "START TRANSACTION",
+        "SAVEPOINT write_behind", "CALL RegisterCustomer", "RELEASE SAVEPOINT write_behind",
+        "SAVEPOINT write_behind", "ROLLBACK TO SAVEPOINT write_behind",
+        "SAVEPOINT write_behind", "CALL AddProduct", "RELEASE SAVEPOINT write_behind",
+        "COMMIT"
+    ]
+    assert futures[0].result() is None and futures[2].result() is None
+    assert futures[1].exception().errno == 1062
+    # Chỉ cache của lệnh đã commit bị xoá
+    assert db.cache.get("registercustomer") is None and db.cache.get("addproduct") is None
+    assert db.cache.get("updatecustomer") == 1
+    assert db.sessions == ["session"]
+    assert db.retried == []
+
+
+def test_write_behind_retries_each_write_after_a_deadlock():
+    db = WriteDatabase({"UpdateCustomer": 1213})
+    futures = commit_batch(db, "RegisterCustomer", "UpdateCustomer")
+    assert db.conn.log[-1] == "ROLLBACK"
+    assert "COMMIT" not in db.conn.log
+    assert db.retried == ["RegisterCustomer", "UpdateCustomer"]
+    assert [future.result() for future in futures] == [None, None]
+
+
+def test_write_behind_reports_unknown_commit_outcome_without_retrying():
+    db = WriteDatabase(commit_error=mysql.connector.Error("Lost connection", errno=2013))
+    futures = commit_batch(db, "RegisterCustomer", "AddProduct")
+    assert db.retried == []
+    assert all(future.exception().errno == 2013 for future in futures)
+
+
+def column(name, type_code):
+    return (name, type_code, None, None, None, None, True)
+
+
+def test_results_to_frame_builds_typed_columns():
+    pytest.importorskip("pandas")
+    rows = ResultSet(
+        [(1, "Shipped", Decimal("12.50"), date(2024, 5, 1), None), (2, "Pending", None, date(2024, 5, 2), 3)],
+        [column("OrderID", FieldType.LONG), column("Status", FieldType.VAR_STRING),
+         column("Total", FieldType.NEWDECIMAL), column("OrderDate", FieldType.DATE), column("Quantity", FieldType.LONG)]
+    )
+    frame = results_to_frame(rows)
+    assert list(frame.columns) == ["OrderID", "Status", "Total", "OrderDate", "Quantity"]
+    assert str(frame["OrderID"].dtype) == "int64"
+    assert str(frame["Status"].dtype) == "category"
+    assert str(frame["Total"].dtype) == "float64"
+    assert frame["Total"].isna().tolist() == [False, True]
+    assert str(frame["OrderDate"].dtype).startswith("datetime64")
+    # Cột số nguyên có NULL dùng kiểu Int64 thay vì chuyển sang float
+    assert str(frame["Quantity"].dtype) == "Int64"
+    assert frame["Quantity"].isna().tolist() == [True, False]
+
+
+def test_results_to_frame_keeps_columns_of_empty_results():
+    pytest.importorskip("pandas")
+    frame = results_to_frame(ResultSet([], [column("CustomerID", FieldType.LONG), column("CustomerName", FieldType.VAR_STRING)]))
+    assert list(frame.columns) == ["CustomerID", "CustomerName"]
+    assert len(frame) == 0
+
+
+def test_results_to_frame_without_description():
+    pytest.importorskip("pandas")
+    frame = results_to_frame([(1, "An")])
+    assert frame.values.tolist() == [[1, "An"]]
@@ -0,0 +1,52 @@
+from datetime import date
+from decimal import Decimal
+
+from instrumentation import CallStats, redact_explain, redact_param
+
+
+def test_redact_param_keeps_numbers_dates_and_null():
+    assert redact_param(42) == "42"
+    assert redact_param(Decimal("12.50")) == "12.50"
+    assert redact_param(date(2024, 5, 1)) == "2024-05-01"
+    assert redact_param(None) == "None"
+    assert redact_param(True) == "True"
+
+
+def test_redact_param_hides_strings_behind_a_stable_fingerprint():
+    redacted = redact_param("0912345678")
+    assert "0912345678" not in redacted
+    assert redacted.startswith("<redacted 10 chars #")
+    assert redact_param("0912345678") == redacted
+    assert redact_param("0912345679") != redacted
+
+
+def test_redact_explain_drops_conditions_at_every_level():
+    plan = {
+        "query_block": {
+            "table": {"table_name": "Customers", "attached_condition": "(`CustomerName` = 'An')"},
+            "nested_loop": [{"table": {"table_name": "Orders", "index_condition": "(`OrderID` = 7)", "rows": 1}}]
+        }
+    }
+    assert redact_explain(plan) == {
+        "query_block": {
+            "table": {"table_name": "Customers"},
+            "nested_loop": [{"table": {"table_name": "Orders", "rows": 1}}]
+        }
+    }
+
+
+def test_percentile_returns_bucket_upper_bound():
+    stats = CallStats()
+    for _ in range(8):
+        stats.observe(0.5, 1, 8, False)
+    stats.observe(20, 1, 8, False)
+    stats.observe(20000, 1, 8, True)
+    assert stats.percentile(0.5) == 1.0
+    assert stats.percentile(0.9) == 25.0
+    # Phân vị rơi vào bucket +Inf: dùng thời gian lớn nhất đã đo
+    assert stats.percentile(0.99) == 20000
+    assert (stats.count, stats.errors) == (10, 1)
+
+
+def test_percentile_of_no_calls_is_zero():
+    assert CallStats().percentile(0.95) == 0.0
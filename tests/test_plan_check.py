@@ -0,0 +1,86 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from plan_check import procedure_cases, split_script, summarize
+
+SCRIPT = """USE sales_management;
+
+-- Thủ tục mẫu
+DROP PROCEDURE IF EXISTS ShowCustomer;
+DELIMITER //
+CREATE PROCEDURE ShowCustomer(IN p_CustomerID VARCHAR(10))
+BEGIN
+    SELECT CustomerName FROM Customers WHERE CustomerID = ParseId(p_CustomerID);
+END; //
+DELIMITER ;
+
+CREATE INDEX idx_customers_name ON Customers(CustomerName);
+"""
+
+VALUES = {
+    "customer_term": "An", "product_term": "Phone", "employee_term": "Binh",
+    "start_date": date(2024, 1, 1), "end_date": date(2024, 12, 31),
+    "customer_id": "C001", "product_id": "P001", "employee_id": "E001", "order_id": "O001"
+}
+
+
+def test_split_script_follows_delimiter_changes():
+    statements = list(split_script(SCRIPT))
+    assert statements[0] == "USE sales_management"
+    assert statements[1].endswith("DROP PROCEDURE IF EXISTS ShowCustomer")
+    assert statements[2].startswith("CREATE PROCEDURE ShowCustomer")
+    # Dấu ; bên trong thân thủ tục không tách câu lệnh
+    assert statements[2].rstrip().endswith("END;")
+    assert statements[3] == "CREATE INDEX idx_customers_name ON Customers(CustomerName)"
+    assert len(statements) == 4
+
+
+def test_summarize_reports_scans_sorts_and_keys():
+    query = "SELECT O.OrderID FROM Orders O JOIN Customers C ON O.CustomerID = C.CustomerID ORDER BY O.OrderDate"
+    plan = {
+        "query_block": {
+            "cost_info": {"query_cost": "1234.567"},
+            "ordering_operation": {
+                "using_filesort": True,
+                "nested_loop": [
+                    {"table": {"table_name": "O", "access_type": "ALL", "rows_examined_per_scan": 50000}},
+                    {"table": {"table_name": "C", "access_type": "eq_ref", "key": "PRIMARY", "rows_examined_per_scan": 1}},
+                    {"table": {"table_name": "<derived2>", "access_type": "ALL", "rows_examined_per_scan": 90000}}
+                ]
+            }
+        }
+    }
+    summary, lookups = summarize(plan, query, min_rows=1000)
+    assert summary == {
+        "full_scans": ["Orders"],
+        "filesort": True,
+        "temporary": False,
+        "keys": ["Customers.PRIMARY"],
+        "cost": 1234.57
+    }
+    assert [(table, rows) for table, _, rows in lookups] == [("Orders", 50000), ("Customers", 1)]
+
+
+def test_summarize_ignores_small_full_scans():
+    plan = {"query_block": {"table": {"table_name": "Employees", "access_type": "ALL", "rows_examined_per_scan": 20}}}
+    summary, _ = summarize(plan, "SELECT * FROM Employees", min_rows=1000)
+    assert summary["full_scans"] == []
+
+
+def test_procedure_cases_report_parameters_without_sample_values(tmp_path):
+    script = tmp_path / "schema.sql"
+    script.write_text(SCRIPT + """
+DELIMITER //
+CREATE PROCEDURE ShowLoyalty(IN p_Tier VARCHAR(10))
+BEGIN
+    SELECT CustomerName FROM Customers WHERE Tier = p_Tier;
+END; //
+DELIMITER ;
+""", encoding="utf-8")
+    cases, unsampled = procedure_cases(str(script), VALUES)
+    assert [(case.name, case.params) for case in cases] == [("ShowCustomer#1", ("C001",))]
+    assert [name for name, _ in unsampled] == ["ShowLoyalty#1"]
+    assert "p_tier" in unsampled[0][1]